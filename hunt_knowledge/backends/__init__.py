@@ -0,0 +1 @@
+"""Backends behind ``hunt_knowledge.utils``, each imported on first use."""
@@ -0,0 +1,299 @@
+"""Headless Chrome backend: driver setup, the shared pool, link extraction.
+
+selenium is only imported when a driver is started.
+"""
+
+import atexit
+import os
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import List
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# Resources that aren't needed to find links, blocked with block_resources=True.
+BLOCKED_RESOURCE_PATTERNS = [
+    "*.css",
+    "*.woff",
+    "*.woff2",
+    "*.ttf",
+    "*.otf",
+    "*.png",
+    "*.jpg",
+    "*.jpeg",
+    "*.gif",
+    "*.svg",
+    "*.webp",
+    "*.ico",
+]
+
+
+def setup_webdriver(local=False, block_resources=False):
+    """Starts Chrome; ``block_resources`` skips images, fonts and CSS."""
+    from selenium import webdriver
+
+    if local:
+        return webdriver.Chrome("/usr/bin/chromedriver")
+    chrome_options = webdriver.ChromeOptions()
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--window-size=1420,1080")
+    chrome_options.add_argument("--headless")
+    chrome_options.add_argument("--disable-gpu")
+    if block_resources:
+        chrome_options.add_argument("--blink-settings=imagesEnabled=false")
+        chrome_options.add_experimental_option(
+            "prefs", {"profile.managed_default_content_settings.images": 2}
+        )
+    driver = webdriver.Chrome(options=chrome_options)
+    if block_resources:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd(
+            "Network.setBlockedURLs", {"urls": BLOCKED_RESOURCE_PATTERNS}
+        )
+    return driver
+
+
+def process_tree_rss_mb(pid: int) -> float:
+    """Resident memory of a process and all its descendants, in MB.
+
+    Reads /proc, so it only works on Linux; returns 0 elsewhere.
+    """
+    children = defaultdict(list)
+    rss_kb = {}
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return 0.0
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/status") as f:
+                status = dict(
+                    line.split(":", 1) for line in f.read().splitlines() if ":" in line
+                )
+        except OSError:
+            continue
+        child = int(entry)
+        children[int(status.get("PPid", "0").strip())].append(child)
+        rss_kb[child] = int(status.get("VmRSS", "0 kB").split()[0])
+
+    total, stack = 0, [pid]
+    while stack:
+        current = stack.pop()
+        total += rss_kb.get(current, 0)
+        stack.extend(children.get(current, []))
+    return total / 1024
+
+
+class WebDriverPool:
+    """Pool of headless Chrome drivers shared across spiders and pages.
+
+    At most ``size`` drivers exist at once; ``acquire`` blocks until one is
+    free. Drivers are started lazily, health-checked before reuse, and
+    recycled after ``max_pages`` pages or once Chrome's process tree uses more
+    than ``max_memory_mb``. Users register with ``open`` and unregister with
+    ``close``; when the last one closes, every driver is quit.
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        max_pages: int = 50,
+        max_memory_mb: float = 1024,
+        local: bool = False,
+        block_resources: bool = False,
+        factory=None,
+    ):
+        self.size = size
+        self.max_pages = max_pages
+        self.max_memory_mb = max_memory_mb
+        self.factory = factory or (
+            lambda: setup_webdriver(local=local, block_resources=block_resources)
+        )
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._idle = []
+        self._pages = {}
+        self._users = 0
+        self._closed = False
+
+    def __repr__(self):
+        return (
+            f"{__class__.__name__}, size: {self.size}, "
+            f"max_pages: {self.max_pages}, max_memory_mb: {self.max_memory_mb}"
+        )
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(
+            size=settings.getint("WEBDRIVER_POOL_SIZE", 2),
+            max_pages=settings.getint("WEBDRIVER_MAX_PAGES", 50),
+            max_memory_mb=settings.getfloat("WEBDRIVER_MAX_MEMORY_MB", 1024),
+            local=settings.getbool("WEBDRIVER_LOCAL"),
+            block_resources=settings.getbool("WEBDRIVER_BLOCK_RESOURCES"),
+        )
+
+    def open(self):
+        with self._lock:
+            self._users += 1
+            self._closed = False
+
+    def close(self):
+        """Unregisters a user, shutting the pool down after the last one."""
+        with self._lock:
+            self._users = max(0, self._users - 1)
+            if self._users:
+                return
+        self.shutdown()
+
+    def shutdown(self):
+        """Quits the idle drivers; drivers in use are quit when released."""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for driver in idle:
+            self._quit(driver)
+
+    @staticmethod
+    def is_healthy(driver) -> bool:
+        try:
+            return driver.execute_script("return 1") == 1
+        except Exception:
+            return False
+
+    @staticmethod
+    def memory_mb(driver) -> float:
+        try:
+            return process_tree_rss_mb(driver.service.process.pid)
+        except AttributeError:
+            return 0.0
+
+    def _quit(self, driver):
+        self._pages.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception as e:
+            logger.warning("Failed to quit webdriver with exception: %s", e)
+
+    def acquire(self):
+        """Returns a healthy driver, blocking until a slot is free."""
+        self._slots.acquire()
+        try:
+            while True:
+                with self._lock:
+                    driver = self._idle.pop() if self._idle else None
+                if driver is None:
+                    driver = self.factory()
+                    self._pages[id(driver)] = 0
+                    return driver
+                if self.is_healthy(driver):
+                    return driver
+                logger.warning("Replacing unhealthy webdriver")
+                self._quit(driver)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, driver, broken: bool = False):
+        """Returns a driver to the pool, recycling it if it is worn out."""
+        try:
+            pages = self._pages.get(id(driver), 0) + 1
+            self._pages[id(driver)] = pages
+            recycle = (
+                broken
+                or self._closed
+                or pages >= self.max_pages
+                or (self.max_memory_mb and self.memory_mb(driver) > self.max_memory_mb)
+            )
+            if recycle:
+                self._quit(driver)
+            else:
+                with self._lock:
+                    self._idle.append(driver)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def driver(self):
+        driver = self.acquire()
+        try:
+            yield driver
+        except Exception:
+            self.release(driver, broken=not self.is_healthy(driver))
+            raise
+        self.release(driver)
+
+    def get_all_urls_on_page(self, url, drop_duplicates=True, with_details=False):
+        """``selenium_get_all_urls_on_page`` with a pooled driver."""
+        with self.driver() as driver:
+            return selenium_get_all_urls_on_page(
+                driver, url, drop_duplicates, with_details
+            )
+
+
+_webdriver_pool = None
+
+
+def get_webdriver_pool(settings=None) -> WebDriverPool:
+    """Returns the process-wide WebDriverPool, creating it on first use."""
+    global _webdriver_pool
+    if _webdriver_pool is None:
+        if settings is None:
+            _webdriver_pool = WebDriverPool()
+        else:
+            _webdriver_pool = WebDriverPool.from_settings(settings)
+        atexit.register(_webdriver_pool.shutdown)
+    return _webdriver_pool
+
+
+# Collects every link in a single WebDriver round trip, instead of one
+# get_attribute call per anchor. The section is the class (or tag) of the
+# nearest enclosing landmark element.
+EXTRACT_LINKS_SCRIPT = """
+return Array.from(document.querySelectorAll("a[href]"), function (a) {
+    var section = a.parentElement && a.parentElement.closest(
+        "section, article, nav, header, footer, aside, main, div[class]"
+    );
+    return [
+        a.href,
+        (a.textContent || "").trim().replace(/\\s+/g, " "),
+        section ? (section.getAttribute("class") || section.tagName.toLowerCase()) : ""
+    ];
+});
+"""
+
+
+def selenium_extract_links(driver, drop_duplicates=True) -> List[dict]:
+    """Links on the driver's current page as dicts of url, text and section."""
+    links = [
+        {"url": href, "text": text, "section": section}
+        for href, text, section in driver.execute_script(EXTRACT_LINKS_SCRIPT)
+    ]
+    if drop_duplicates:
+        seen = set()
+        links = [
+            link
+            for link in links
+            if link["url"] not in seen and not seen.add(link["url"])
+        ]
+    return links
+
+
+def selenium_get_all_urls_on_page(
+    driver, url, drop_duplicates=True, with_details=False
+) -> list:
+    """Given a URL, get all URLs on that URL
+
+    With ``with_details``, returns dicts with each link's url, anchor text and
+    containing section instead of bare URLs.
+    """
+    driver.get(url)
+    links = selenium_extract_links(driver, drop_duplicates)
+    if with_details:
+        return links
+    return [link["url"] for link in links]
@@ -0,0 +1,315 @@
+"""DynamoDB backend: queries of CuratedArticlesDB and dedup index loading."""
+
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+from typing import Iterable, List, Optional
+
+import boto3
+from boto3.dynamodb.conditions import Key
+
+from hunt_knowledge.dedup import DedupIndex
+from hunt_knowledge.utils import get_dedup_index
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+_dynamodb_client = None
+_dynamodb_client_lock = threading.Lock()
+
+
+def get_dynamodb_client():
+    """Returns the process-wide low-level DynamoDB client.
+
+    boto3 clients are thread-safe, so every spider and writer thread in the
+    process shares one client and its connection pool.
+    """
+    global _dynamodb_client
+    with _dynamodb_client_lock:
+        if _dynamodb_client is None:
+            _dynamodb_client = boto3.client("dynamodb")
+    return _dynamodb_client
+
+
+def iter_dynamo_by_category(
+    period: int = 1,
+    table_name: str = "CuratedArticlesDB",
+    category: str = "pharma",
+    fields: Optional[List[str]] = None,
+    table=None,
+    since: Optional[str] = None,
+):
+    """
+    Streams the items of a category from the last X days, page by page.
+    Parameters
+    ----------
+    period: The number of days we want to go back
+    table_name: Name of the DynamoDB table
+    category: The category of the articles. E.g "pharma"
+    fields: Attributes to fetch. Defaults to all of them; projecting only the
+        ones needed avoids transferring article bodies.
+    table: DynamoDB Table to query, instead of looking up ``table_name``
+    since: Only fetch items with createdAt at or after this, instead of
+        using ``period``
+
+    Returns
+    -------
+    Generator of items, following LastEvaluatedKey past the 1 MB page limit
+    """
+    # Get yesterday's date
+    yday = str(date.today() - timedelta(days=period))
+
+    if table is None:
+        table = boto3.resource("dynamodb").Table(table_name)
+    if since is None:
+        created_condition = Key("createdAt").gt(yday)
+    else:
+        created_condition = Key("createdAt").gte(since)
+    kwargs = dict(
+        IndexName="category-createdAt-index",
+        KeyConditionExpression=Key("category").eq(category) & created_condition,
+    )
+    if fields:
+        # Attribute names may be DynamoDB reserved words (e.g. "text").
+        names = {f"#f{i}": field for i, field in enumerate(fields)}
+        kwargs["ProjectionExpression"] = ", ".join(names)
+        kwargs["ExpressionAttributeNames"] = names
+
+    while True:
+        response = table.query(**kwargs)
+        yield from response["Items"]
+        last_key = response.get("LastEvaluatedKey")
+        if not last_key:
+            break
+        kwargs["ExclusiveStartKey"] = last_key
+
+
+def iter_dynamo_by_categories(
+    categories: Iterable[str],
+    period: int = 1,
+    table_name: str = "CuratedArticlesDB",
+    fields: Optional[List[str]] = None,
+    max_workers: int = 4,
+):
+    """Queries several categories in parallel, yielding (category, item) pairs.
+
+    Each category is paged through in its own thread, with its own boto3
+    resource since those aren't thread-safe.
+    """
+    categories = list(categories)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(
+                lambda category: list(
+                    iter_dynamo_by_category(period, table_name, category, fields)
+                ),
+                category,
+            ): category
+            for category in categories
+        }
+        for future in as_completed(futures):
+            category = futures[future]
+            for item in future.result():
+                yield category, item
+
+
+def query_dynamo_by_category(
+    period: int = 1,
+    table_name: str = "CuratedArticlesDB",
+    category: str = "pharma",
+    fields: Optional[List[str]] = None,
+):
+    """
+    Queries any DynamoDB table by category, up to X previous days.
+    Parameters
+    ----------
+    period: The number of days we want to go back
+    table_name: Name of the DynamoDB table
+    category: The category of the articles. E.g "pharma"
+    fields: Attributes to fetch. Defaults to all of them
+
+    Returns
+    -------
+    Dict with all matching items under "Items", across every result page
+    """
+    return {
+        "Items": list(iter_dynamo_by_category(period, table_name, category, fields))
+    }
+
+
+def query_fields_of_category(
+    field="title", period=1, table_name="CuratedArticlesDB", category="pharma"
+):
+    """Gets data field of articles of a particular category from the DB."""
+    items = iter_dynamo_by_category(period, table_name, category, fields=[field])
+    return [x[field] for x in items if field in x]
+
+
+def sync_dedup_store(
+    index: DedupIndex,
+    period: int = 1,
+    table_name: str = "CuratedArticlesDB",
+    category: str = "pharma",
+):
+    """Brings the index's DedupStore up to date for a category.
+
+    Queries only the articles created at most ``store.sync_lag`` seconds
+    before the category's watermark (or from the start of the window,
+    whichever is later), so that articles written late are still fetched.
+    Merging them is idempotent. Entries older than the window are pruned.
+    Returns the category's stored (kind, digest) pairs.
+    """
+    store = index.store
+    window_start = str(date.today() - timedelta(days=period))
+    watermark = store.watermark(table_name, category, period)
+    since = window_start
+    if watermark:
+        since = max(_seconds_before(watermark, store.sync_lag), window_start)
+
+    entries = []
+    latest = None
+    for item in iter_dynamo_by_category(
+        period,
+        table_name,
+        category,
+        fields=["url", "title", "createdAt"],
+        since=since,
+    ):
+        created_at = item.get("createdAt", since)
+        if item.get("url"):
+            entries.append(("url", index.url_digest(item["url"]), created_at))
+        if item.get("title"):
+            entries.append(("title", index.title_digest(item["title"]), created_at))
+            # For the NearDuplicateIndex, which needs the text.
+            headline = item["title"].encode("utf-8")
+            entries.append(("headline", headline, created_at))
+        latest = created_at if latest is None else max(latest, created_at)
+    logger.info("Fetched %d new dedup entries for %s", len(entries), category)
+
+    if latest is not None:
+        store.merge(table_name, category, period, entries, latest)
+    store.prune(table_name, category, period, window_start)
+    return store.entries(table_name, category, period, kinds=("url", "title"))
+
+
+def _seconds_before(created_at: str, seconds: float) -> str:
+    """The createdAt ``seconds`` before ``created_at``, in the DB's format."""
+    try:
+        moment = datetime.fromisoformat(created_at.rstrip("Z"))
+    except ValueError:
+        return created_at
+    moment -= timedelta(seconds=seconds)
+    return moment.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+def load_category_into_index(
+    index: DedupIndex,
+    period: int = 1,
+    table_name: str = "CuratedArticlesDB",
+    category: str = "pharma",
+):
+    """Adds the urls and titles of a category's recent articles to the index."""
+    key = (table_name, category, period)
+    if index.store is not None:
+        index.load_digests(
+            key, lambda: sync_dedup_store(index, period, table_name, category)
+        )
+        return
+    index.load(
+        key,
+        lambda: iter_dynamo_by_category(
+            period, table_name, category, fields=["url", "title"]
+        ),
+    )
+
+
+def load_categories_into_index(
+    index: DedupIndex,
+    categories: Iterable[str],
+    period: int = 1,
+    table_name: str = "CuratedArticlesDB",
+    max_workers: int = 4,
+):
+    """Loads several categories into the index, querying them in parallel."""
+    if index.store is not None:
+        # The store only fetches new articles, so per-category loads are cheap.
+        for category in categories:
+            load_category_into_index(index, period, table_name, category)
+        return
+    missing = [c for c in categories if not index.is_loaded((table_name, c, period))]
+    items = defaultdict(list)
+    for category, item in iter_dynamo_by_categories(
+        missing, period, table_name, ["url", "title"], max_workers
+    ):
+        items[category].append(item)
+    for category in missing:
+        index.load((table_name, category, period), lambda: items[category])
+
+
+def load_titles_into_near_duplicate_index(
+    index,
+    period: int = 1,
+    table_name: str = "CuratedArticlesDB",
+    category: str = "pharma",
+    dedup_index: Optional[DedupIndex] = None,
+):
+    """Adds the titles of a category's recent articles to a NearDuplicateIndex.
+
+    With a ``dedup_index`` backed by a DedupStore, the titles are read from
+    the store, after the same incremental sync as the URLs (done once for
+    both); otherwise the whole window is queried.
+    """
+
+    def fetch():
+        if dedup_index is None or dedup_index.store is None:
+            return query_fields_of_category("title", period, table_name, category)
+        load_category_into_index(dedup_index, period, table_name, category)
+        entries = dedup_index.store.entries(
+            table_name, category, period, kinds=("headline",)
+        )
+        return [headline.decode("utf-8") for _, headline in entries]
+
+    index.load((table_name, category, period), fetch)
+
+
+class UrlFilterer:
+    """Class to filter URLs that are already in the database from the last X days"""
+
+    def __init__(
+        self,
+        period: int = 1,
+        table_name: str = "CuratedArticlesDB",
+        category: str = "pharma",
+        index: Optional[DedupIndex] = None,
+    ):
+        self.index = index if index is not None else get_dedup_index()
+        load_category_into_index(self.index, period, table_name, category)
+        self.period = period
+        self.table_name = table_name
+        self.category = category
+
+    def __repr__(self):
+        return (
+            f"{__class__.__name__}, period: {self.period}, "
+            f"table_name: {self.table_name}, "
+            f"category: {self.category}"
+        )
+
+    def __call__(self, url):
+        return not self.index.has_url(url)
+
+
+def is_title_in_db(
+    title,
+    period: int = 1,
+    table_name: str = "CuratedArticlesDB",
+    category: str = "pharma",
+    index: Optional[DedupIndex] = None,
+):
+    """Checks if article title already exists in the last X days."""
+    index = index if index is not None else get_dedup_index()
+    load_category_into_index(index, period, table_name, category)
+    return index.has_title(title)
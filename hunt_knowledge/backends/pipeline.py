@@ -0,0 +1,624 @@
+"""genei-pipeline NLP API backend: the HTTP client and its cache."""
+
+import heapq
+import itertools
+import json
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+from twisted.internet import defer, threads
+from urllib3.util.retry import Retry
+
+from hunt_knowledge.cache import SqliteCache, make_key
+from hunt_knowledge.canonical import canonicalize
+from hunt_knowledge.throttle import AimdController
+from hunt_knowledge.utils import gather_successes, nlp_to_url_data_object
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# api = "http://ac6b3caf43dd145eb8bd6baf06aa83aa-e02d1280de19e099.elb.eu-west-1.amazonaws.com/genei-pipeline"
+PIPELINE_API = (
+    "https://w3ddy8vzni.execute-api.eu-west-1.amazonaws.com/v1/genei-pipeline"
+)
+
+
+GENERATION_ARGS = {
+    "beam": 8,
+    "min_len": 50,
+    "max_len": 300,
+    "len_pen": 1.0,
+    "no_repeat_ngram_size": 3,
+    "return_sents": True,
+}
+
+
+DISABLED_COMPONENTS = [
+    "ReduceEntityVectorsComponent",
+    "HierarchicalEntTagger",
+    "MultiEntReducer",
+    "ImageSearcher",
+]
+
+
+def pipeline_payload(url):
+    """Request body sent to the genei-pipeline for a single URL."""
+    return {
+        "config": {"generation_args": GENERATION_ARGS},
+        "disabledComponents": DISABLED_COMPONENTS,
+        "url": url,
+    }
+
+
+def batch_payload(urls):
+    """Request body sent to the batch endpoint for several URLs."""
+    return {
+        "config": {"generation_args": GENERATION_ARGS},
+        "disabledComponents": DISABLED_COMPONENTS,
+        "urls": list(urls),
+    }
+
+
+# Size of a batch request body without its URLs, less the separator that
+# ``_url_size`` counts for the first URL.
+_BATCH_OVERHEAD = len(json.dumps(batch_payload([]))) - 2
+
+
+def _url_size(url):
+    """Bytes ``url`` adds to a batch request body, with its separator."""
+    return len(json.dumps(url)) + 2
+
+
+def batch_urls(
+    urls: Iterable[str], max_count: int, max_bytes: int
+) -> Iterator[List[str]]:
+    """Groups ``urls`` into batches of at most ``max_count`` URLs whose batch
+    request body is at most ``max_bytes``.
+
+    A URL too long to fit within ``max_bytes`` on its own is sent alone.
+    """
+    batch, size = [], _BATCH_OVERHEAD
+    for url in urls:
+        url_size = _url_size(url)
+        if batch and (len(batch) >= max_count or size + url_size > max_bytes):
+            yield batch
+            batch, size = [], _BATCH_OVERHEAD
+        batch.append(url)
+        size += url_size
+    if batch:
+        yield batch
+
+
+class PipelineItemError(Exception):
+    """The batch endpoint failed to summarize one URL of a batch."""
+
+
+def pipeline_cache_key(url):
+    """Cache key for ``url``: its canonical form plus the pipeline config."""
+    payload = pipeline_payload(canonicalize(url))
+    return make_key(payload["url"], payload["config"], payload["disabledComponents"])
+
+
+def send_pipeline_request(url):
+    return get_pipeline_client().send(url)
+
+
+def get_url_summary(url):
+    try:
+        response = send_pipeline_request(url)
+    except requests.RequestException as e:
+        logger.error("Pipeline request for %s failed with: %s", url, e)
+        return None
+    doc = response["doc"]
+    summary = doc["abstractiveSummary"]
+    return summary
+
+
+def url_to_data_object(url, category, subcategory=None):
+    nlp = send_pipeline_request(url)
+    return nlp_to_url_data_object(nlp, url, category, subcategory)
+
+
+class PrioritySemaphore:
+    """DeferredSemaphore whose waiters get the tokens highest priority first,
+    and in order of arrival among equal priorities.
+
+    With a ``throttle`` (an ``AimdController``), the number of tokens follows
+    its concurrency, up to ``limit``, and its token bucket, if any, paces the
+    grants.
+    """
+
+    def __init__(self, tokens: int, throttle: Optional[AimdController] = None):
+        self.max_tokens = tokens
+        self.throttle = throttle
+        self.in_flight = 0
+        self.waiting = []
+        self._arrivals = itertools.count()
+        self._paced = None
+        # The reactor by default; tests can use a twisted.internet.task.Clock.
+        self.clock = None
+
+    def __repr__(self):
+        return (
+            f"{__class__.__name__}, limit: {self.limit}, "
+            f"in_flight: {self.in_flight}, waiting: {len(self.waiting)}"
+        )
+
+    @property
+    def limit(self) -> int:
+        if self.throttle is None:
+            return self.max_tokens
+        return min(self.max_tokens, self.throttle.concurrency)
+
+    @property
+    def tokens(self) -> int:
+        return self.limit - self.in_flight
+
+    def acquire(self, priority: float = 0) -> defer.Deferred:
+        d = defer.Deferred()
+        heapq.heappush(self.waiting, (-priority, next(self._arrivals), d))
+        self._grant()
+        return d
+
+    def release(self):
+        self.in_flight -= 1
+        self._grant()
+
+    def _grant(self):
+        while self.waiting and self.in_flight < self.limit and self._paced is None:
+            bucket = self.throttle.bucket if self.throttle is not None else None
+            wait = bucket.take() if bucket is not None else 0
+            if wait > 0:
+                clock = self.clock
+                if clock is None:
+                    from twisted.internet import reactor as clock
+                self._paced = clock.callLater(wait, self._paced_grant)
+                return
+            _, _, d = heapq.heappop(self.waiting)
+            self.in_flight += 1
+            d.callback(self)
+
+    def close(self):
+        if self._paced is not None and self._paced.active():
+            self._paced.cancel()
+        self._paced = None
+
+    def _paced_grant(self):
+        self._paced = None
+        self._grant()
+
+    def run(self, priority: float, f, *args, **kwargs) -> defer.Deferred:
+        """Runs ``f`` once a token is free, releasing it when ``f`` is done."""
+
+        def execute(_):
+            d = defer.maybeDeferred(f, *args, **kwargs)
+            return d.addBoth(self._release, self)
+
+        return self.acquire(priority).addCallback(execute)
+
+    @staticmethod
+    def _release(result, semaphore):
+        semaphore.release()
+        return result
+
+
+class PipelineClient:
+    """Client for the genei-pipeline NLP API.
+
+    Requests go through one ``requests.Session``, so connections to the API
+    Gateway are pooled and kept alive instead of paying a TCP and TLS
+    handshake per article. Failed connections and 429/5xx responses are
+    retried with exponential backoff, and every call has a timeout. Read
+    timeouts are not retried: the summarization POST isn't idempotent, and a
+    retry would hold the in-flight slot for several more read timeouts.
+
+    ``send`` blocks. The Deferred methods run it in the reactor's thread pool,
+    so summarization no longer blocks the crawl. At most ``max_in_flight``
+    requests run at once; the rest wait their turn, highest ``priority``
+    first. With ``throttle``, the number in flight adapts between
+    ``throttle_min`` and ``max_in_flight`` to the latency and the throttling
+    and server errors observed (see ``hunt_knowledge.throttle``), and
+    ``throttle_max_rate`` caps the requests started per second.
+
+    With ``batch_api`` set, ``request`` sends URLs to the batch endpoint
+    instead, so the model summarizes a batch per invocation. URLs requested
+    within ``batch_wait`` seconds of each other are grouped into batches of at
+    most ``batch_size`` URLs and ``batch_max_bytes`` of request body, and each
+    batch takes one in-flight slot. The endpoint answers
+    ``{"results": [...]}`` with, in request order, either the URL's pipeline
+    response or ``{"error": message}``; a failed URL only fails its own
+    Deferred, with PipelineItemError.
+    """
+
+    retry_statuses = (429, 500, 502, 503, 504)
+
+    def __init__(
+        self,
+        api: str = PIPELINE_API,
+        max_in_flight: int = 4,
+        pool_size: int = 10,
+        retries: int = 3,
+        backoff_factor: float = 1.0,
+        connect_timeout: float = 10.0,
+        read_timeout: float = 180.0,
+        cache_path: Optional[str] = None,
+        cache_ttl: float = 7 * 24 * 3600,
+        cache_max_bytes: int = 256 * 1024 * 1024,
+        batch_api: Optional[str] = None,
+        batch_size: int = 8,
+        batch_max_bytes: int = 64 * 1024,
+        batch_wait: float = 0.05,
+        throttle: bool = False,
+        throttle_start: int = 2,
+        throttle_min: int = 1,
+        throttle_target_latency: float = 30.0,
+        throttle_max_rate: Optional[float] = None,
+        throttle_burst: Optional[float] = None,
+    ):
+        self.config = dict(
+            api=api,
+            max_in_flight=max_in_flight,
+            pool_size=pool_size,
+            retries=retries,
+            backoff_factor=backoff_factor,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            cache_path=cache_path,
+            cache_ttl=cache_ttl,
+            cache_max_bytes=cache_max_bytes,
+            batch_api=batch_api,
+            batch_size=batch_size,
+            batch_max_bytes=batch_max_bytes,
+            batch_wait=batch_wait,
+            throttle=throttle,
+            throttle_start=throttle_start,
+            throttle_min=throttle_min,
+            throttle_target_latency=throttle_target_latency,
+            throttle_max_rate=throttle_max_rate,
+            throttle_burst=throttle_burst,
+        )
+        self.api = api
+        self.max_in_flight = max_in_flight
+        self.pool_size = max(pool_size, max_in_flight)
+        self.timeout = (connect_timeout, read_timeout)
+        self.throttle = None
+        if throttle:
+            self.throttle = AimdController(
+                initial=throttle_start,
+                min_concurrency=throttle_min,
+                max_concurrency=max_in_flight,
+                target_latency=throttle_target_latency,
+                max_rate=throttle_max_rate,
+                burst=throttle_burst,
+            )
+        self._semaphore = PrioritySemaphore(max_in_flight, self.throttle)
+        self.batch_api = batch_api
+        self.batch_size = batch_size
+        self.batch_max_bytes = batch_max_bytes
+        self.batch_wait = batch_wait
+        # (url, Deferred, priority) waiting for the next batch, and its timer.
+        self._pending: List[Tuple[str, defer.Deferred, float]] = []
+        self._pending_bytes = _BATCH_OVERHEAD
+        self._flush_call = None
+        # The reactor by default; tests can use a twisted.internet.task.Clock.
+        self.clock = None
+
+        retry = Retry(
+            total=retries,
+            read=0,
+            backoff_factor=backoff_factor,
+            status_forcelist=self.retry_statuses,
+            allowed_methods=frozenset(["POST"]),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=self.pool_size, max_retries=retry
+        )
+        self.session = requests.Session()
+        self.session.headers.update({"Content-type": "application/json"})
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self.cache = None
+        if cache_path:
+            self.cache = SqliteCache(
+                cache_path, ttl=cache_ttl, max_bytes=cache_max_bytes
+            )
+
+    def __repr__(self):
+        return (
+            f"{__class__.__name__}, api: {self.api}, "
+            f"max_in_flight: {self.max_in_flight}, "
+            f"pool_size: {self.pool_size}, batch_api: {self.batch_api}, "
+            f"throttle: {self.throttle}"
+        )
+
+    @staticmethod
+    def config_from_settings(settings):
+        """Constructor arguments read from the PIPELINE_* settings."""
+        return dict(
+            api=settings.get("PIPELINE_API", PIPELINE_API),
+            max_in_flight=settings.getint("PIPELINE_MAX_IN_FLIGHT", 4),
+            pool_size=settings.getint("PIPELINE_POOL_SIZE", 10),
+            retries=settings.getint("PIPELINE_RETRY_TIMES", 3),
+            backoff_factor=settings.getfloat("PIPELINE_RETRY_BACKOFF", 1.0),
+            connect_timeout=settings.getfloat("PIPELINE_CONNECT_TIMEOUT", 10.0),
+            read_timeout=settings.getfloat("PIPELINE_READ_TIMEOUT", 180.0),
+            cache_path=(
+                settings.get("PIPELINE_CACHE_PATH")
+                if settings.getbool("PIPELINE_CACHE_ENABLED")
+                else None
+            ),
+            cache_ttl=settings.getfloat("PIPELINE_CACHE_TTL", 7 * 24 * 3600),
+            cache_max_bytes=settings.getint(
+                "PIPELINE_CACHE_MAX_BYTES", 256 * 1024 * 1024
+            ),
+            batch_api=settings.get("PIPELINE_BATCH_API") or None,
+            batch_size=settings.getint("PIPELINE_BATCH_SIZE", 8),
+            batch_max_bytes=settings.getint("PIPELINE_BATCH_MAX_BYTES", 64 * 1024),
+            batch_wait=settings.getfloat("PIPELINE_BATCH_WAIT", 0.05),
+            throttle=settings.getbool("PIPELINE_THROTTLE_ENABLED"),
+            throttle_start=settings.getint("PIPELINE_THROTTLE_START", 2),
+            throttle_min=settings.getint("PIPELINE_THROTTLE_MIN", 1),
+            throttle_target_latency=settings.getfloat(
+                "PIPELINE_THROTTLE_TARGET_LATENCY", 30.0
+            ),
+            throttle_max_rate=settings.getfloat("PIPELINE_THROTTLE_MAX_RATE") or None,
+            throttle_burst=settings.getfloat("PIPELINE_THROTTLE_BURST") or None,
+        )
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(**cls.config_from_settings(settings))
+
+    def _cached(self, url):
+        """(cache key, cached response) for ``url``; both None without a cache."""
+        if self.cache is None:
+            return None, None
+        key = pipeline_cache_key(url)
+        cached = self.cache.get(key)
+        if cached is not None:
+            logger.debug("Pipeline cache hit for url: %s", url)
+        return key, cached
+
+    def _post(self, api, payload) -> requests.Response:
+        """POSTs ``payload``, reporting the outcome to the throttle."""
+        started = time.monotonic()
+        try:
+            response = self.session.post(
+                api, data=json.dumps(payload), timeout=self.timeout
+            )
+        except (requests.Timeout, requests.ConnectionError):
+            if self.throttle is not None:
+                self.throttle.observe(started, time.monotonic() - started, True)
+            raise
+        if self.throttle is not None:
+            # Statuses retried by urllib3 never reach us otherwise.
+            retries = getattr(response.raw, "retries", None)
+            statuses = [h.status for h in retries.history] if retries else []
+            statuses.append(response.status_code)
+            overloaded = any(status in self.retry_statuses for status in statuses)
+            self.throttle.observe(started, time.monotonic() - started, overloaded)
+        return response
+
+    def send(self, url):
+        """Sends a blocking pipeline request for ``url``, returning the JSON.
+
+        With a cache configured, a response already fetched for the same
+        normalized URL and pipeline config is returned without a request.
+        """
+        key, cached = self._cached(url)
+        if cached is not None:
+            return cached
+
+        logger.debug("Making pipeline request with url: %s", url)
+        response = self._post(self.api, pipeline_payload(url))
+        response.raise_for_status()
+        nlp = response.json()
+        if key is not None:
+            self.cache.set(key, nlp)
+        return nlp
+
+    def send_batch(self, urls: List[str]) -> List[Union[dict, PipelineItemError]]:
+        """Sends one blocking batch request for ``urls``.
+
+        Returns, in order, each URL's pipeline response or the
+        PipelineItemError it failed with. Cached URLs aren't sent. Raises if
+        the whole request fails.
+        """
+        results: List[Union[dict, PipelineItemError, None]] = []
+        keys = {}
+        for url in urls:
+            key, cached = self._cached(url)
+            results.append(cached)
+            keys[url] = key
+        missing = [url for url, result in zip(urls, results) if result is None]
+        if not missing:
+            return results
+
+        logger.debug("Making pipeline batch request with %d urls", len(missing))
+        response = self._post(self.batch_api, batch_payload(missing))
+        response.raise_for_status()
+        answers = response.json()["results"]
+        if len(answers) != len(missing):
+            raise ValueError(f"Batch of {len(missing)} urls got {len(answers)} results")
+
+        answers = iter(answers)
+        for i, url in enumerate(urls):
+            if results[i] is not None:
+                continue
+            nlp = next(answers)
+            if "error" in nlp:
+                results[i] = PipelineItemError(f"{url}: {nlp['error']}")
+                continue
+            results[i] = nlp
+            if keys[url] is not None:
+                self.cache.set(keys[url], nlp)
+        return results
+
+    def send_many(self, urls: Iterable[str]) -> Dict[str, Union[dict, Exception]]:
+        """Blocking batched requests for ``urls``, by URL.
+
+        Each URL maps to its pipeline response or the exception it failed
+        with, whether its own or its whole batch's.
+        """
+        results = {}
+        for batch in batch_urls(urls, self.batch_size, self.batch_max_bytes):
+            try:
+                results.update(zip(batch, self.send_batch(batch)))
+            except (requests.RequestException, ValueError, KeyError) as e:
+                results.update((url, e) for url in batch)
+        return results
+
+    def close(self):
+        if self._flush_call is not None and self._flush_call.active():
+            self._flush_call.cancel()
+        self._semaphore.close()
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+
+    def request(self, url, priority: float = 0) -> defer.Deferred:
+        """Deferred version of ``send``, batched if ``batch_api`` is set."""
+        if self.batch_api:
+            return self._enqueue(url, priority)
+        return self._semaphore.run(priority, threads.deferToThread, self.send, url)
+
+    def _enqueue(self, url, priority: float = 0) -> defer.Deferred:
+        d = defer.Deferred()
+        size = _url_size(url)
+        if self._pending and self._pending_bytes + size > self.batch_max_bytes:
+            self.flush()
+        self._pending.append((url, d, priority))
+        self._pending_bytes += size
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+        elif self._flush_call is None:
+            clock = self.clock
+            if clock is None:
+                from twisted.internet import reactor as clock
+            self._flush_call = clock.callLater(self.batch_wait, self.flush)
+        return d
+
+    def flush(self):
+        """Sends the pending URLs as one batch."""
+        if self._flush_call is not None and self._flush_call.active():
+            self._flush_call.cancel()
+        self._flush_call = None
+        batch, self._pending = self._pending, []
+        self._pending_bytes = _BATCH_OVERHEAD
+        if not batch:
+            return
+        urls = [url for url, _, _ in batch]
+        # A batch waits for a slot with the priority of its most urgent URL.
+        priority = max(priority for _, _, priority in batch)
+        d = self._semaphore.run(priority, threads.deferToThread, self.send_batch, urls)
+        d.addCallbacks(self._batch_done, self._batch_failed, (batch,), None, (batch,))
+
+    @staticmethod
+    def _batch_done(results, batch):
+        for (url, d, _), result in zip(batch, results):
+            if isinstance(result, Exception):
+                d.errback(result)
+            else:
+                d.callback(result)
+
+    @staticmethod
+    def _batch_failed(failure, batch):
+        for url, d, _ in batch:
+            d.errback(failure)
+
+    def url_to_data_object(
+        self,
+        url,
+        category,
+        subcategory=None,
+        builder=nlp_to_url_data_object,
+        priority: float = 0,
+    ) -> defer.Deferred:
+        """Deferred version of ``url_to_data_object``.
+
+        ``builder(nlp, url, category, subcategory)`` turns the pipeline
+        response into the data object; spiders can pass their own.
+        """
+        d = self.request(url, priority)
+        d.addCallback(builder, url, category, subcategory)
+        return d
+
+    def urls_to_data_objects(
+        self,
+        urls: Iterable[Tuple[str, Optional[str]]],
+        category,
+        builder=nlp_to_url_data_object,
+    ) -> defer.Deferred:
+        """Summarizes (url, subcategory) pairs concurrently.
+
+        Fires with the list of data objects. URLs whose request failed are
+        logged and left out rather than failing the whole batch.
+        """
+        urls = list(urls)
+        deferreds = [
+            self.url_to_data_object(url, category, subcategory, builder)
+            for url, subcategory in urls
+        ]
+        return gather_successes(deferreds, [url for url, _ in urls])
+
+
+_pipeline_client = None
+
+
+def get_pipeline_client(settings=None) -> PipelineClient:
+    """Returns the process-wide PipelineClient, creating it on first use.
+
+    Sharing one client means the in-flight limit applies to the whole crawl
+    rather than to each spider separately. If ``settings`` are given and don't
+    match the current client's configuration, the client is rebuilt, so a
+    client created earlier with defaults never overrides the crawl settings.
+    """
+    global _pipeline_client
+    if settings is None:
+        if _pipeline_client is None:
+            _pipeline_client = PipelineClient()
+        return _pipeline_client
+
+    config = PipelineClient.config_from_settings(settings)
+    if _pipeline_client is None or _pipeline_client.config != config:
+        if _pipeline_client is not None:
+            logger.info("Rebuilding pipeline client with config: %s", config)
+        _pipeline_client = PipelineClient(**config)
+    return _pipeline_client
+
+
+def close_pipeline_client():
+    """Closes the process-wide PipelineClient's connection pool, if any."""
+    global _pipeline_client
+    if _pipeline_client is not None:
+        _pipeline_client.close()
+        _pipeline_client = None
+
+
+_pipeline_client_users = 0
+
+
+def open_pipeline_client(settings=None) -> PipelineClient:
+    """``get_pipeline_client`` for a spider that uses it until it closes.
+
+    Each call must be paired with ``release_pipeline_client``. The client is
+    only closed once every spider in the process has released it, so spiders
+    sharing a process don't close it under each other.
+    """
+    global _pipeline_client_users
+    client = get_pipeline_client(settings)
+    _pipeline_client_users += 1
+    return client
+
+
+def release_pipeline_client():
+    global _pipeline_client_users
+    _pipeline_client_users = max(0, _pipeline_client_users - 1)
+    if not _pipeline_client_users:
+        close_pipeline_client()
@@ -0,0 +1,133 @@
+"""Small single-file SQLite key/value cache with TTL and LRU eviction."""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def make_key(*parts) -> str:
+    """Content-addressed key: SHA-256 of the JSON encoding of ``parts``."""
+    encoded = json.dumps(parts, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class SqliteCache:
+    """Key/value cache of JSON-serializable values stored in one SQLite file.
+
+    Values are stored zlib-compressed. Entries older than ``ttl`` seconds are
+    treated as missing (``ttl=0`` means they never expire). When the stored
+    values exceed ``max_bytes``, the least recently used entries are evicted.
+    The cache can be shared between threads.
+    """
+
+    def __init__(self, path: str, ttl: float = 0, max_bytes: int = 0):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)"
+        )
+        self._conn.commit()
+
+    def __repr__(self):
+        return (
+            f"{__class__.__name__}, path: {self.path}, "
+            f"ttl: {self.ttl}, max_bytes: {self.max_bytes}"
+        )
+
+    def get(self, key, default=None):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return default
+            value, created = row
+            if self.ttl and now - created > self.ttl:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return default
+            self._conn.execute(
+                "UPDATE cache SET accessed = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+        return json.loads(zlib.decompress(value))
+
+    def set(self, key, value):
+        blob = zlib.compress(json.dumps(value).encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)",
+                (key, blob, len(blob), now, now),
+            )
+            if self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def size(self) -> int:
+        """Total size in bytes of the stored (compressed) values."""
+        with self._lock:
+            return self._size()
+
+    def _size(self):
+        return self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM cache"
+        ).fetchone()[0]
+
+    def _evict(self):
+        excess = self._size() - self.max_bytes
+        if excess <= 0:
+            return
+        freed = 0
+        keys = []
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM cache ORDER BY accessed"
+        ):
+            keys.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self._conn.executemany("DELETE FROM cache WHERE key = ?", keys)
+        logger.debug("Evicted %d entries from %s", len(keys), self.path)
+
+    def purge_expired(self):
+        """Deletes entries older than the TTL."""
+        if not self.ttl:
+            return
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM cache WHERE created < ?", (time.time() - self.ttl,)
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
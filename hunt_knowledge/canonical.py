@@ -0,0 +1,235 @@
+"""Canonical URLs, so that every variant of an article's URL dedups to one key.
+
+``canonicalize`` maps the variants that get past exact-match dedup to one
+URL: http and https, ``www.`` and bare hosts, host case, default ports,
+fragments, tracking query parameters, parameter order, AMP paths, duplicate
+and trailing slashes. Per-domain ``DomainRule``s can restrict the query to an
+allowlist of parameters or lowercase the path. ``canonical_url`` also honours
+a fetched page's ``<link rel="canonical">``.
+
+Canonical URLs are dedup and cache keys, never fetched: the original URL is
+still the one requested and stored.
+"""
+
+import fnmatch
+import hashlib
+import json
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Bump when ``Canonicalizer._canonicalize`` changes, so stored keys are rebuilt.
+CANONICAL_VERSION = 1
+
+# Query parameters that never change the page (fnmatch patterns, lowercase).
+TRACKING_PARAMS = (
+    "utm_*",
+    "fbclid",
+    "gclid",
+    "dclid",
+    "msclkid",
+    "mc_cid",
+    "mc_eid",
+    "_ga",
+    "_gl",
+    "ref",
+    "ref_src",
+    "referrer",
+    "cmpid",
+    "icid",
+    "s_cid",
+    "ito",
+    "share",
+    "amp",
+    "outputtype",
+    "ftcamp",
+    "segmentid",
+)
+
+# Article URLs of the crawled sites carry no meaningful query parameters.
+DEFAULT_RULES = {
+    "ft.com": {"keep_params": []},
+    "fiercebiotech.com": {"keep_params": []},
+    "jpost.com": {"keep_params": []},
+    "pharmaceutical-technology.com": {"keep_params": []},
+}
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+class DomainRule:
+    """How the URLs of a domain and its subdomains are canonicalized.
+
+    - ``keep_params``: allowlist of query parameters; None keeps every
+      parameter but the tracking ones.
+    - ``drop_params``: more parameters to drop (fnmatch patterns).
+    - ``lowercase_path``: for sites whose paths are case-insensitive.
+    - ``strip_amp``: map AMP pages (``/amp/...``, ``.../amp``,
+      ``....amp.html``) to the regular page.
+    """
+
+    def __init__(
+        self,
+        keep_params=None,
+        drop_params=(),
+        lowercase_path: bool = False,
+        strip_amp: bool = True,
+    ):
+        self.keep_params = None if keep_params is None else set(keep_params)
+        self.drop_params = tuple(TRACKING_PARAMS) + tuple(drop_params)
+        self.lowercase_path = lowercase_path
+        self.strip_amp = strip_amp
+
+    def __repr__(self):
+        return (
+            f"{__class__.__name__}, keep_params: {self.keep_params}, "
+            f"lowercase_path: {self.lowercase_path}"
+        )
+
+    def keeps(self, param: str) -> bool:
+        if self.keep_params is not None:
+            return param in self.keep_params
+        name = param.lower()
+        return not any(fnmatch.fnmatchcase(name, p) for p in self.drop_params)
+
+
+class Canonicalizer:
+    """Canonicalizes URLs with per-domain rules, memoizing the latest
+    ``cache_size`` URLs in an LRU cache.
+
+    ``rules`` maps domains to ``DomainRule`` keyword arguments, added to (or
+    replacing) ``DEFAULT_RULES``. They apply to subdomains too, the most
+    specific domain winning. ``version`` identifies the canonicalization and
+    its rules, for stores keyed by canonical URLs.
+    """
+
+    def __init__(self, rules: Optional[Dict[str, dict]] = None, cache_size=100_000):
+        self.config = dict(rules=rules, cache_size=cache_size)
+        rules = {**DEFAULT_RULES, **(rules or {})}
+        self.rules = {
+            domain.lower(): DomainRule(**rule) for domain, rule in rules.items()
+        }
+        self.default_rule = DomainRule()
+        config = json.dumps([CANONICAL_VERSION, rules], sort_keys=True)
+        self.version = hashlib.sha1(config.encode()).hexdigest()[:12]
+        self.canonicalize = lru_cache(maxsize=cache_size)(self._canonicalize)
+
+    def __repr__(self):
+        return (
+            f"{__class__.__name__}, domains: {sorted(self.rules)}, "
+            f"version: {self.version}"
+        )
+
+    def rule_for(self, host: str) -> DomainRule:
+        labels = host.split(".")
+        for i in range(len(labels) - 1):
+            rule = self.rules.get(".".join(labels[i:]))
+            if rule is not None:
+                return rule
+        return self.default_rule
+
+    @staticmethod
+    def _path_segments(path: str, strip_amp: bool) -> Tuple[str, ...]:
+        segments = []
+        for segment in path.split("/"):
+            if segment in ("", "."):
+                continue
+            if segment == "..":
+                if segments:
+                    segments.pop()
+                continue
+            segments.append(segment)
+        if strip_amp and segments:
+            if segments[0] == "amp":
+                segments.pop(0)
+            elif segments[-1] == "amp":
+                segments.pop()
+        if strip_amp and segments:
+            last = segments[-1]
+            if last.endswith(".amp"):
+                segments[-1] = last[: -len(".amp")]
+            elif last.endswith(".amp.html"):
+                segments[-1] = last[: -len(".amp.html")] + ".html"
+        return tuple(segments)
+
+    def _canonicalize(self, url: str) -> str:
+        parts = urlsplit(url.strip())
+        scheme = parts.scheme.lower()
+        if scheme not in _DEFAULT_PORTS or not parts.hostname:
+            return url
+        host = parts.hostname.lower()
+        if host.startswith("www."):
+            host = host[len("www.") :]
+        try:
+            port = parts.port
+        except ValueError:
+            port = None
+        if port and port not in _DEFAULT_PORTS.values():
+            host = f"{host}:{port}"
+        rule = self.rule_for(host.split(":")[0])
+
+        path = "/".join(self._path_segments(parts.path, rule.strip_amp))
+        path = f"/{path}" if path else ""
+        if rule.lowercase_path:
+            path = path.lower()
+        params = [
+            (name, value)
+            for name, value in parse_qsl(parts.query, keep_blank_values=True)
+            if rule.keeps(name)
+        ]
+        query = urlencode(sorted(params))
+        return urlunsplit(("https", host, path, query, ""))
+
+    def canonical_url(self, response) -> str:
+        """Canonical URL of a fetched page: its ``rel="canonical"`` link if it
+        has one on the same site, else its URL."""
+        url = response.url
+        if hasattr(response, "xpath"):
+            href = response.xpath("//link[@rel='canonical']/@href").get()
+            if href:
+                candidate = urljoin(response.url, href.strip())
+                site = urlsplit(self.canonicalize(url)).netloc
+                if urlsplit(self.canonicalize(candidate)).netloc == site:
+                    url = candidate
+                else:
+                    logger.debug("Ignoring off-site canonical link %s", candidate)
+        return self.canonicalize(url)
+
+
+_canonicalizer: Optional[Canonicalizer] = None
+
+
+def get_canonicalizer(settings=None) -> Canonicalizer:
+    """Returns the process-wide Canonicalizer, creating it on first use.
+
+    URL_CANONICAL_RULES are added to ``DEFAULT_RULES``. As with
+    the pipeline client, it is rebuilt if ``settings`` configure it
+    differently.
+    """
+    global _canonicalizer
+    if settings is None:
+        if _canonicalizer is None:
+            _canonicalizer = Canonicalizer()
+        return _canonicalizer
+
+    rules = settings.getdict("URL_CANONICAL_RULES") or None
+    config = dict(
+        rules=rules, cache_size=settings.getint("URL_CANONICAL_CACHE_SIZE", 100_000)
+    )
+    if _canonicalizer is None or _canonicalizer.config != config:
+        _canonicalizer = Canonicalizer(**config)
+    return _canonicalizer
+
+
+def canonicalize(url: str) -> str:
+    """Canonical form of ``url`` with the process-wide Canonicalizer."""
+    return get_canonicalizer().canonicalize(url)
+
+
+def canonical_url(response) -> str:
+    """Canonical URL of a fetched page, honouring ``rel="canonical"``."""
+    return get_canonicalizer().canonical_url(response)
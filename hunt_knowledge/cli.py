@@ -1,11 +1,21 @@
 """Console script for hunt_knowledge."""
+
 import sys
+from pprint import pformat
+
 import click
+from scrapy.crawler import CrawlerProcess
+from scrapy.utils.project import get_project_settings
+
+from hunt_knowledge import sharding
 
 
-@click.command()
-def main(args=None):
+@click.group(invoke_without_command=True)
+@click.pass_context
+def main(ctx, args=None):
     """Console script for hunt_knowledge."""
+    if ctx.invoked_subcommand is not None:
+        return 0
     click.echo(
         "Replace this message by putting your code into " "hunt_knowledge.cli.main"
     )
@@ -13,5 +23,67 @@ def main(args=None):
     return 0
 
 
+@main.command("crawl-all")
+@click.argument("spiders", nargs=-1)
+@click.option(
+    "--concurrency",
+    "-c",
+    type=int,
+    default=None,
+    help="Max concurrent requests per spider, unless set in "
+    "SPIDER_CONCURRENT_REQUESTS.",
+)
+@click.option(
+    "--processes",
+    "-p",
+    type=int,
+    default=1,
+    help="Shard the spiders across this many worker processes.",
+)
+@click.option(
+    "--split-start-urls",
+    is_flag=True,
+    help="With --processes, also shard each spider's start URLs.",
+)
+@click.option(
+    "--jobdir",
+    type=click.Path(file_okay=False),
+    default=None,
+    help="Persist each spider's request queue under this directory, so an "
+    "interrupted crawl resumes when run again with the same --jobdir.",
+)
+def crawl_all(spiders, concurrency, processes, split_start_urls, jobdir):
+    """Run SPIDERS (default: every news spider) in one process.
+
+    The spiders share the reactor, the pipeline client, the dedup index, the
+    DynamoDB client and the headless Chrome pool. With --processes, they are
+    sharded across a process pool instead, coordinating dedup through the
+    shared DedupStore, and the workers' stats are reported together.
+    """
+    settings = get_project_settings()
+    if jobdir:
+        settings.set("CRAWL_JOBDIR", jobdir, priority="cmdline")
+    process = CrawlerProcess(settings)
+    available = process.spider_loader.list()
+    unknown = sorted(set(spiders) - set(available))
+    if unknown:
+        raise click.BadParameter(
+            f"unknown spiders {', '.join(unknown)}; available: {', '.join(available)}",
+            param_hint="SPIDERS",
+        )
+
+    spiders = list(spiders or sharding.news_spiders(process.spider_loader, available))
+    if processes > 1:
+        report = sharding.run_sharded(
+            spiders, processes, split_start_urls, concurrency, jobdir
+        )
+        click.echo(pformat(report["total"]))
+        return 0
+
+    sharding.add_crawlers(process, [(name, {}) for name in spiders], concurrency)
+    process.start()
+    return 0
+
+
 if __name__ == "__main__":
     sys.exit(main())  # pragma: no cover
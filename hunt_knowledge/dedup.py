@@ -0,0 +1,371 @@
+"""Constant-time dedup index of article URLs and titles."""
+
+import hashlib
+import math
+import os
+import sqlite3
+import threading
+from typing import Callable, Iterable, Optional, Tuple
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Bump when the DedupStore's entries or watermarks tables change.
+SCHEMA_VERSION = 3
+
+
+def _digest(value: str) -> bytes:
+    return hashlib.blake2b(value.encode("utf-8"), digest_size=16).digest()
+
+
+class BloomFilter:
+    """Memory-bounded set membership with a configurable false positive rate.
+
+    Sized for ``capacity`` entries at ``error_rate``; it never gives false
+    negatives, so a URL reported as unseen has definitely not been added.
+    """
+
+    def __init__(self, capacity: int = 1_000_000, error_rate: float = 0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(
+            8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+        )
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def __repr__(self):
+        return (
+            f"{__class__.__name__}, capacity: {self.capacity}, "
+            f"error_rate: {self.error_rate}, count: {self.count}"
+        )
+
+    def _positions(self, digest: bytes):
+        # Kirsch-Mitzenmacher double hashing from one 128-bit digest.
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.num_bits for i in range(self.num_hashes))
+
+    def add_digest(self, digest: bytes):
+        for position in self._positions(digest):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, digest: bytes):
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(digest)
+        )
+
+
+class DedupIndex:
+    """Hashed index of the URLs and titles already in the database.
+
+    Lookups are O(1). By default digests are kept in sets; with ``bloom=True``
+    they go into Bloom filters instead, bounding memory for multi-week windows
+    at the cost of rare false positives (an article wrongly treated as seen).
+
+    URLs are passed through ``normalize_url`` before hashing. The categories
+    already loaded are tracked, so one index can be built once per crawl and
+    shared by every spider and category. An optional ``store`` persists the
+    digests between runs (see ``DedupStore``).
+    """
+
+    def __init__(
+        self,
+        normalize_url: Callable[[str], str] = lambda url: url,
+        bloom: bool = False,
+        capacity: int = 1_000_000,
+        error_rate: float = 0.001,
+        store: Optional["DedupStore"] = None,
+    ):
+        self.normalize_url = normalize_url
+        self.bloom = bloom
+        self.store = store
+        if bloom:
+            self._urls = BloomFilter(capacity, error_rate)
+            self._titles = BloomFilter(capacity, error_rate)
+        else:
+            self._urls = set()
+            self._titles = set()
+        self.loaded = set()
+        self.lock = threading.RLock()
+
+    def __repr__(self):
+        return (
+            f"{__class__.__name__}, bloom: {self.bloom}, "
+            f"loaded: {sorted(self.loaded)}"
+        )
+
+    @staticmethod
+    def _add(container, digest):
+        if isinstance(container, set):
+            container.add(digest)
+        else:
+            container.add_digest(digest)
+
+    def url_digest(self, url: str) -> bytes:
+        return _digest(self.normalize_url(url))
+
+    def title_digest(self, title: str) -> bytes:
+        return _digest(title)
+
+    def add_digest(self, kind: str, digest: bytes):
+        """Adds a precomputed ``url`` or ``title`` digest."""
+        self._add(self._urls if kind == "url" else self._titles, digest)
+
+    def add_url(self, url: str):
+        self._add(self._urls, self.url_digest(url))
+
+    def add_title(self, title: str):
+        self._add(self._titles, self.title_digest(title))
+
+    def add_urls(self, urls: Iterable[str]):
+        for url in urls:
+            self.add_url(url)
+
+    def add_titles(self, titles: Iterable[str]):
+        for title in titles:
+            self.add_title(title)
+
+    def has_url(self, url: str) -> bool:
+        return self.url_digest(url) in self._urls
+
+    def has_title(self, title: str) -> bool:
+        return self.title_digest(title) in self._titles
+
+    def is_loaded(self, key) -> bool:
+        return key in self.loaded
+
+    def load(self, key, fetch: Callable[[], Iterable[dict]]):
+        """Adds the url and title of each item from ``fetch()``, once per key.
+
+        ``key`` identifies what was loaded, e.g. (table, category, period);
+        calling again with the same key does nothing.
+        """
+        with self.lock:
+            if key in self.loaded:
+                return
+            count = 0
+            for item in fetch():
+                if item.get("url"):
+                    self.add_url(item["url"])
+                if item.get("title"):
+                    self.add_title(item["title"])
+                count += 1
+            self.loaded.add(key)
+        logger.info("Loaded %d articles into dedup index for %s", count, key)
+
+    def load_digests(self, key, fetch: Callable[[], Iterable[Tuple[str, bytes]]]):
+        """Like ``load``, but ``fetch()`` yields (kind, digest) pairs."""
+        with self.lock:
+            if key in self.loaded:
+                return
+            count = 0
+            for kind, digest in fetch():
+                self.add_digest(kind, digest)
+                count += 1
+            self.loaded.add(key)
+        logger.info("Loaded %d digests into dedup index for %s", count, key)
+
+    def filter_new(self, urls: Iterable[str], titles: Optional[dict] = None):
+        """Yields the URLs (and, if given, ``titles[url]``) not in the index."""
+        for url in urls:
+            if self.has_url(url):
+                continue
+            if titles and titles.get(url) and self.has_title(titles[url]):
+                continue
+            yield url
+
+
+class DedupStore:
+    """Local SQLite copy of the dedup index, with a per-category watermark.
+
+    Records the digests of the URLs and titles seen per category, and the
+    latest ``createdAt`` fetched from DynamoDB. A run then only has to query
+    the articles newer than the watermark instead of the whole window, so
+    startup cost depends on the number of new articles.
+
+    The store can be shared by several processes. Crawl workers use
+    ``claim`` so that only one of them summarizes each new URL.
+
+    URL digests depend on how URLs were canonicalized. If ``version`` (see
+    ``Canonicalizer.version``) differs from the one the store was built with,
+    the store is emptied, and the next sync refetches the whole window.
+
+    Entries and watermarks are kept per dedup period, so that spiders sharing
+    a category with a shorter period don't prune what the others need. Syncs
+    query from ``sync_lag`` seconds before the watermark, to catch articles
+    that became visible late.
+    """
+
+    def __init__(
+        self, path: str, version: Optional[str] = None, sync_lag: float = 3600
+    ):
+        self.path = path
+        self.sync_lag = sync_lag
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS meta ("
+            "key TEXT NOT NULL PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        self._migrate()
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "table_name TEXT NOT NULL, category TEXT NOT NULL, "
+            "period INTEGER NOT NULL, kind TEXT NOT NULL, "
+            "digest BLOB NOT NULL, created_at TEXT NOT NULL, "
+            "PRIMARY KEY (table_name, category, period, kind, digest))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS watermarks ("
+            "table_name TEXT NOT NULL, category TEXT NOT NULL, "
+            "period INTEGER NOT NULL, created_at TEXT NOT NULL, "
+            "PRIMARY KEY (table_name, category, period))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS claims ("
+            "run_id TEXT NOT NULL, digest BLOB NOT NULL, "
+            "PRIMARY KEY (run_id, digest))"
+        )
+        self._conn.commit()
+        if version is not None:
+            self._check_version(version)
+
+    def _migrate(self):
+        """Drops the entries and watermarks of an older schema, refetched by
+        the next sync."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            row = self._conn.execute(
+                "SELECT value FROM meta WHERE key = 'schema'"
+            ).fetchone()
+            if row is None or row[0] != str(SCHEMA_VERSION):
+                self._conn.execute("DROP TABLE IF EXISTS entries")
+                self._conn.execute("DROP TABLE IF EXISTS watermarks")
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta VALUES ('schema', ?)",
+                    (str(SCHEMA_VERSION),),
+                )
+            self._conn.commit()
+
+    def _check_version(self, version: str):
+        with self._lock:
+            # Locks the store, so concurrent workers reset it at most once.
+            self._conn.execute("BEGIN IMMEDIATE")
+            row = self._conn.execute(
+                "SELECT value FROM meta WHERE key = 'url_version'"
+            ).fetchone()
+            if row is None or row[0] != version:
+                if row is not None:
+                    logger.info(
+                        "URL canonicalization changed, emptying dedup store %s",
+                        self.path,
+                    )
+                for table in ("entries", "watermarks", "claims"):
+                    self._conn.execute(f"DELETE FROM {table}")
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta VALUES ('url_version', ?)",
+                    (version,),
+                )
+            self._conn.commit()
+
+    def __repr__(self):
+        return f"{__class__.__name__}, path: {self.path}"
+
+    def watermark(self, table_name: str, category: str, period: int) -> Optional[str]:
+        """Latest createdAt stored for the category and period, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT created_at FROM watermarks "
+                "WHERE table_name = ? AND category = ? AND period = ?",
+                (table_name, category, period),
+            ).fetchone()
+        return row[0] if row else None
+
+    def merge(
+        self, table_name: str, category: str, period: int, entries, watermark: str
+    ):
+        """Stores (kind, digest, created_at) entries and advances the watermark."""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    (table_name, category, period, kind, digest, created_at)
+                    for kind, digest, created_at in entries
+                ),
+            )
+            self._conn.execute(
+                "INSERT INTO watermarks VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (table_name, category, period) DO UPDATE SET "
+                "created_at = MAX(created_at, excluded.created_at)",
+                (table_name, category, period, watermark),
+            )
+            self._conn.commit()
+
+    def prune(self, table_name: str, category: str, period: int, before: str):
+        """Deletes the category's entries for ``period`` created before
+        ``before``."""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM entries WHERE table_name = ? AND category = ? "
+                "AND period = ? AND created_at < ?",
+                (table_name, category, period, before),
+            )
+            self._conn.commit()
+
+    def entries(
+        self,
+        table_name: str,
+        category: str,
+        period: int,
+        kinds: Optional[Iterable[str]] = None,
+    ):
+        """The (kind, digest) pairs stored for the category and period, of
+        the given ``kinds`` if any.
+
+        Besides ``url`` and ``title`` digests, ``headline`` entries hold the
+        titles' UTF-8 text, for the NearDuplicateIndex.
+        """
+        query = (
+            "SELECT kind, digest FROM entries "
+            "WHERE table_name = ? AND category = ? AND period = ?"
+        )
+        params = [table_name, category, period]
+        if kinds is not None:
+            kinds = list(kinds)
+            query += f" AND kind IN ({', '.join('?' * len(kinds))})"
+            params += kinds
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return rows
+
+    def claim(self, run_id: str, digests: Iterable[bytes]) -> set:
+        """Claims digests for a run, returning those no one had claimed yet."""
+        claimed = set()
+        with self._lock:
+            for digest in digests:
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO claims VALUES (?, ?)", (run_id, digest)
+                )
+                if cursor.rowcount:
+                    claimed.add(digest)
+            self._conn.commit()
+        return claimed
+
+    def clear_claims(self, keep_run: Optional[str] = None):
+        """Deletes the claims of every run except ``keep_run``."""
+        with self._lock:
+            self._conn.execute("DELETE FROM claims WHERE run_id IS NOT ?", (keep_run,))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
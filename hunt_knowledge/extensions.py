@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+
+# Define here the extensions for the project
+#
+# See documentation in:
+# https://docs.scrapy.org/en/latest/topics/extensions.html
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from twisted.web.resource import Resource
+
+from hunt_knowledge import logs, metrics, utils
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class PipelineClientExtension:
+    """Configures the shared pipeline client.
+
+    The client is closed when the last spider of the process closes.
+    """
+
+    def __init__(self, settings):
+        self.settings = settings
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        ext = cls(crawler.settings)
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        return ext
+
+    def spider_opened(self, spider):
+        utils.open_pipeline_client(self.settings)
+
+    def spider_closed(self, spider):
+        utils.release_pipeline_client()
+
+
+class WebDriverPoolExtension:
+    """Registers spiders with the shared WebDriverPool.
+
+    Chrome is only started when a spider first renders a page. Once the last
+    spider using the pool closes, every driver is quit, so no Chrome
+    processes are leaked.
+    """
+
+    def __init__(self, settings):
+        self.settings = settings
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        ext = cls(crawler.settings)
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        return ext
+
+    def spider_opened(self, spider):
+        utils.get_webdriver_pool(self.settings).open()
+
+    def spider_closed(self, spider):
+        utils.get_webdriver_pool(self.settings).close()
+
+
+class MetricsResource(Resource):
+    isLeaf = True
+
+    def render_GET(self, request):
+        request.setHeader(b"Content-Type", b"text/plain; version=0.0.4")
+        return metrics.get_stage_metrics().render().encode("utf-8")
+
+
+class MetricsExtension:
+    """Exports the per-stage timings collected in hunt_knowledge.metrics.
+
+    When a spider closes, its count, total and max seconds per stage are added
+    to its crawl stats (``stages/<stage>/...``). The labelled histograms of
+    every spider in the process can also be served as Prometheus text on
+    ``http://METRICS_HOST:METRICS_PORT/metrics``, or written every
+    METRICS_TEXTFILE_INTERVAL seconds to METRICS_TEXTFILE.
+    """
+
+    # The endpoint and textfile are shared by every crawler in the process.
+    open_spiders = 0
+    listener = None
+    writer = None
+
+    def __init__(self, settings, stats):
+        self.settings = settings
+        self.stats = stats
+        self.port = settings.getint("METRICS_PORT")
+        self.host = settings.get("METRICS_HOST", "127.0.0.1")
+        self.textfile = settings.get("METRICS_TEXTFILE")
+        self.interval = settings.getfloat("METRICS_TEXTFILE_INTERVAL", 15.0)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("STAGE_METRICS_ENABLED", True):
+            raise NotConfigured
+        ext = cls(crawler.settings, crawler.stats)
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        return ext
+
+    def spider_opened(self, spider):
+        cls = type(self)
+        cls.open_spiders += 1
+        if self.port and cls.listener is None:
+            from twisted.internet import reactor
+            from twisted.web.server import Site
+
+            root = Resource()
+            root.putChild(b"metrics", MetricsResource())
+            cls.listener = reactor.listenTCP(self.port, Site(root), interface=self.host)
+            spider.logger.info(
+                "Serving metrics on http://%s:%s/metrics", self.host, self.port
+            )
+        if self.textfile and cls.writer is None:
+            from twisted.internet import task
+
+            cls.writer = task.LoopingCall(self.write_textfile)
+            cls.writer.start(self.interval, now=False)
+
+    def spider_closed(self, spider):
+        for key, value in metrics.get_stage_metrics().spider_stats(spider.name).items():
+            self.stats.set_value(key, value)
+        if self.textfile:
+            self.write_textfile()
+
+        cls = type(self)
+        cls.open_spiders = max(0, cls.open_spiders - 1)
+        if cls.open_spiders:
+            return None
+        if cls.writer is not None:
+            cls.writer.stop()
+            cls.writer = None
+        if cls.listener is not None:
+            listener, cls.listener = cls.listener, None
+            return listener.stopListening()
+        return None
+
+    def write_textfile(self):
+        try:
+            metrics.get_stage_metrics().write_textfile(self.textfile)
+        except OSError as e:
+            logger.warning("Failed to write metrics to %s: %s", self.textfile, e)
+
+
+class JsonLoggingExtension:
+    """Writes the project's logs as size-rotated JSON lines to LOG_JSON_FILE."""
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not logs.setup_json_logging(crawler.settings):
+            raise NotConfigured
+        return cls()
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+
+# HTTP cache policy for the project's landing pages
+#
+# See documentation in:
+# https://docs.scrapy.org/en/latest/topics/downloader-middleware.html#httpcache-middleware-settings
+
+from scrapy.extensions.httpcache import RFC2616Policy
+
+
+class RevalidatingPolicy(RFC2616Policy):
+    """RFC2616 policy that revalidates every cached page on every run.
+
+    News landing pages often advertise a long max-age, but we want to see new
+    articles as soon as they appear. Instead of serving the cached copy as
+    fresh, each request is sent with If-None-Match / If-Modified-Since from
+    the cached response; a 304 answer is served from the cache without
+    downloading the page again.
+    """
+
+    def is_cached_response_fresh(self, cachedresponse, request):
+        self._set_conditional_validators(request, cachedresponse)
+        return False
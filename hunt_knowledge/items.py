@@ -5,10 +5,101 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/items.html
 
-import scrapy
+import re
+import uuid
+from datetime import datetime
+from typing import List, Optional, Union
 
+import attr
 
-class ScrapeNewsItem(scrapy.Item):
-    # define the fields for your item here like:
-    # name = scrapy.Field()
-    pass
+TIMESTAMP_RE = re.compile(r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(\.\d+)?Z$")
+
+
+def utc_timestamp() -> str:
+    """Current UTC time in the DB's format, e.g. 2020-06-02T10:00:00.000Z."""
+    return datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+class InvalidArticle(ValueError):
+    """Raised when an Article is missing fields required by the DB."""
+
+
+@attr.s(slots=True, auto_attribs=True, kw_only=True, repr=False)
+class Article:
+    """An article ready to be written to CuratedArticlesDB.
+
+    Attribute names match the DB attributes, except ``typename`` which is
+    stored as ``__typename``. Instances use ``__slots__``, so buffering
+    thousands of them for batch writes costs no per-item ``__dict__``. The
+    repr leaves out the text, since Scrapy logs every scraped item.
+
+    ``absSum`` is the pipeline's ``abstractiveSummary`` as is: a list of
+    sentences, or None when the pipeline couldn't summarize the article.
+    """
+
+    url: str
+    category: str
+    title: str
+    source: str
+    absSum: Optional[Union[List[str], str]]
+    text: str
+    subcategory: Optional[str] = None
+    mercuryObj: dict = attr.Factory(dict)
+    id: str = attr.Factory(lambda: str(uuid.uuid1()))
+    createdAt: str = attr.Factory(utc_timestamp)
+    updatedAt: str = attr.Factory(utc_timestamp)
+    typename: str = "Article"
+
+    # The table's key and its category-createdAt-index keys, and the url.
+    required = ("id", "url", "category", "createdAt")
+
+    def __repr__(self):
+        return (
+            f"{__class__.__name__}, id: {self.id}, url: {self.url}, "
+            f"title: {self.title!r}, text: {len(self.text)} chars"
+        )
+
+    @classmethod
+    def from_nlp(cls, nlp, category, subcategory=None, url=None):
+        """Builds an Article from a genei-pipeline response."""
+        doc = nlp["doc"]
+        metadata = dict(nlp["metadata"])
+        metadata.update({"domain": nlp["source"]})
+        now = utc_timestamp()
+        return cls(
+            createdAt=now,
+            updatedAt=metadata.get("date_published") or now,
+            mercuryObj=metadata,
+            url=url or metadata.get("url"),
+            category=category,
+            subcategory=subcategory,
+            absSum=doc["abstractiveSummary"],
+            title=nlp["title"],
+            source=nlp["source"],
+            text=doc["text"],
+        )
+
+    def validate(self):
+        """Raises InvalidArticle if the DB would reject or mis-index this item."""
+        for name in self.required:
+            value = getattr(self, name)
+            if not isinstance(value, str) or not value:
+                raise InvalidArticle(f"Article field {name} is empty: {value!r}")
+        if not self.url.startswith(("http://", "https://")):
+            raise InvalidArticle(f"Article url is not absolute: {self.url}")
+        if not TIMESTAMP_RE.match(self.createdAt):
+            raise InvalidArticle(f"Article createdAt is malformed: {self.createdAt}")
+        return self
+
+    def to_dict(self) -> dict:
+        """The DB representation, with ``__typename``."""
+        data = {
+            field.name: getattr(self, field.name)
+            for field in attr.fields(type(self))
+            if field.name != "typename"
+        }
+        data["__typename"] = self.typename
+        return data
+
+
+ScrapeNewsItem = Article
@@ -0,0 +1,134 @@
+"""Write-ahead journal of summarized articles, so a crash doesn't lose them.
+
+Every article is recorded as soon as the item pipeline gets it, before it is
+queued for DynamoDB, and marked written once its batch is stored. A crawl
+killed in between leaves the summarized but unwritten articles pending in the
+journal: the next run of the spider writes them without summarizing them
+again, and the spider skips their URLs.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterable, List, Optional
+
+from hunt_knowledge.canonical import canonicalize
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ItemJournal:
+    """SQLite journal of the items of each spider, keyed by canonical URL.
+
+    Like the DedupStore, it can be shared by the threads and the worker
+    processes of a crawl; its methods block, so call them from a thread.
+    Items are stored as their DB representation (see ``Article.to_dict``)
+    and replayed as such.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # Commits survive a killed process without an fsync each.
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS items ("
+            "key TEXT NOT NULL PRIMARY KEY, spider TEXT NOT NULL, "
+            "item TEXT NOT NULL, recorded_at REAL NOT NULL, written_at REAL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS pending ON items (spider) "
+            "WHERE written_at IS NULL"
+        )
+        self._conn.commit()
+
+    def __repr__(self):
+        return f"{__class__.__name__}, path: {self.path}"
+
+    def record(self, spider: str, items: Iterable[dict]):
+        """Records ``items`` as pending, replacing any entries for their URLs,
+        in one transaction."""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?, NULL)",
+                (
+                    (
+                        canonicalize(item["url"]),
+                        spider,
+                        json.dumps(item, default=str),
+                        now,
+                    )
+                    for item in items
+                ),
+            )
+            self._conn.commit()
+
+    def mark_written(self, urls: Iterable[str]):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE items SET written_at = ? WHERE key = ?",
+                ((now, canonicalize(url)) for url in urls),
+            )
+            self._conn.commit()
+
+    def mark_dropped(self, urls: Iterable[str]):
+        """Marks items that can never be written as done, so they aren't
+        replayed, nor their articles summarized again while retained."""
+        self.mark_written(urls)
+
+    def pending(self, spider: str) -> List[dict]:
+        """The spider's items recorded but not written yet, oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT item FROM items WHERE spider = ? AND written_at IS NULL "
+                "ORDER BY recorded_at",
+                (spider,),
+            ).fetchall()
+        return [json.loads(item) for item, in rows]
+
+    def keys(self) -> set:
+        """The canonical URLs of the articles recorded, written or not."""
+        with self._lock:
+            rows = self._conn.execute("SELECT key FROM items").fetchall()
+        return {key for key, in rows}
+
+    def prune(self, before: float):
+        """Deletes the items written before the ``before`` timestamp."""
+        with self._lock:
+            self._conn.execute("DELETE FROM items WHERE written_at < ?", (before,))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_item_journal: Optional[ItemJournal] = None
+
+
+def get_item_journal(settings) -> Optional[ItemJournal]:
+    """Returns the process-wide ItemJournal, or None if ITEM_JOURNAL_ENABLED
+    is off.
+
+    On first use, the items written more than ITEM_JOURNAL_RETENTION seconds
+    ago are pruned.
+    """
+    global _item_journal
+    if not settings.getbool("ITEM_JOURNAL_ENABLED"):
+        return None
+    if _item_journal is None:
+        _item_journal = ItemJournal(settings.get("ITEM_JOURNAL_PATH"))
+        retention = settings.getfloat("ITEM_JOURNAL_RETENTION", 7 * 24 * 3600)
+        _item_journal.prune(time.time() - retention)
+    return _item_journal
@@ -0,0 +1,105 @@
+"""Bounded log payloads and size-rotated JSON-lines log output.
+
+Log calls in the crawl loop use lazy %-style arguments, so nothing is
+formatted unless a handler emits the record, and anything that can grow with
+a page (URL lists, items) is passed through ``Preview`` so that only a count
+and the first few entries are ever formatted.
+"""
+
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+from typing import Optional
+
+# Attributes every LogRecord has; anything else was passed with ``extra``.
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class Preview:
+    """Lazily formats a collection as its size and first ``limit`` entries.
+
+    ``logger.info("New URLs: %s", Preview(urls, limit=2))`` logs e.g.
+    ``40 items: ['https://a.com/1', 'https://a.com/2', ...]``, and formats
+    nothing at all if the record is filtered out.
+    """
+
+    __slots__ = ("values", "limit")
+
+    def __init__(self, values, limit: int = 5):
+        self.values = values
+        self.limit = limit
+
+    def __str__(self):
+        values = list(self.values)
+        head = ", ".join(repr(value) for value in values[: self.limit])
+        more = ", ..." if len(values) > self.limit else ""
+        return f"{len(values)} items: [{head}{more}]"
+
+    __repr__ = __str__
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Formats records as one JSON object per line.
+
+    Fields: time, level, logger, message (truncated to ``max_message``
+    characters), spider (if the record has one) and any other ``extra``
+    fields that are JSON-serializable.
+    """
+
+    def __init__(self, max_message: int = 2000):
+        super().__init__()
+        self.max_message = max_message
+
+    def format(self, record):
+        message = record.getMessage()
+        if len(message) > self.max_message:
+            extra_chars = len(message) - self.max_message
+            message = f"{message[: self.max_message]}...(+{extra_chars} chars)"
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": message,
+        }
+        for key, value in vars(record).items():
+            if key in _RECORD_ATTRS or key in entry:
+                continue
+            if key == "spider":
+                value = getattr(value, "name", value)
+            entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+_json_handler: Optional[RotatingFileHandler] = None
+
+
+def setup_json_logging(settings) -> Optional[RotatingFileHandler]:
+    """Adds a size-rotated JSON-lines handler to the ``hunt_knowledge`` logger.
+
+    Does nothing if LOG_JSON_FILE is unset, or if the handler was already
+    added by another crawler of the process.
+    """
+    global _json_handler
+    path = settings.get("LOG_JSON_FILE")
+    if not path or _json_handler is not None:
+        return _json_handler
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    handler = RotatingFileHandler(
+        path,
+        maxBytes=settings.getint("LOG_JSON_MAX_BYTES", 10 * 1024 * 1024),
+        backupCount=settings.getint("LOG_JSON_BACKUP_COUNT", 5),
+        encoding="utf-8",
+    )
+    handler.setLevel(settings.get("LOG_JSON_LEVEL", "INFO"))
+    handler.setFormatter(
+        JsonLinesFormatter(settings.getint("LOG_JSON_MAX_MESSAGE", 2000))
+    )
+    logging.getLogger("hunt_knowledge").addHandler(handler)
+    _json_handler = handler
+    return handler
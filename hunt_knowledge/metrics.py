@@ -0,0 +1,170 @@
+"""Per-stage timing histograms, exported as crawl stats and Prometheus text."""
+
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Tuple
+
+from twisted.internet import defer
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# The stages of a crawl that are timed.
+RENDER = "render"
+LINK_EXTRACT = "link_extract"
+DEDUP_QUERY = "dedup_query"
+PIPELINE_REQUEST = "pipeline_request"
+DB_WRITE = "db_write"
+
+# Upper bounds in seconds, from a link extraction to a slow summary.
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    120.0,
+)
+
+# (stage, spider, category)
+Labels = Tuple[str, str, str]
+
+
+class Histogram:
+    """Cumulative-bucket histogram of durations, as in Prometheus."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def __repr__(self):
+        return f"{__class__.__name__}, count: {self.count}, sum: {self.sum}"
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def cumulative(self):
+        """(upper bound, count of observations <= bound) pairs, ending at +Inf."""
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            yield bound, total
+
+
+class StageMetrics:
+    """Timing histograms per (stage, spider, category).
+
+    Shared by every spider of the process and safe to update from threads.
+    The MetricsExtension copies each spider's totals into its crawl stats, and
+    ``render`` gives the Prometheus text exposition format.
+    """
+
+    name = "hunt_knowledge_stage_seconds"
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.histograms: Dict[Labels, Histogram] = {}
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return f"{__class__.__name__}, series: {len(self.histograms)}"
+
+    def observe(self, stage: str, seconds: float, spider: str, category=None):
+        labels = (stage, spider or "", category or "")
+        with self.lock:
+            histogram = self.histograms.get(labels)
+            if histogram is None:
+                histogram = self.histograms[labels] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, stage: str, spider: str, category=None):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.monotonic() - started, spider, category)
+
+    def time_deferred(
+        self, d: defer.Deferred, stage: str, spider: str, category=None
+    ) -> defer.Deferred:
+        """Observes the time until ``d`` fires, successfully or not."""
+        started = time.monotonic()
+
+        def observe(result):
+            self.observe(stage, time.monotonic() - started, spider, category)
+            return result
+
+        return d.addBoth(observe)
+
+    def spider_stats(self, spider: str) -> dict:
+        """Crawl stats for ``spider``: count, total and max seconds per stage."""
+        stats = {}
+        with self.lock:
+            for (stage, name, _), histogram in self.histograms.items():
+                if name != spider:
+                    continue
+                prefix = f"stages/{stage}"
+                stats[f"{prefix}/count"] = (
+                    stats.get(f"{prefix}/count", 0) + histogram.count
+                )
+                stats[f"{prefix}/seconds_total"] = round(
+                    stats.get(f"{prefix}/seconds_total", 0) + histogram.sum, 3
+                )
+                stats[f"{prefix}/seconds_max"] = round(
+                    max(stats.get(f"{prefix}/seconds_max", 0), histogram.max), 3
+                )
+        return stats
+
+    def render(self) -> str:
+        """The histograms in the Prometheus text exposition format."""
+        lines = [
+            f"# HELP {self.name} Time spent in each crawl stage.",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self.lock:
+            for (stage, spider, category), histogram in sorted(self.histograms.items()):
+                labels = f'stage="{stage}",spider="{spider}",category="{category}"'
+                for bound, count in histogram.cumulative():
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'{self.name}_bucket{{{labels},le="{le}"}} {count}')
+                lines.append(f"{self.name}_sum{{{labels}}} {histogram.sum}")
+                lines.append(f"{self.name}_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str):
+        """Atomically writes ``render()`` to ``path``, e.g. for node_exporter."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(self.render())
+        os.replace(tmp, path)
+
+
+# Created at import, since stages are timed from worker threads too.
+_stage_metrics = StageMetrics()
+
+
+def get_stage_metrics() -> StageMetrics:
+    """Returns the process-wide StageMetrics."""
+    return _stage_metrics
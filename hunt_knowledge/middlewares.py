@@ -5,7 +5,14 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import hashlib
+
 from scrapy import signals
+from scrapy.http import HtmlResponse
+from scrapy.utils.defer import maybe_deferred_to_future
+from twisted.internet import threads
+
+from hunt_knowledge import canonical, metrics, utils
 
 
 class HuntKnowledgeSpiderMiddleware:
@@ -57,18 +64,37 @@ class HuntKnowledgeSpiderMiddleware:
 
 
 class HuntKnowledgeDownloaderMiddleware:
-    # Not all methods need to be defined. If a method is not defined,
-    # scrapy acts as if the downloader middleware does not modify the
-    # passed objects.
+    """Renders requests flagged with ``meta={"render": True}`` in headless Chrome.
+
+    Rendering runs in the reactor thread pool with a driver from the shared
+    WebDriverPool, and the rendered DOM comes back as an HtmlResponse, so the
+    page is fetched once and the rest of the middleware chain (cache, stats,
+    retries) sees rendered pages like any other response. It is installed
+    after HttpCacheMiddleware (900), which stores the rendered DOM. Rendered
+    pages are still rendered on every run: they carry no ETag or
+    Last-Modified to revalidate, and ``RevalidatingPolicy`` never serves a
+    cached page as fresh.
+
+    Requests answered here bypass the downloader slots, so the number of
+    pages rendered at once is bounded by WEBDRIVER_POOL_SIZE rather than by
+    CONCURRENT_REQUESTS.
+
+    With ``meta={"render": True, "render_links": True}``, the page's links
+    (url, anchor text and section) are also collected in the same browser
+    session and stored in ``response.meta["links"]``.
+    """
+
+    def __init__(self, settings):
+        self.settings = settings
 
     @classmethod
     def from_crawler(cls, crawler):
         # This method is used by Scrapy to create your spiders.
-        s = cls()
+        s = cls(crawler.settings)
         crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
         return s
 
-    def process_request(self, request, spider):
+    async def process_request(self, request, spider):
         # Called for each request that goes through the downloader
         # middleware.
 
@@ -78,7 +104,27 @@ class HuntKnowledgeDownloaderMiddleware:
         # - or return a Request object
         # - or raise IgnoreRequest: process_exception() methods of
         #   installed downloader middleware will be called
-        return None
+        if not request.meta.get("render"):
+            return None
+        d = metrics.get_stage_metrics().time_deferred(
+            threads.deferToThread(self.render, request),
+            metrics.RENDER,
+            spider.name,
+            getattr(spider, "db_category", None),
+        )
+        return await maybe_deferred_to_future(d)
+
+    def render(self, request):
+        pool = utils.get_webdriver_pool(self.settings)
+        with pool.driver() as driver:
+            driver.get(request.url)
+            url = driver.current_url
+            body = driver.page_source
+            if request.meta.get("render_links"):
+                request.meta["links"] = utils.selenium_extract_links(driver)
+        return HtmlResponse(
+            url=url, body=body, encoding="utf-8", request=request, flags=["rendered"]
+        )
 
     def process_response(self, request, response, spider):
         # Called with the response returned from the downloader.
@@ -101,3 +147,40 @@ class HuntKnowledgeDownloaderMiddleware:
 
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
+
+
+class UnchangedPageMiddleware:
+    """Flags responses whose body is byte-identical to the last processed one.
+
+    For requests with ``meta={"skip_unchanged": True}``, the SHA-1 of the body
+    is compared with the hash stored by ``utils.mark_page_processed`` on the
+    previous run, under the page's canonical URL; if they match, the response
+    gets the "unchanged" flag and the spider can skip link extraction and
+    dedup entirely. The hash is kept
+    in ``response.meta["content_hash"]`` until the spider marks the page as
+    processed, so a run that fails halfway is not skipped next time.
+
+    Install it before HttpCacheMiddleware (900), so it sees the cached body
+    when the server answers a revalidation with 304.
+    """
+
+    def __init__(self, settings):
+        self.settings = settings
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.settings)
+
+    def process_response(self, request, response, spider):
+        if not request.meta.get("skip_unchanged"):
+            return response
+        content_hash = hashlib.sha1(response.body).hexdigest()
+        request.meta["content_hash"] = content_hash
+        store = utils.get_page_hash_store(self.settings)
+        if store is None:
+            return response
+        key = canonical.get_canonicalizer(self.settings).canonical_url(response)
+        if store.get(key) == content_hash:
+            spider.crawler.stats.inc_value("unchanged_page/count")
+            response.flags.append("unchanged")
+        return response
@@ -0,0 +1,258 @@
+"""Near-duplicate detection of article headlines with MinHash and LSH.
+
+Exact dedup misses syndicated and re-slugged stories: the same article under
+another URL. Their headlines are still (nearly) the same, so headlines are
+fingerprinted with MinHash over character shingles, and an LSH index over the
+recent articles finds the candidates whose estimated Jaccard similarity to a
+new headline is above a threshold.
+
+Hashing is vectorized with NumPy: shingle hashes are computed with a rolling
+polynomial hash over each text's bytes, and the MinHash permutations of a
+whole batch of texts are applied at once.
+"""
+
+import re
+import threading
+from itertools import chain
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+# Base of the rolling hash of the shingles' bytes.
+_BASE = np.uint64(1_000_003)
+# Upper bound on shingles hashed at once, bounding memory to ~8MB at 64 perms.
+_CHUNK_SHINGLES = 16_384
+
+_NON_WORD = re.compile(r"\W+")
+
+
+def normalize_text(text: str) -> str:
+    """Lowercases ``text`` and collapses punctuation and whitespace."""
+    return _NON_WORD.sub(" ", text.lower()).strip()
+
+
+def shingle_hashes(text: str, size: int = 5) -> np.ndarray:
+    """Distinct 32-bit hashes of the ``size``-byte shingles of ``text``."""
+    data = np.frombuffer(text.encode("utf-8"), dtype=np.uint8).astype(np.uint64)
+    if len(data) < size:
+        return np.empty(0, dtype=np.uint64)
+    windows = np.lib.stride_tricks.sliding_window_view(data, size)
+    powers = _BASE ** np.arange(size - 1, -1, -1, dtype=np.uint64)
+    return np.unique((windows * powers).sum(axis=1) & _MAX_HASH)
+
+
+class MinHasher:
+    """MinHash signatures of ``num_perm`` hash permutations."""
+
+    def __init__(self, num_perm: int = 64, shingle_size: int = 5, seed: int = 1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        generator = np.random.default_rng(seed)
+        # a * h + b stays below 2**64 for 32-bit a, b and h.
+        self.a = generator.integers(1, 1 << 32, num_perm, dtype=np.uint64)
+        self.b = generator.integers(0, 1 << 32, num_perm, dtype=np.uint64)
+
+    def __repr__(self):
+        return (
+            f"{__class__.__name__}, num_perm: {self.num_perm}, "
+            f"shingle_size: {self.shingle_size}"
+        )
+
+    def signatures(self, texts: Iterable[str]) -> np.ndarray:
+        """The (len(texts), num_perm) uint32 signatures of normalized texts.
+
+        A text too short to have a shingle gets an all-max signature, which
+        ``NearDuplicateIndex`` never matches.
+        """
+        hashes = [shingle_hashes(text, self.shingle_size) for text in texts]
+        signatures = np.full((len(hashes), self.num_perm), _MAX_HASH, np.uint64)
+        start = 0
+        while start < len(hashes):
+            # Batch texts up to _CHUNK_SHINGLES shingles (at least one text).
+            end, count = start, 0
+            while end < len(hashes) and (
+                end == start or count + len(hashes[end]) <= _CHUNK_SHINGLES
+            ):
+                count += len(hashes[end])
+                end += 1
+            self._fill(signatures, start, hashes[start:end])
+            start = end
+        return signatures.astype(np.uint32)
+
+    def _fill(self, signatures, start, hashes):
+        sizes = np.array([len(h) for h in hashes])
+        nonempty = np.flatnonzero(sizes)
+        if not len(nonempty):
+            return
+        values = np.concatenate([hashes[i] for i in nonempty])
+        permuted = (np.outer(self.a, values) + self.b[:, None]) % _MERSENNE_PRIME
+        offsets = np.concatenate(([0], np.cumsum(sizes[nonempty])[:-1]))
+        minima = np.minimum.reduceat(permuted & _MAX_HASH, offsets, axis=1)
+        signatures[start + nonempty] = minima.T
+
+
+class NearDuplicateIndex:
+    """LSH index of the MinHash signatures of recent headlines.
+
+    Signatures are split into ``bands`` bands; headlines sharing a band are
+    candidates, and a candidate whose estimated Jaccard similarity is at
+    least ``threshold`` is a near-duplicate. Only the latest ``capacity``
+    headlines are kept. Headlines of fewer than ``min_words`` words (e.g.
+    "Read more") are never considered duplicates, nor indexed.
+
+    Shared by every spider of the process. ``load`` adds the titles already
+    in the DB for a category once, like ``DedupIndex.load``.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.8,
+        num_perm: int = 64,
+        bands: int = 16,
+        shingle_size: int = 5,
+        capacity: int = 50_000,
+        min_words: int = 4,
+        seed: int = 1,
+    ):
+        if num_perm % bands:
+            raise ValueError(f"num_perm {num_perm} is not a multiple of {bands}")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.capacity = capacity
+        self.min_words = min_words
+        self.hasher = MinHasher(num_perm, shingle_size, seed)
+        # Signatures by slot, a ring buffer grown up to ``capacity`` rows.
+        self.matrix = np.zeros((min(capacity, 1024), num_perm), np.uint32)
+        self.size = 0
+        self.next_slot = 0
+        # (band, band bytes) -> slots of the signatures in that bucket.
+        self.buckets: Dict[Tuple[int, bytes], set] = {}
+        self.loaded = set()
+        self.lock = threading.RLock()
+
+    def __repr__(self):
+        return (
+            f"{__class__.__name__}, threshold: {self.threshold}, "
+            f"size: {self.size}, loaded: {sorted(self.loaded)}"
+        )
+
+    def __len__(self):
+        return self.size
+
+    def _band_keys(self, signature: np.ndarray):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows : (band + 1) * self.rows].tobytes()
+
+    def _prepare(self, texts: Iterable[str]) -> Tuple[List[bool], np.ndarray]:
+        """Whether each text is long enough, and the signatures of all texts."""
+        texts = [normalize_text(text or "") for text in texts]
+        usable = [len(text.split()) >= self.min_words for text in texts]
+        return usable, self.hasher.signatures(texts)
+
+    def _add_signature(self, signature: np.ndarray):
+        slot = self.next_slot
+        self.next_slot = (slot + 1) % self.capacity
+        if self.size == self.capacity:
+            self._evict(slot)
+        else:
+            self.size += 1
+        if slot == len(self.matrix):
+            rows = min(self.capacity, 2 * len(self.matrix)) - len(self.matrix)
+            padding = np.zeros((rows, self.matrix.shape[1]), np.uint32)
+            self.matrix = np.concatenate([self.matrix, padding])
+        self.matrix[slot] = signature
+        for band_key in self._band_keys(signature):
+            self.buckets.setdefault(band_key, set()).add(slot)
+
+    def _evict(self, slot: int):
+        for band_key in self._band_keys(self.matrix[slot]):
+            bucket = self.buckets[band_key]
+            bucket.discard(slot)
+            if not bucket:
+                del self.buckets[band_key]
+
+    def similarity(self, signature: np.ndarray) -> float:
+        """Highest estimated Jaccard similarity to an indexed headline."""
+        buckets = [self.buckets.get(key, ()) for key in self._band_keys(signature)]
+        candidates = np.fromiter(chain.from_iterable(buckets), np.int64)
+        if not len(candidates):
+            return 0.0
+        return float((self.matrix[candidates] == signature).mean(axis=1).max())
+
+    def add(self, texts: Iterable[str]):
+        """Indexes the headlines ``texts``."""
+        usable, signatures = self._prepare(texts)
+        with self.lock:
+            for ok, signature in zip(usable, signatures):
+                if ok:
+                    self._add_signature(signature)
+
+    def filter_new(self, keys: Iterable, texts: Dict) -> Iterable:
+        """Yields the ``keys`` whose headline ``texts[key]`` isn't a
+        near-duplicate of an indexed one, nor of one yielded before.
+
+        Keys without a usable headline are always yielded. Nothing is
+        indexed: ``add`` the headlines of the articles once summarized, so
+        that those dropped later (claimed elsewhere, failed) block nothing.
+        """
+        keys = list(keys)
+        usable, signatures = self._prepare(texts.get(key) for key in keys)
+        yielded = []
+        for key, ok, signature in zip(keys, usable, signatures):
+            if ok:
+                with self.lock:
+                    similarity = self.similarity(signature)
+                if yielded:
+                    batch = (np.array(yielded) == signature).mean(axis=1).max()
+                    similarity = max(similarity, float(batch))
+                if similarity >= self.threshold:
+                    logger.debug(
+                        "Dropping near-duplicate %s (similarity %.2f)",
+                        key,
+                        similarity,
+                    )
+                    continue
+                yielded.append(signature)
+            yield key
+
+    def is_loaded(self, key) -> bool:
+        return key in self.loaded
+
+    def load(self, key, fetch: Callable[[], Iterable[str]]):
+        """Indexes the titles from ``fetch()``, once per key."""
+        with self.lock:
+            if key in self.loaded:
+                return
+            titles = list(fetch())
+            self.add(titles)
+            self.loaded.add(key)
+        logger.info(
+            "Loaded %d titles into near-duplicate index for %s", len(titles), key
+        )
+
+
+_near_duplicate_index: Optional[NearDuplicateIndex] = None
+
+
+def get_near_duplicate_index(settings=None) -> NearDuplicateIndex:
+    """Returns the process-wide NearDuplicateIndex, creating it on first use."""
+    global _near_duplicate_index
+    if _near_duplicate_index is None:
+        if settings is None:
+            _near_duplicate_index = NearDuplicateIndex()
+        else:
+            _near_duplicate_index = NearDuplicateIndex(
+                threshold=settings.getfloat("NEAR_DEDUP_THRESHOLD", 0.8),
+                num_perm=settings.getint("NEAR_DEDUP_NUM_PERM", 64),
+                bands=settings.getint("NEAR_DEDUP_BANDS", 16),
+                capacity=settings.getint("NEAR_DEDUP_CAPACITY", 50_000),
+                min_words=settings.getint("NEAR_DEDUP_MIN_WORDS", 4),
+            )
+    return _near_duplicate_index
@@ -5,7 +5,357 @@
 # Don't forget to add your pipeline to the ITEM_PIPELINES setting
 # See: https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 
+import queue
+import threading
+import time
+from typing import Optional
+
+from itemadapter import ItemAdapter
+from scrapy.exceptions import DropItem
+from twisted.internet import defer, threads
+
+from hunt_knowledge import metrics, utils
+from hunt_knowledge.journal import get_item_journal
+from hunt_knowledge.items import Article, InvalidArticle
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class DynamoSerializer:
+    """Marshals items into DynamoDB's low-level attribute value format.
+
+    The marshaller for each (field, type) pair is looked up once and cached,
+    so the strings and numbers that make up most of an article skip
+    boto3's generic type dispatch. Maps, lists and other types still go
+    through ``TypeSerializer``.
+    """
+
+    def __init__(self):
+        from boto3.dynamodb.types import TypeSerializer
+
+        self._type_serializer = TypeSerializer()
+        self._marshallers = {}
+
+    def __repr__(self):
+        return f"{__class__.__name__}, cached: {len(self._marshallers)}"
+
+    def _resolve(self, value_type):
+        if value_type is str:
+            return lambda value: {"S": value}
+        if value_type is bool:
+            return lambda value: {"BOOL": value}
+        if value_type is int:
+            return lambda value: {"N": str(value)}
+        if value_type is type(None):
+            return lambda value: {"NULL": True}
+        return self._type_serializer.serialize
+
+    def marshaller(self, name, value_type):
+        key = (name, value_type)
+        marshaller = self._marshallers.get(key)
+        if marshaller is None:
+            marshaller = self._marshallers[key] = self._resolve(value_type)
+        return marshaller
+
+    def serialize(self, item) -> dict:
+        if isinstance(item, Article):
+            data = item.to_dict()
+        else:
+            data = ItemAdapter(item).asdict()
+        return {
+            name: self.marshaller(name, type(value))(value)
+            for name, value in data.items()
+        }
+
+
+# DynamoDB errors retrying can't fix.
+NON_RETRYABLE_ERRORS = {"ValidationException", "SerializationException"}
+
+
+def _error_code(error) -> Optional[str]:
+    response = getattr(error, "response", None)
+    if isinstance(response, dict):
+        return response.get("Error", {}).get("Code")
+    return None
+
+
+def _item_url(item) -> Optional[str]:
+    return item.url if isinstance(item, Article) else item.get("url")
+
+
+class DynamoDBPipeline:
+    """Writes items to DynamoDB from a background thread, in batches.
+
+    Items are queued as the spiders yield them, and a writer thread flushes
+    them with BatchWriteItem calls of up to ``batch_size`` (at most 25) items,
+    or whatever has queued after ``flush_interval`` seconds. UnprocessedItems
+    are retried with exponential backoff. Write latency and throughput are
+    reported in the crawl stats under ``dynamodb/``.
+
+    Articles are validated before they are queued, and invalid ones are
+    dropped. They stay as slotted ``Article`` objects in the queue and are
+    only marshalled when their batch is written.
+
+    With a ``journal`` (see ``hunt_knowledge.journal``), each item is
+    recorded before it is queued and marked once written, and the items a
+    previous run of the spider left unwritten are written when it opens.
+    """
+
+    def __init__(
+        self,
+        table_name: str = "CuratedArticlesDB",
+        batch_size: int = 25,
+        flush_interval: float = 1.0,
+        max_retries: int = 5,
+        backoff: float = 0.5,
+        enabled: bool = True,
+        stats=None,
+        journal=None,
+    ):
+        self.table_name = table_name
+        self.batch_size = min(batch_size, 25)
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.enabled = enabled
+        self.stats = stats
+        self.journal = journal
+        self._unrecorded = []
+        self._recording = False
+        self.spider_name = None
+        self.queue = queue.Queue()
+        self.thread = None
+        self.client = None
+        self.started = None
+        self.labels = (None, None)
+        self.serializer = DynamoSerializer()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(
+            table_name=settings.get("DYNAMODB_TABLE", "CuratedArticlesDB"),
+            batch_size=settings.getint("DYNAMODB_BATCH_SIZE", 25),
+            flush_interval=settings.getfloat("DYNAMODB_FLUSH_INTERVAL", 1.0),
+            max_retries=settings.getint("DYNAMODB_MAX_RETRIES", 5),
+            backoff=settings.getfloat("DYNAMODB_RETRY_BACKOFF", 0.5),
+            enabled=settings.getbool("DYNAMODB_WRITE_ENABLED", True),
+            stats=crawler.stats,
+            journal=get_item_journal(settings),
+        )
+
+    def open_spider(self, spider):
+        if not self.enabled:
+            return
+        if self.client is None:
+            self.client = utils.get_dynamodb_client()
+        self.started = time.monotonic()
+        self.labels = (spider.name, getattr(spider, "db_category", None))
+        self.spider_name = spider.name
+        self.thread = threading.Thread(
+            target=self._run, name=f"dynamodb-writer-{spider.name}", daemon=True
+        )
+        self.thread.start()
+        # Workers sharing the spider's start URLs only replay on the first shard.
+        if self.journal is not None and getattr(spider, "shard", 0) == 0:
+            self.replay()
+
+    def replay(self):
+        """Queues the items journaled but not written by previous runs."""
+        items = self.journal.pending(self.spider_name)
+        for item in items:
+            self.queue.put(item)
+        if items:
+            self._inc_stat("journal/items_replayed", len(items))
+            logger.info(
+                "Replaying %d unwritten %s articles from the journal",
+                len(items),
+                self.spider_name,
+            )
 
-class HuntKnowledgePipeline:
     def process_item(self, item, spider):
-        return item
+        if not self.enabled:
+            return item
+        if isinstance(item, Article):
+            try:
+                item.validate()
+            except InvalidArticle as e:
+                self._inc_stat("dynamodb/items_invalid")
+                raise DropItem(str(e))
+            data, queued = item.to_dict(), item
+        else:
+            data = queued = ItemAdapter(item).asdict()
+        if self.journal is None or not data.get("url"):
+            self.queue.put(queued)
+            return item
+        # Queued once journaled, so it is never marked written before.
+        d = self._record(data)
+        d.addCallback(lambda _: self.queue.put(queued))
+        return d.addCallback(lambda _: item)
+
+    def _record(self, data: dict) -> defer.Deferred:
+        """Journals ``data`` from a thread, with the items recorded
+        meanwhile, in one transaction."""
+        d = defer.Deferred()
+        self._unrecorded.append((data, d))
+        if not self._recording:
+            self._record_pending()
+        return d
+
+    def _record_pending(self):
+        self._recording = True
+        batch, self._unrecorded = self._unrecorded, []
+        d = threads.deferToThread(
+            self.journal.record, self.spider_name, [data for data, _ in batch]
+        )
+        d.addErrback(self._record_failed, len(batch))
+        d.addCallback(self._recorded, batch)
+
+    def _record_failed(self, failure, count):
+        # The items are still written, just not journaled.
+        logger.error(
+            "Failed to journal %d articles: %s", count, failure.getErrorMessage()
+        )
+
+    def _recorded(self, _, batch):
+        self._recording = False
+        if self._unrecorded:
+            self._record_pending()
+        for _, d in batch:
+            d.callback(None)
+
+    def close_spider(self, spider):
+        if self.thread is None:
+            return None
+        self.queue.put(_STOP)
+        return threads.deferToThread(self._finish)
+
+    def _finish(self):
+        self.thread.join()
+        elapsed = time.monotonic() - self.started
+        written = self._stat("dynamodb/items_written")
+        if elapsed > 0:
+            self._set_stat("dynamodb/items_per_second", round(written / elapsed, 2))
+        logger.info("Done placing %d articles in DynamoDB table", written)
+
+    def _run(self):
+        batch = []
+        stopping = False
+        while not stopping:
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                stopping = True
+            elif item is not None:
+                batch.append(item)
+            if batch and (len(batch) >= self.batch_size or item is None or stopping):
+                try:
+                    self.write_batch(batch)
+                except Exception:
+                    # Keep the writer alive for the rest of the queue.
+                    logger.exception("Failed to write a batch of %d items", len(batch))
+                    self._inc_stat("dynamodb/items_failed", len(batch))
+                batch = []
+
+    def write_batch(self, items):
+        """Writes up to 25 items, retrying unprocessed ones with backoff.
+
+        Items that can't be marshalled are dropped. If DynamoDB rejects the
+        batch outright (e.g. an item is too large), it isn't retried: its
+        items are written one by one, and the rejected ones dropped.
+        """
+        puts, kept = [], []
+        for item in items:
+            try:
+                puts.append({"PutRequest": {"Item": self.serializer.serialize(item)}})
+            except Exception as e:
+                self._drop(item, e)
+                continue
+            kept.append(item)
+        if not puts:
+            return
+
+        request = {self.table_name: puts}
+        started = time.monotonic()
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.client.batch_write_item(RequestItems=request)
+            except Exception as e:
+                if _error_code(e) in NON_RETRYABLE_ERRORS:
+                    self._rejected(kept, e)
+                    return
+                logger.error("BatchWriteItem failed with exception: %s", e)
+                response = {"UnprocessedItems": request}
+            request = response.get("UnprocessedItems") or {}
+            if not request:
+                break
+            if attempt < self.max_retries:
+                time.sleep(self.backoff * 2**attempt)
+
+        unprocessed = request.get(self.table_name, [])
+        failed = len(unprocessed)
+        if self.journal is not None:
+            self._mark_written(kept, unprocessed)
+        latency = time.monotonic() - started
+        metrics.get_stage_metrics().observe(metrics.DB_WRITE, latency, *self.labels)
+        latency_ms = latency * 1000
+        self._inc_stat("dynamodb/batches")
+        self._inc_stat("dynamodb/items_written", len(kept) - failed)
+        self._inc_stat("dynamodb/batch_latency_ms_total", latency_ms)
+        self._max_stat("dynamodb/batch_latency_ms_max", latency_ms)
+        if failed:
+            self._inc_stat("dynamodb/items_failed", failed)
+            logger.error(
+                "Failed to write %d items to %s after %d retries",
+                failed,
+                self.table_name,
+                self.max_retries,
+            )
+
+    def _rejected(self, items, error):
+        if len(items) == 1:
+            self._drop(items[0], error)
+            return
+        logger.warning(
+            "BatchWriteItem rejected a batch of %d items, writing them one by one",
+            len(items),
+        )
+        for item in items:
+            self.write_batch([item])
+
+    def _drop(self, item, error):
+        url = _item_url(item)
+        self._inc_stat("dynamodb/items_dropped")
+        logger.error("Dropping article %s, which can't be written: %s", url, error)
+        # Don't replay it on every run.
+        if self.journal is not None and url:
+            self.journal.mark_dropped([url])
+
+    def _mark_written(self, items, unprocessed):
+        failed = {
+            request["PutRequest"]["Item"].get("url", {}).get("S")
+            for request in unprocessed
+        }
+        urls = [_item_url(item) for item in items]
+        self.journal.mark_written(url for url in urls if url and url not in failed)
+
+    def _stat(self, key):
+        return self.stats.get_value(key, 0) if self.stats is not None else 0
+
+    def _set_stat(self, key, value):
+        if self.stats is not None:
+            self.stats.set_value(key, value)
+
+    def _inc_stat(self, key, count=1):
+        if self.stats is not None:
+            self.stats.inc_value(key, count)
+
+    def _max_stat(self, key, value):
+        if self.stats is not None:
+            self.stats.max_value(key, value)
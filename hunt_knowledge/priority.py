@@ -0,0 +1,193 @@
+"""Ranking of candidate article links, and the summarization budget.
+
+Summaries are the expensive part of a crawl, so the links of a landing page
+are ranked before dedup and the per-page cap: links in prominent sections
+(main feature, most read) and near the top of the page come first, and URLs
+dated in the past lose priority by half every ``half_life_days``. A
+``SummaryBudget`` caps the summaries of a crawl process, in total and per
+source, so the cap drops the least important articles rather than arbitrary
+ones.
+"""
+
+import math
+import re
+from datetime import date
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Link(NamedTuple):
+    """A link on a landing page."""
+
+    url: str
+    # The link's text, e.g. the headline.
+    text: str
+    # Classes of the link's ancestors, outermost first.
+    section: str
+    # Order of the link's first appearance on the page, from 0.
+    position: int
+
+
+# Weights of page sections, matched as substrings of the ancestors' classes.
+# A link in several matching sections gets the highest weight; others get 1.
+DEFAULT_SECTION_WEIGHTS = {
+    "main-feature": 3.0,
+    "hero": 3.0,
+    "top-stor": 2.5,
+    "featured": 2.0,
+    "most-read": 2.0,
+    "popular": 1.5,
+    "article-grid": 1.0,
+    "related": 0.5,
+    "sidebar": 0.5,
+    "footer": 0.2,
+    "nav": 0.2,
+}
+
+_DATE_PATTERNS = (
+    # /2023/05/17/, -2023-05-17
+    re.compile(r"(?<!\d)(20\d\d)[/-](\d{1,2})[/-](\d{1,2})(?!\d)"),
+    # /20230517/
+    re.compile(r"(?<!\d)(20\d\d)(\d\d)(\d\d)(?!\d)"),
+    # /2023/05/
+    re.compile(r"/(20\d\d)/(\d{1,2})/()"),
+)
+
+
+def url_date(url: str) -> Optional[date]:
+    """The publication date hinted at by ``url``'s path, if any."""
+    for pattern in _DATE_PATTERNS:
+        for match in pattern.finditer(url):
+            year, month, day = match.groups()
+            try:
+                return date(int(year), int(month), int(day or 1))
+            except ValueError:
+                continue
+    return None
+
+
+class LinkRanker:
+    """Scores links by section weight, position and freshness.
+
+    ``score = section weight / (1 + position / position_scale)
+    * 0.5 ** (age in days / half_life_days)``, where undated links count as
+    fresh: dedup already dropped the articles seen before.
+    """
+
+    def __init__(
+        self,
+        section_weights: Optional[Dict[str, float]] = None,
+        position_scale: float = 10.0,
+        half_life_days: float = 2.0,
+    ):
+        self.section_weights = (
+            DEFAULT_SECTION_WEIGHTS if section_weights is None else section_weights
+        )
+        self.position_scale = position_scale
+        self.half_life_days = half_life_days
+
+    def __repr__(self):
+        return (
+            f"{__class__.__name__}, sections: {sorted(self.section_weights)}, "
+            f"half_life_days: {self.half_life_days}"
+        )
+
+    def section_weight(self, section: str) -> float:
+        weights = [w for name, w in self.section_weights.items() if name in section]
+        return max(weights, default=1.0)
+
+    def score(self, link: Link, today: Optional[date] = None) -> float:
+        score = self.section_weight(link.section)
+        score /= 1 + link.position / self.position_scale
+        published = url_date(link.url)
+        if published is not None:
+            age = max(0, ((today or date.today()) - published).days)
+            score *= math.pow(0.5, age / self.half_life_days)
+        return score
+
+    def rank(
+        self, urls: Iterable[str], links: Dict[str, Link], today=None
+    ) -> List[Tuple[str, float]]:
+        """(url, score) pairs, best first. URLs missing from ``links`` are
+        scored as if they came last on the page, in no particular section."""
+        urls = list(urls)
+        scored = []
+        for position, url in enumerate(urls):
+            link = links.get(url) or Link(url, "", "", len(links) + position)
+            scored.append((url, self.score(link, today)))
+        # sorted is stable: ties keep the page order.
+        return sorted(scored, key=lambda pair: -pair[1])
+
+
+class SummaryBudget:
+    """Caps the summaries requested by a crawl process.
+
+    ``run_budget`` caps the total, ``source_budget`` each source (spider)
+    unless ``source_budgets`` sets its own; None is unlimited. Only used from
+    the reactor thread.
+    """
+
+    def __init__(
+        self,
+        run_budget: Optional[int] = None,
+        source_budget: Optional[int] = None,
+        source_budgets: Optional[Dict[str, int]] = None,
+    ):
+        self.run_budget = run_budget
+        self.source_budget = source_budget
+        self.source_budgets = source_budgets or {}
+        self.spent: Dict[str, int] = {}
+
+    def __repr__(self):
+        return (
+            f"{__class__.__name__}, run_budget: {self.run_budget}, "
+            f"spent: {sum(self.spent.values())}"
+        )
+
+    def remaining(self, source: str) -> Optional[int]:
+        """Summaries ``source`` may still request, or None if unlimited."""
+        limits = []
+        if self.run_budget is not None:
+            limits.append(self.run_budget - sum(self.spent.values()))
+        source_budget = self.source_budgets.get(source, self.source_budget)
+        if source_budget is not None:
+            limits.append(source_budget - self.spent.get(source, 0))
+        return max(0, min(limits)) if limits else None
+
+    def spend(self, source: str, count: int):
+        self.spent[source] = self.spent.get(source, 0) + count
+
+    def refund(self, source: str, count: int):
+        self.spent[source] = max(0, self.spent.get(source, 0) - count)
+
+
+_summary_budget: Optional[SummaryBudget] = None
+
+
+def get_summary_budget(settings=None) -> SummaryBudget:
+    """Returns the process-wide SummaryBudget, creating it on first use.
+
+    Unlike the clients, it is never rebuilt: what was spent must carry over
+    to the other spiders of the process.
+    """
+    global _summary_budget
+    if _summary_budget is None:
+        if settings is None:
+            _summary_budget = SummaryBudget()
+        else:
+            run_budget = settings.get("SUMMARY_RUN_BUDGET")
+            source_budget = settings.get("SUMMARY_SOURCE_BUDGET")
+            _summary_budget = SummaryBudget(
+                run_budget=None if run_budget is None else int(run_budget),
+                source_budget=None if source_budget is None else int(source_budget),
+                source_budgets={
+                    source: int(budget)
+                    for source, budget in settings.getdict(
+                        "SUMMARY_SOURCE_BUDGETS"
+                    ).items()
+                },
+            )
+    return _summary_budget
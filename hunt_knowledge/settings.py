@@ -24,6 +24,93 @@ ROBOTSTXT_OBEY = True
 # Configure maximum concurrent requests performed by Scrapy (default: 16)
 # CONCURRENT_REQUESTS = 32
 
+# Per-spider CONCURRENT_REQUESTS caps used by `hunt_knowledge crawl-all`, which
+# runs every spider in one process, e.g. {"ft": 4}.
+SPIDER_CONCURRENT_REQUESTS = {}
+
+# Maximum number of concurrent requests to the genei-pipeline NLP API. These
+# run in the reactor thread pool, so keep REACTOR_THREADPOOL_MAXSIZE (default:
+# 10) at least this large.
+PIPELINE_MAX_IN_FLIGHT = 4
+# Adapt the number of pipeline requests in flight, between PIPELINE_THROTTLE_MIN
+# and PIPELINE_MAX_IN_FLIGHT, to the API's latency and 429/5xx responses.
+# PIPELINE_THROTTLE_MAX_RATE (requests per second) also paces request starts.
+PIPELINE_THROTTLE_ENABLED = True
+PIPELINE_THROTTLE_START = 2
+PIPELINE_THROTTLE_MIN = 1
+PIPELINE_THROTTLE_TARGET_LATENCY = 30
+PIPELINE_THROTTLE_MAX_RATE = None
+PIPELINE_THROTTLE_BURST = None
+# Keep-alive connection pool, retry and timeout settings for the pipeline client.
+# PIPELINE_API = 'https://w3ddy8vzni.execute-api.eu-west-1.amazonaws.com/v1/genei-pipeline'
+PIPELINE_POOL_SIZE = 10
+PIPELINE_RETRY_TIMES = 3
+PIPELINE_RETRY_BACKOFF = 1.0
+PIPELINE_CONNECT_TIMEOUT = 10
+PIPELINE_READ_TIMEOUT = 180
+# Local cache of pipeline responses, keyed by normalized URL and pipeline config,
+# so repeated URLs cost a disk lookup instead of a summarization call.
+PIPELINE_CACHE_ENABLED = True
+PIPELINE_CACHE_PATH = ".cache/pipeline.sqlite"
+PIPELINE_CACHE_TTL = 7 * 24 * 3600
+PIPELINE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+# Send summaries to the pipeline's batch endpoint, in batches of up to
+# PIPELINE_BATCH_SIZE URLs and PIPELINE_BATCH_MAX_BYTES of request body. URLs
+# wait at most PIPELINE_BATCH_WAIT seconds for a batch to fill up.
+PIPELINE_BATCH_API = None
+PIPELINE_BATCH_SIZE = 8
+PIPELINE_BATCH_MAX_BYTES = 64 * 1024
+PIPELINE_BATCH_WAIT = 0.05
+
+# The dedup index of URLs and titles already in the DB is shared by all spiders.
+# A Bloom filter bounds its memory for multi-week windows, at the cost of rare
+# false positives.
+DEDUP_BLOOM_FILTER = False
+DEDUP_BLOOM_CAPACITY = 1000000
+DEDUP_BLOOM_ERROR_RATE = 0.001
+# URLs are deduped by their canonical form (see hunt_knowledge.canonical).
+# Per-domain rules, added to canonical.DEFAULT_RULES, e.g.
+# {"example.com": {"keep_params": ["id"], "lowercase_path": True}}.
+URL_CANONICAL_RULES = {}
+URL_CANONICAL_CACHE_SIZE = 100000
+# Persist the dedup index locally with a per-category createdAt watermark, so
+# each run only queries DynamoDB for articles newer than the last one seen.
+DEDUP_STATE_ENABLED = True
+DEDUP_STATE_PATH = ".cache/dedup.sqlite"
+# Each sync re-queries this many seconds before the watermark, for articles
+# written late or not yet visible to the previous sync.
+DEDUP_SYNC_LAG = 3600
+# `hunt_knowledge crawl-all --processes N` sets DEDUP_CLAIM_RUN in its workers,
+# which then claim new URLs in the DEDUP_STATE_PATH store so each is only
+# summarized once.
+
+# Drop new links whose headline is a near-duplicate (estimated Jaccard
+# similarity of at least NEAR_DEDUP_THRESHOLD) of one of the latest
+# NEAR_DEDUP_CAPACITY headlines seen or stored, e.g. syndicated stories.
+NEAR_DEDUP_ENABLED = True
+NEAR_DEDUP_THRESHOLD = 0.8
+NEAR_DEDUP_NUM_PERM = 64
+NEAR_DEDUP_BANDS = 16
+NEAR_DEDUP_CAPACITY = 50000
+NEAR_DEDUP_MIN_WORDS = 4
+
+# Caps on the summaries requested per crawl process: in total, per spider, and
+# for given spiders, e.g. {"ft": 20}. None is unlimited. Links are ranked by
+# page section, position and URL date, so the cap keeps the most important
+# ones. `crawl-all --processes N` splits the budgets across its workers.
+SUMMARY_RUN_BUDGET = None
+SUMMARY_SOURCE_BUDGET = None
+SUMMARY_SOURCE_BUDGETS = {}
+
+# Headless Chrome drivers shared by every spider. Drivers are recycled after
+# WEBDRIVER_MAX_PAGES pages or once Chrome uses more than WEBDRIVER_MAX_MEMORY_MB.
+WEBDRIVER_POOL_SIZE = 2
+WEBDRIVER_MAX_PAGES = 50
+WEBDRIVER_MAX_MEMORY_MB = 1024
+WEBDRIVER_LOCAL = False
+# Block images, fonts and CSS while rendering; link extraction doesn't need them.
+WEBDRIVER_BLOCK_RESOURCES = True
+
 # Configure a delay for requests for the same website (default: 0)
 # See https://docs.scrapy.org/en/latest/topics/settings.html#download-delay
 # See also autothrottle settings and docs
@@ -52,21 +139,70 @@ ROBOTSTXT_OBEY = True
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
-# DOWNLOADER_MIDDLEWARES = {
-#    'hunt_knowledge.middlewares.ScrapeNewsDownloaderMiddleware': 543,
-# }
+# Requests with meta={"render": True} are rendered in headless Chrome, on every
+# run: rendered pages have no validators for the HTTP cache to revalidate.
+DOWNLOADER_MIDDLEWARES = {
+    "hunt_knowledge.middlewares.UnchangedPageMiddleware": 850,
+    "hunt_knowledge.middlewares.HuntKnowledgeDownloaderMiddleware": 950,
+}
+
+# Landing pages flagged with meta={"skip_unchanged": True} whose body is
+# identical to the last processed version are skipped entirely.
+SKIP_UNCHANGED_PAGES = True
+PAGE_HASH_PATH = ".cache/pages.sqlite"
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
-# EXTENSIONS = {
-#    'scrapy.extensions.telnet.TelnetConsole': None,
-# }
+EXTENSIONS = {
+    #    'scrapy.extensions.telnet.TelnetConsole': None,
+    "hunt_knowledge.extensions.PipelineClientExtension": 500,
+    "hunt_knowledge.extensions.WebDriverPoolExtension": 500,
+    "hunt_knowledge.extensions.MetricsExtension": 500,
+    "hunt_knowledge.extensions.JsonLoggingExtension": 500,
+}
+
+# The project's own logs (not Scrapy's) as JSON lines, rotated by size.
+# Messages longer than LOG_JSON_MAX_MESSAGE characters are truncated.
+LOG_JSON_FILE = "logs/hunt_knowledge.jsonl"
+LOG_JSON_LEVEL = "INFO"
+LOG_JSON_MAX_BYTES = 10 * 1024 * 1024
+LOG_JSON_BACKUP_COUNT = 5
+LOG_JSON_MAX_MESSAGE = 2000
+
+# Time each stage (render, link_extract, dedup_query, pipeline_request,
+# db_write) per spider and category. Totals go to the crawl stats under
+# stages/; set METRICS_PORT to serve Prometheus histograms on
+# http://METRICS_HOST:METRICS_PORT/metrics, or METRICS_TEXTFILE to write them
+# for node_exporter's textfile collector.
+STAGE_METRICS_ENABLED = True
+METRICS_PORT = None
+METRICS_HOST = "127.0.0.1"
+METRICS_TEXTFILE = None
+METRICS_TEXTFILE_INTERVAL = 15
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
-# ITEM_PIPELINES = {
-#    'hunt_knowledge.pipelines.ScrapeNewsPipeline': 300,
-# }
+ITEM_PIPELINES = {
+    "hunt_knowledge.pipelines.DynamoDBPipeline": 300,
+}
+
+# Items are written in BatchWriteItem calls of up to 25 from a background thread.
+# Set DYNAMODB_WRITE_ENABLED = False for local development.
+DYNAMODB_TABLE = "CuratedArticlesDB"
+DYNAMODB_WRITE_ENABLED = True
+DYNAMODB_BATCH_SIZE = 25
+DYNAMODB_FLUSH_INTERVAL = 1.0
+DYNAMODB_MAX_RETRIES = 5
+DYNAMODB_RETRY_BACKOFF = 0.5
+# Journal the articles until they are written, so that those a killed crawl
+# summarized but didn't write are written by the next run instead of being
+# summarized again. Written ones are kept ITEM_JOURNAL_RETENTION seconds.
+ITEM_JOURNAL_ENABLED = True
+ITEM_JOURNAL_PATH = ".cache/items.sqlite"
+ITEM_JOURNAL_RETENTION = 7 * 24 * 3600
+# `hunt_knowledge crawl-all --jobdir DIR` sets CRAWL_JOBDIR: each spider then
+# persists its request queue in a JOBDIR under it, resumed by the next run.
+CRAWL_JOBDIR = None
 
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
@@ -83,8 +219,11 @@ ROBOTSTXT_OBEY = True
 
 # Enable and configure HTTP caching (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html#httpcache-middleware-settings
-# HTTPCACHE_ENABLED = True
-# HTTPCACHE_EXPIRATION_SECS = 0
-# HTTPCACHE_DIR = 'httpcache'
-# HTTPCACHE_IGNORE_HTTP_CODES = []
-# HTTPCACHE_STORAGE = 'scrapy.extensions.httpcache.FilesystemCacheStorage'
+# Cached pages are revalidated with ETag / If-Modified-Since on every run.
+HTTPCACHE_ENABLED = True
+HTTPCACHE_POLICY = "hunt_knowledge.httpcache.RevalidatingPolicy"
+HTTPCACHE_ALWAYS_STORE = True
+HTTPCACHE_EXPIRATION_SECS = 0
+HTTPCACHE_DIR = "httpcache"
+HTTPCACHE_IGNORE_HTTP_CODES = [500, 502, 503, 504]
+HTTPCACHE_STORAGE = "scrapy.extensions.httpcache.FilesystemCacheStorage"
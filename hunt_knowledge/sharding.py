@@ -0,0 +1,211 @@
+"""Run a crawl across a pool of processes and merge their stats."""
+
+import multiprocessing
+import os
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+from scrapy.crawler import CrawlerProcess
+from scrapy.spiderloader import SpiderLoader
+from scrapy.utils.project import get_project_settings
+
+from hunt_knowledge.canonical import get_canonicalizer
+from hunt_knowledge.dedup import DedupStore
+from hunt_knowledge.spiders import NewsSpider
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# (spider name, spider arguments)
+Job = Tuple[str, dict]
+
+
+def concurrency_cap(settings, name, default=None):
+    """CONCURRENT_REQUESTS for spider ``name``, from SPIDER_CONCURRENT_REQUESTS."""
+    caps = settings.getdict("SPIDER_CONCURRENT_REQUESTS")
+    return caps.get(name, default)
+
+
+def job_label(job: Job) -> str:
+    name, kwargs = job
+    if "shard" in kwargs:
+        return f"{name}[{kwargs['shard']}/{kwargs['shards']}]"
+    return name
+
+
+def job_dir(root: str, job: Job) -> str:
+    """The JOBDIR of a job under ``root``: one per spider and shard."""
+    name, kwargs = job
+    if "shard" in kwargs:
+        name = f"{name}-{kwargs['shard']}-of-{kwargs['shards']}"
+    return os.path.join(root, name)
+
+
+def news_spiders(loader, names: List[str]) -> List[str]:
+    """The ``names`` of NewsSpiders, leaving out stubs like the other spiders."""
+    return [name for name in names if issubclass(loader.load(name), NewsSpider)]
+
+
+def add_crawlers(process, jobs: List[Job], concurrency: Optional[int] = None):
+    """Adds a crawler per job to ``process``, returning them by job label.
+
+    With CRAWL_JOBDIR set, each crawler persists its request queue in its own
+    JOBDIR under it, so an interrupted crawl resumes where it stopped.
+    """
+    crawlers = {}
+    root = process.settings.get("CRAWL_JOBDIR")
+    for job in jobs:
+        name, kwargs = job
+        crawler = process.create_crawler(name)
+        cap = concurrency_cap(process.settings, name, concurrency)
+        if cap:
+            crawler.settings.set("CONCURRENT_REQUESTS", cap, priority="cmdline")
+        if root:
+            crawler.settings.set("JOBDIR", job_dir(root, job), priority="cmdline")
+        process.crawl(crawler, **kwargs)
+        crawlers[job_label(job)] = crawler
+    return crawlers
+
+
+def plan_jobs(
+    spiders: List[str],
+    processes: int,
+    split_start_urls: bool = False,
+    shardable: Optional[Set[str]] = None,
+):
+    """Splits the spiders into at most ``processes`` lists of jobs.
+
+    With ``split_start_urls``, each spider in ``shardable`` (by default, all)
+    is also sharded into ``processes`` jobs that crawl a slice of its start
+    URLs (see NewsSpider).
+    """
+    jobs = []
+    for name in spiders:
+        can_shard = shardable is None or name in shardable
+        if split_start_urls and can_shard and processes > 1:
+            jobs.extend(
+                (name, {"shard": i, "shards": processes}) for i in range(processes)
+            )
+        else:
+            jobs.append((name, {}))
+    shards = [jobs[i::processes] for i in range(processes)]
+    return [shard for shard in shards if shard]
+
+
+def budget_shares(settings, workers: int, split_start_urls: bool = False) -> List[dict]:
+    """Summary budget settings of each of ``workers`` workers.
+
+    The run budget is split between the workers; so are the per-spider
+    budgets when spiders are split across workers too. Each worker gets
+    ``budget // workers``, and the first ones one more each for the
+    remainder, so together they never exceed the budget.
+    """
+
+    def share(budget, worker):
+        if budget is None:
+            return None
+        quotient, remainder = divmod(int(budget), workers)
+        return quotient + (worker < remainder)
+
+    shares = []
+    for worker in range(workers):
+        run_budget = settings.get("SUMMARY_RUN_BUDGET")
+        worker_shares = {"SUMMARY_RUN_BUDGET": share(run_budget, worker)}
+        if split_start_urls:
+            source_budget = settings.get("SUMMARY_SOURCE_BUDGET")
+            worker_shares["SUMMARY_SOURCE_BUDGET"] = share(source_budget, worker)
+            worker_shares["SUMMARY_SOURCE_BUDGETS"] = {
+                name: share(budget, worker)
+                for name, budget in settings.getdict("SUMMARY_SOURCE_BUDGETS").items()
+            }
+        shares.append(worker_shares)
+    return shares
+
+
+def run_shard(
+    jobs: List[Job],
+    run_id: str,
+    concurrency: Optional[int] = None,
+    overrides: Optional[dict] = None,
+):
+    """Runs one worker's jobs in a fresh CrawlerProcess, returning their stats."""
+    settings = get_project_settings()
+    settings.set("DEDUP_CLAIM_RUN", run_id, priority="cmdline")
+    settings.setdict(overrides or {}, priority="cmdline")
+    process = CrawlerProcess(settings)
+    crawlers = add_crawlers(process, jobs, concurrency)
+    process.start()
+    return {label: crawler.stats.get_stats() for label, crawler in crawlers.items()}
+
+
+def aggregate_stats(stats: List[dict]) -> dict:
+    """Merges crawl stats: counters are summed, ``*_max`` stats maxed, and the
+    earliest start and latest finish kept."""
+    merged = {}
+    for values in stats:
+        for key, value in values.items():
+            if key not in merged:
+                merged[key] = value
+            elif key == "start_time":
+                merged[key] = min(merged[key], value)
+            elif key == "finish_time" or key.endswith("_max"):
+                merged[key] = max(merged[key], value)
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                merged[key] += value
+    start, finish = merged.get("start_time"), merged.get("finish_time")
+    if isinstance(start, datetime) and isinstance(finish, datetime):
+        merged["elapsed_time_seconds"] = (finish - start).total_seconds()
+    return merged
+
+
+def run_sharded(
+    spiders: List[str],
+    processes: int,
+    split_start_urls: bool = False,
+    concurrency: Optional[int] = None,
+    jobdir: Optional[str] = None,
+) -> Dict[str, dict]:
+    """Runs the spiders across a pool of ``processes`` worker processes.
+
+    Each worker runs its share of the jobs in its own reactor. The workers
+    share the DedupStore (SQLite in WAL mode) and claim new URLs in it under
+    one run id, so an article found by two workers is summarized once.
+    With ``jobdir``, each job's request queue is persisted under it (see
+    ``add_crawlers``). Returns the stats of every job, plus their aggregate under ``"total"``.
+    """
+    settings = get_project_settings()
+    run_id = uuid.uuid4().hex
+    if settings.getbool("DEDUP_STATE_ENABLED"):
+        store = DedupStore(
+            settings.get("DEDUP_STATE_PATH"),
+            version=get_canonicalizer(settings).version,
+        )
+        store.clear_claims()
+        store.close()
+
+    loader = SpiderLoader.from_settings(settings)
+    shardable = set(news_spiders(loader, spiders))
+    shards = plan_jobs(spiders, processes, split_start_urls, shardable)
+    logger.info("Running %d crawl workers with run id %s", len(shards), run_id)
+    # Each worker needs a fresh process: a Twisted reactor can't be restarted.
+    context = multiprocessing.get_context("spawn")
+    overrides = budget_shares(settings, len(shards), split_start_urls)
+    if jobdir:
+        for worker_overrides in overrides:
+            worker_overrides["CRAWL_JOBDIR"] = jobdir
+    with context.Pool(len(shards), maxtasksperchild=1) as pool:
+        results = pool.starmap(
+            run_shard,
+            [
+                (jobs, run_id, concurrency, worker_overrides)
+                for jobs, worker_overrides in zip(shards, overrides)
+            ],
+        )
+
+    report = {}
+    for result in results:
+        report.update(result)
+    report["total"] = aggregate_stats(list(report.values()))
+    return report
@@ -2,3 +2,5 @@
 #
 # Please refer to the documentation for information on how to create and manage
 # your spiders.
+
+from hunt_knowledge.spiders.base import NewsSpider  # noqa: F401
@@ -0,0 +1,327 @@
+import scrapy
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+from scrapy.utils.defer import maybe_deferred_to_future
+from twisted.internet import defer, threads
+from hunt_knowledge import canonical, metrics, priority, utils
+from hunt_knowledge.journal import get_item_journal
+from hunt_knowledge.logs import Preview
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class NewsSpider(scrapy.Spider):
+    """Base spider for news sites: landing pages in, articles out.
+
+    Each landing page goes through a stream of stages: link extraction,
+    normalization, ranking, dedup, summarization and persistence. Links are
+    ranked by page section, position and the date in their URL (see
+    ``hunt_knowledge.priority``), so the per-page cap and the process's
+    summary budget keep the most important articles, and they are summarized
+    in that order of priority. With
+    NEAR_DEDUP_ENABLED, dedup also drops the links whose headline is a
+    near-duplicate of a recent article's (see ``hunt_knowledge.neardup``), so
+    syndicated and re-slugged stories aren't summarized again. Extraction,
+    normalization and dedup are chained generators, and the dedup index is
+    loaded in a thread while the links are extracted. Every new article URL
+    is sent to the pipeline client as soon as it comes out of dedup, and each
+    article is yielded to the item pipeline as soon as its summary arrives,
+    so writes overlap with the remaining summaries.
+
+    Subclasses only declare where to look:
+
+    - ``start_urls``: the landing pages.
+    - ``db_category``: the DB category the articles are stored under.
+    - ``link_xpaths``: XPaths of the article hrefs (default: every link).
+    - ``categories`` and ``category_match``: with ``"path"``, only URLs whose
+      path is ``/<category>/<slug>`` are kept, with ``<category>`` as the
+      subcategory; with ``"substring"``, the URL must contain a category.
+    - ``render``: render the landing pages with headless Chrome.
+    - ``max_articles``: cap on new articles per landing page (also a spider
+      argument, ``-a max_articles=15``).
+    - ``section_weights``: weights of the page sections, by class (default:
+      ``priority.DEFAULT_SECTION_WEIGHTS``).
+
+    With the ``shard`` and ``shards`` spider arguments, the spider only
+    crawls every ``shards``-th start URL, starting from the ``shard``-th.
+
+    Articles are journaled by the DynamoDBPipeline until written (see
+    ``hunt_knowledge.journal``), so a crawl killed mid-page doesn't lose its
+    summaries, and with a JOBDIR (``crawl-all --jobdir``) its pending
+    requests are resumed too.
+
+    ``build_item(nlp, url, category, subcategory)`` can be overridden to build
+    the items differently.
+    """
+
+    name = None
+    base_url = None
+    start_urls = []
+    db_category = None
+    categories = []
+    category_match = None
+    link_xpaths = []
+    blacklist = []
+    render = False
+    max_articles = None
+    section_weights = None
+    shard = 0
+    shards = 1
+    dedup_period = 1
+    table_name = "CuratedArticlesDB"
+
+    build_item = staticmethod(utils.nlp_to_url_data_object)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.max_articles is not None:
+            self.max_articles = int(self.max_articles)
+        self.shard = int(self.shard)
+        self.shards = int(self.shards)
+        self.ranker = priority.LinkRanker(self.section_weights)
+
+    def start_requests(self):
+        # dont_filter: with a JOBDIR, the seen requests persist across runs.
+        for url in self.start_urls[self.shard :: self.shards]:
+            yield scrapy.Request(
+                url=url,
+                callback=self.parse,
+                meta={"render": self.render, "skip_unchanged": True},
+                dont_filter=True,
+            )
+
+    def extract_links(self, response) -> Iterable[str]:
+        """Yields the raw hrefs of the candidate articles."""
+        if not self.link_xpaths:
+            yield from response.xpath("//a/@href").getall()
+            return
+        for xpath in self.link_xpaths:
+            yield from response.xpath(xpath).getall()
+
+    def normalize(self, response, hrefs: Iterable[str]) -> Iterable[str]:
+        """Yields absolute article URLs, unique by canonical URL."""
+        # Spiders built without a crawler have no settings.
+        settings = getattr(self, "settings", None)
+        canonicalize = canonical.get_canonicalizer(settings).canonicalize
+        seen = set()
+        for href in hrefs:
+            url = response.urljoin(href.strip())
+            key = canonicalize(url)
+            if key in seen or not self.is_article_url(url):
+                continue
+            seen.add(key)
+            yield url
+
+    def links(self, response) -> Dict[str, priority.Link]:
+        """The candidate articles' links, by absolute URL.
+
+        Only ``link_xpaths`` selecting an ``@href`` are used. If a URL has
+        several links, e.g. an image and a headline, the first position and
+        the longest text are kept.
+        """
+        links = {}
+        for xpath in self.link_xpaths or ["//a/@href"]:
+            if not xpath.endswith("/@href"):
+                continue
+            for element in response.xpath(xpath[: -len("/@href")]):
+                href = element.attrib.get("href")
+                if not href:
+                    continue
+                url = response.urljoin(href.strip())
+                text = element.xpath("normalize-space(.)").get()
+                link = links.get(url)
+                if link is None:
+                    section = " ".join(element.xpath("ancestor::*/@class").getall())
+                    links[url] = priority.Link(url, text, section, len(links))
+                elif len(text) > len(link.text):
+                    links[url] = link._replace(text=text)
+        return links
+
+    def rank(self, urls, links) -> List[Tuple[str, float]]:
+        """(url, priority) pairs, highest priority first."""
+        return self.ranker.rank(urls, links)
+
+    def is_article_url(self, url: str) -> bool:
+        if not url.startswith(("http://", "https://")) or url in self.blacklist:
+            return False
+        if self.base_url and url.startswith(self.base_url + "."):
+            return False
+        if self.category_match == "path":
+            return self.subcategory(url) is not None
+        if self.category_match == "substring":
+            return any(category in url for category in self.categories)
+        return True
+
+    def subcategory(self, url: str) -> Optional[str]:
+        """The subcategory stored with the article, if any."""
+        if self.category_match != "path":
+            return None
+        components = urlparse(url).path.split("/")
+        if len(components) == 3 and components[1] in self.categories:
+            return components[1]
+        return None
+
+    def url_filter(self) -> defer.Deferred:
+        """Fires with a callable returning whether a URL is not in the DB yet.
+
+        With ITEM_JOURNAL_ENABLED, URLs already in the item journal are
+        filtered out too: their articles are summarized, if not yet written.
+        """
+        return threads.deferToThread(
+            self._load_url_filter, get_item_journal(self.settings)
+        )
+
+    def _load_url_filter(self, journal):
+        url_filter = utils.UrlFilterer(
+            period=self.dedup_period,
+            table_name=self.table_name,
+            category=self.db_category,
+            index=utils.get_dedup_index(self.settings),
+        )
+        if journal is None:
+            return url_filter
+        recorded = journal.keys()
+        normalize = url_filter.index.normalize_url
+        return lambda url: url_filter(url) and normalize(url) not in recorded
+
+    def near_duplicates(self) -> defer.Deferred:
+        """Fires with the NearDuplicateIndex, loaded with the category's
+        titles, or with None if NEAR_DEDUP_ENABLED is off."""
+        if not self.settings.getbool("NEAR_DEDUP_ENABLED"):
+            return defer.succeed(None)
+        from hunt_knowledge.neardup import get_near_duplicate_index
+
+        index = get_near_duplicate_index(self.settings)
+        d = threads.deferToThread(
+            utils.load_titles_into_near_duplicate_index,
+            index,
+            period=self.dedup_period,
+            table_name=self.table_name,
+            category=self.db_category,
+            dedup_index=utils.get_dedup_index(self.settings),
+        )
+        return d.addCallback(lambda _: index)
+
+    def dedup(
+        self,
+        url_filter,
+        urls: Iterable[str],
+        near_duplicates=None,
+        headlines=None,
+        limit: Optional[int] = None,
+    ) -> Iterable[str]:
+        """Yields the URLs not in the DB, up to ``max_articles`` and ``limit``.
+
+        With a ``near_duplicates`` index, URLs whose ``headlines`` are
+        near-duplicates of a recent article's are left out too.
+        """
+        limits = [n for n in (self.max_articles, limit) if n is not None]
+        cap = min(limits) if limits else None
+        urls = filter(url_filter, urls)
+        if near_duplicates is not None:
+            urls = near_duplicates.filter_new(urls, headlines or {})
+        for count, url in enumerate(urls):
+            if cap is not None and count >= cap:
+                return
+            yield url
+
+    def claim(self, urls) -> defer.Deferred:
+        """Fires with the URLs no other worker of a sharded crawl has claimed."""
+        run_id = self.settings.get("DEDUP_CLAIM_RUN")
+        if not run_id:
+            return defer.succeed(urls)
+        return threads.deferToThread(
+            utils.claim_urls, utils.get_dedup_index(self.settings), run_id, urls
+        )
+
+    def summarize(self, url: str, priority: float = 0) -> defer.Deferred:
+        """Fires with the item for ``url``.
+
+        Requests of higher ``priority`` get the pipeline client's next free
+        slot first.
+        """
+        client = utils.get_pipeline_client(self.settings)
+        return client.url_to_data_object(
+            url, self.db_category, self.subcategory(url), self.build_item, priority
+        )
+
+    @staticmethod
+    def _summarized(item, near_duplicates, headline):
+        # Only now can the headline block its near-duplicates.
+        if near_duplicates is not None and item is not None and headline:
+            near_duplicates.add([headline])
+        return item
+
+    def _summary_failed(self, failure, url):
+        logger.error(
+            "Pipeline request for %s failed with: %s", url, failure.getErrorMessage()
+        )
+        return None
+
+    async def parse(self, response):
+        if utils.is_page_unchanged(response):
+            logger.info("%s is unchanged since the last run, skipping", response.url)
+            return
+
+        stages = metrics.get_stage_metrics()
+        labels = (self.name, self.db_category)
+        # Load the dedup indexes while the links are extracted.
+        filter_d = stages.time_deferred(self.url_filter(), metrics.DEDUP_QUERY, *labels)
+        near_d = stages.time_deferred(
+            self.near_duplicates(), metrics.DEDUP_QUERY, *labels
+        )
+        with stages.timer(metrics.LINK_EXTRACT, *labels):
+            urls = list(self.normalize(response, self.extract_links(response)))
+            links = self.links(response)
+        priorities = dict(self.rank(urls, links))
+        url_filter = await maybe_deferred_to_future(filter_d)
+        near_duplicates = await maybe_deferred_to_future(near_d)
+        headlines = {url: link.text for url, link in links.items()}
+
+        # Spend the budget before yielding to the reactor, so the spider's
+        # other pages see what is left.
+        budget = priority.get_summary_budget(self.settings)
+        limit = budget.remaining(self.name)
+        candidates = list(
+            self.dedup(url_filter, priorities, near_duplicates, headlines, limit)
+        )
+        budget.spend(self.name, len(candidates))
+        new_urls = await maybe_deferred_to_future(self.claim(candidates))
+        budget.refund(self.name, len(candidates) - len(new_urls))
+        over_budget = limit is not None and len(candidates) >= limit
+        if over_budget:
+            logger.info("Summary budget of %s ran out on %s", self.name, response.url)
+
+        done = defer.DeferredQueue()
+        pending = 0
+        for url in new_urls:
+            d = stages.time_deferred(
+                self.summarize(url, priorities[url]), metrics.PIPELINE_REQUEST, *labels
+            )
+            d.addCallback(self._summarized, near_duplicates, headlines.get(url))
+            d.addErrback(self._summary_failed, url)
+            d.addCallback(done.put)
+            pending += 1
+        logger.info(
+            "Summarizing %d of %d links on %s",
+            pending,
+            len(urls),
+            response.url,
+            extra={"new_urls": Preview(new_urls)},
+        )
+
+        # Items are written to DynamoDB by the DynamoDBPipeline.
+        failed = False
+        while pending:
+            item = await maybe_deferred_to_future(done.get())
+            pending -= 1
+            if item is None:
+                failed = True
+            else:
+                yield item
+        # A page cut short by the budget, or with failed summaries, is crawled
+        # again next run.
+        if over_budget or failed:
+            return
+        utils.mark_page_processed(response, self.settings)
@@ -1,5 +1,4 @@
 import scrapy
-import boto3
 from hunt_knowledge import utils
 import itertools
 import logging
@@ -12,11 +11,9 @@ class UKGovtPetitionScraper(scrapy.Spider):
     base_url = "https://petition.parliament.uk/"
     petition_url = "petitions?state=open"
 
-    logging.basicConfig(
-        filename="log.txt", format="%(levelname)s: %(message)s", level=logging.WARNING
-    )
-
     def __init__(self):
+        import boto3
+
         super().__init__()
         self.local_development = False
         self.table = boto3.resource("dynamodb").Table("CuratedArticlesDB")
@@ -0,0 +1,116 @@
+"""Adaptive concurrency and rate limits for the genei-pipeline API.
+
+The pipeline's GPUs are shared by every spider and every crawl, so a fixed
+concurrency either overloads them (timeouts, 429s) or leaves them idle. An
+``AimdController`` adjusts the number of requests in flight the way TCP
+congestion control does: it grows by one per window of successful requests
+while latency stays under target, shrinks gently while latency is above it,
+and halves on throttling, server errors and timeouts. A ``TokenBucket``
+optionally caps the rate at which requests start, so that a raised limit
+doesn't turn into a burst.
+"""
+
+import threading
+import time
+from typing import Optional
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Allows ``rate`` events per second on average, in bursts of ``burst``."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None, now=time.monotonic):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self.now = now
+        self.tokens = self.burst
+        self.updated = now()
+
+    def __repr__(self):
+        return f"{__class__.__name__}, rate: {self.rate}, burst: {self.burst}"
+
+    def take(self) -> float:
+        """Takes a token, returning 0; or, if there is none, the seconds until
+        there is one (nothing is taken)."""
+        now = self.now()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class AimdController:
+    """Additive-increase, multiplicative-decrease limit on requests in flight.
+
+    Every finished request is reported with ``observe``. An overloaded one
+    (429/5xx, timeout) halves the limit, at most once per window: requests
+    started before the last decrease don't decrease it again. Otherwise the
+    limit grows by ``1 / limit`` per request (one per window) while the
+    smoothed latency is under ``target_latency``, and shrinks as much while
+    it is over.
+
+    Shared by the pipeline client's requests, from the worker threads.
+    """
+
+    def __init__(
+        self,
+        initial: float = 2,
+        min_concurrency: int = 1,
+        max_concurrency: int = 4,
+        target_latency: float = 30.0,
+        decrease_factor: float = 0.5,
+        smoothing: float = 0.2,
+        max_rate: Optional[float] = None,
+        burst: Optional[float] = None,
+    ):
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.limit = float(min(max(initial, min_concurrency), max_concurrency))
+        self.target_latency = target_latency
+        self.decrease_factor = decrease_factor
+        self.smoothing = smoothing
+        self.latency: Optional[float] = None
+        self.decreased_at = float("-inf")
+        self.bucket = TokenBucket(max_rate, burst) if max_rate else None
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return (
+            f"{__class__.__name__}, limit: {self.limit:.2f}, "
+            f"latency: {self.latency}, max_concurrency: {self.max_concurrency}"
+        )
+
+    @property
+    def concurrency(self) -> int:
+        """Requests allowed in flight."""
+        return max(self.min_concurrency, int(self.limit))
+
+    def observe(self, started: float, latency: float, overloaded: bool = False):
+        """Reports a request started at ``started`` (``time.monotonic()``)
+        that took ``latency`` seconds."""
+        with self.lock:
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += self.smoothing * (latency - self.latency)
+
+            if overloaded:
+                if started < self.decreased_at:
+                    return
+                self.limit = max(
+                    self.min_concurrency, self.limit * self.decrease_factor
+                )
+                self.decreased_at = time.monotonic()
+                logger.info(
+                    "Pipeline overloaded, allowing %d requests in flight",
+                    self.concurrency,
+                )
+            elif self.latency > self.target_latency:
+                self.limit = max(self.min_concurrency, self.limit - 1 / self.limit)
+            else:
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
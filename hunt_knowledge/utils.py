@@ -1,11 +1,21 @@
-import requests
-import json
-from typing import List
-from selenium import webdriver
-import uuid
-import boto3
-from boto3.dynamodb.conditions import Key
-from datetime import datetime, date, timedelta
+"""Helpers shared by the spiders, middlewares and pipelines.
+
+The heavy backends are split into ``hunt_knowledge.backends`` and imported
+on first use: ``browser`` (selenium), ``pipeline`` (requests) and ``dynamo``
+(boto3). Their public names are still available from this module, so
+``utils.get_webdriver_pool`` only imports selenium when it is first used, and
+spiders that never render a page don't import it at all.
+"""
+
+import importlib
+from typing import List, Optional
+
+from twisted.internet import defer
+
+from hunt_knowledge.cache import SqliteCache
+from hunt_knowledge.canonical import canonical_url, canonicalize, get_canonicalizer
+from hunt_knowledge.dedup import DedupIndex, DedupStore
+from hunt_knowledge.items import Article
 
 import logging
 
@@ -17,172 +27,170 @@ logging.getLogger("botocore").setLevel(logging.CRITICAL)
 logging.getLogger("s3transfer").setLevel(logging.CRITICAL)
 logging.getLogger("urllib3").setLevel(logging.CRITICAL)
 
-
-def setup_webdriver(local=False):
-    if local:
-        return webdriver.Chrome("/usr/bin/chromedriver")
-    chrome_options = webdriver.ChromeOptions()
-    chrome_options.add_argument("--no-sandbox")
-    chrome_options.add_argument("--window-size=1420,1080")
-    chrome_options.add_argument("--headless")
-    chrome_options.add_argument("--disable-gpu")
-    driver = webdriver.Chrome(options=chrome_options)
-    return driver
-
-
-def selenium_get_all_urls_on_page(driver, url, drop_duplicates=True) -> List[str]:
-    """Given a URL, get all URLs on that URL"""
-    driver.get(url)
-    elements = driver.find_elements_by_xpath("//a[@href]")
-    urls = []
-    for elem in elements:
-        href = elem.get_attribute("href")
-        urls.append(href)
-    if drop_duplicates:
-        urls = list(set(urls))
-    return urls
-
-
-def send_pipeline_request(url):
-    # api = "http://ac6b3caf43dd145eb8bd6baf06aa83aa-e02d1280de19e099.elb.eu-west-1.amazonaws.com/genei-pipeline"
-    api = "https://w3ddy8vzni.execute-api.eu-west-1.amazonaws.com/v1/genei-pipeline"
-    headers = {"Content-type": "application/json"}
-    generation_args = {
-        "beam": 8,
-        "min_len": 50,
-        "max_len": 300,
-        "len_pen": 1.0,
-        "no_repeat_ngram_size": 3,
-        "return_sents": True,
-    }
-    data = {
-        "config": {"generation_args": generation_args},
-        "disabledComponents": [
-            "ReduceEntityVectorsComponent",
-            "HierarchicalEntTagger",
-            "MultiEntReducer",
-            "ImageSearcher",
-        ],
-        "url": url,
-    }
-    logger.info(f"Making pipeline request with url: {url}")
-    return requests.post(api, headers=headers, data=json.dumps(data)).json()
-
-
-def get_url_summary(url):
-    response = send_pipeline_request(url)
-    doc = response["doc"]
-    summary = doc["abstractiveSummary"]
-    return summary
-
-
-def nlp_object_to_data_object(nlp, category, subcategory=None):
+_BACKENDS = {
+    "browser": (
+        "BLOCKED_RESOURCE_PATTERNS",
+        "setup_webdriver",
+        "process_tree_rss_mb",
+        "WebDriverPool",
+        "get_webdriver_pool",
+        "EXTRACT_LINKS_SCRIPT",
+        "selenium_extract_links",
+        "selenium_get_all_urls_on_page",
+    ),
+    "pipeline": (
+        "PIPELINE_API",
+        "GENERATION_ARGS",
+        "DISABLED_COMPONENTS",
+        "pipeline_payload",
+        "batch_payload",
+        "batch_urls",
+        "PipelineItemError",
+        "pipeline_cache_key",
+        "send_pipeline_request",
+        "get_url_summary",
+        "url_to_data_object",
+        "PipelineClient",
+        "get_pipeline_client",
+        "close_pipeline_client",
+        "open_pipeline_client",
+        "release_pipeline_client",
+    ),
+    "dynamo": (
+        "get_dynamodb_client",
+        "iter_dynamo_by_category",
+        "iter_dynamo_by_categories",
+        "query_dynamo_by_category",
+        "query_fields_of_category",
+        "sync_dedup_store",
+        "load_category_into_index",
+        "load_categories_into_index",
+        "load_titles_into_near_duplicate_index",
+        "UrlFilterer",
+        "is_title_in_db",
+    ),
+}
+_BACKEND_OF = {name: backend for backend, names in _BACKENDS.items() for name in names}
+
+
+def __getattr__(name):
+    backend = _BACKEND_OF.get(name)
+    if backend is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module = importlib.import_module(f"hunt_knowledge.backends.{backend}")
+    return getattr(module, name)
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_BACKEND_OF))
+
+
+_page_hash_store = None
+
+
+def get_page_hash_store(settings=None) -> Optional[SqliteCache]:
+    """Returns the store of processed landing page hashes, if enabled."""
+    global _page_hash_store
+    if _page_hash_store is None and settings is not None:
+        if settings.getbool("SKIP_UNCHANGED_PAGES"):
+            _page_hash_store = SqliteCache(settings.get("PAGE_HASH_PATH"))
+    return _page_hash_store
+
+
+def is_page_unchanged(response) -> bool:
+    """Whether the page is byte-identical to the last processed version."""
+    return "unchanged" in response.flags
+
+
+def mark_page_processed(response, settings=None):
+    """Records the page's hash, so an identical page is skipped next run."""
+    store = get_page_hash_store(settings)
+    content_hash = response.meta.get("content_hash")
+    if store is not None and content_hash:
+        store.set(canonical_url(response), content_hash)
+
+
+def nlp_object_to_data_object(nlp, category, subcategory=None) -> Article:
     """Convert NLP object to object ready to be placed in DB."""
-    doc = nlp["doc"]
-    metadata = nlp["metadata"]
-    metadata.update({"domain": nlp["source"]})
-    now = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
-    updatedAt = metadata.get("date_published")
-    if updatedAt is None:
-        updatedAt = now
-
-    return {
-        "id": str(uuid.uuid1()),
-        "__typename": "Article",
-        "createdAt": now,
-        "updatedAt": updatedAt,
-        "mercuryObj": metadata,
-        "url": metadata.get("url"),
-        "category": category,
-        "subcategory": subcategory,
-        "absSum": doc["abstractiveSummary"],
-        "title": nlp["title"],
-        "source": nlp["source"],
-        "text": doc["text"],
-    }
-
-
-def url_to_data_object(url, category, subcategory=None):
-    nlp = send_pipeline_request(url)
-    obj = nlp_object_to_data_object(nlp, category, subcategory)
-    obj["url"] = url
-    return obj
-
-
-def query_dynamo_by_category(
-    period: int = 1, table_name: str = "CuratedArticlesDB", category: str = "pharma"
-):
-    """
-    Queries any DynamoDB table by category, up to X previous days.
-    Parameters
-    ----------
-    period: The number of days we want to go back
-    table_name: Name of the DynamoDB table
-    category: The category of the articles. E.g "pharma"
-
-    Returns
-    -------
-    Responses of database
-    """
-    # Get yesterday's date
-    yday = str(date.today() - timedelta(days=period))
+    return Article.from_nlp(nlp, category, subcategory)
+
 
-    table = boto3.resource("dynamodb").Table(table_name)
-    return table.query(
-        IndexName="category-createdAt-index",
-        KeyConditionExpression=Key("category").eq(category) & Key("createdAt").gt(yday),
-    )
+def nlp_to_url_data_object(nlp, url, category, subcategory=None) -> Article:
+    return Article.from_nlp(nlp, category, subcategory, url=url)
 
 
-def query_fields_of_category(
-    field="title", period=1, table_name="CuratedArticlesDB", category="pharma"
-):
-    """Gets data field of articles of a particular category from the DB."""
-    response = query_dynamo_by_category(period, table_name, category)
-    if not response["Items"]:
-        return []
-    obj = response["Items"][0]
-    assert field in obj, f"Field {field} not in object with keys: {obj.keys()}"
-    return [x[field] for x in response["Items"]]
+def gather_successes(deferreds, labels=None) -> defer.Deferred:
+    """Waits for all deferreds, firing with the results of those that succeeded.
+
+    Failures are logged (with the matching entry of ``labels``, if given) and
+    dropped.
+    """
+    labels = labels if labels is not None else [None] * len(deferreds)
+
+    def collect(results):
+        successes = []
+        for label, (ok, result) in zip(labels, results):
+            if ok:
+                successes.append(result)
+            else:
+                logger.error(
+                    "Pipeline request for %s failed with: %s",
+                    label,
+                    result.getErrorMessage(),
+                )
+        return successes
+
+    dl = defer.DeferredList(deferreds, consumeErrors=True)
+    return dl.addCallback(collect)
 
 
 def standardize_url(url):
-    return url[:-1] if url.endswith("/") else url
-
-
-class UrlFilterer:
-    """Class to filter URLs that are already in the database from the last X days"""
-
-    def __init__(
-        self,
-        period: int = 1,
-        table_name: str = "CuratedArticlesDB",
-        category: str = "pharma",
-    ):
-        urls = query_fields_of_category("url", period, table_name, category)
-        self.urls = [standardize_url(url) for url in urls]
-        self.period = period
-        self.table_name = table_name
-        self.category = category
-
-    def __repr__(self):
-        return (
-            f"{__class__.__name__}, period: {self.period}, "
-            f"table_name: {self.table_name}, "
-            f"category: {self.category}"
-        )
-
-    def __call__(self, url):
-        url = standardize_url(url)
-        return url not in self.urls
-
-
-def is_title_in_db(
-    title,
-    period: int = 1,
-    table_name: str = "CuratedArticlesDB",
-    category: str = "pharma",
-):
-    """Checks if article title already exists in the last X days."""
-    titles = query_fields_of_category("title", period, table_name, category)
-    return title in titles
+    """Canonical form of ``url``; see ``hunt_knowledge.canonical``."""
+    return canonicalize(url)
+
+
+_dedup_index = None
+
+
+def get_dedup_index(settings=None) -> DedupIndex:
+    """Returns the process-wide DedupIndex, creating it on first use.
+
+    It is built once per crawl and shared across spiders and categories; each
+    category is only fetched from DynamoDB the first time it is needed. With
+    DEDUP_STATE_ENABLED, the index is backed by a local DedupStore so later
+    runs only fetch articles newer than the last one seen.
+    """
+    global _dedup_index
+    if _dedup_index is None:
+        if settings is None:
+            _dedup_index = DedupIndex(normalize_url=canonicalize)
+        else:
+            canonicalizer = get_canonicalizer(settings)
+            store = None
+            if settings.getbool("DEDUP_STATE_ENABLED"):
+                store = DedupStore(
+                    settings.get("DEDUP_STATE_PATH"),
+                    version=canonicalizer.version,
+                    sync_lag=settings.getfloat("DEDUP_SYNC_LAG", 3600),
+                )
+            _dedup_index = DedupIndex(
+                normalize_url=canonicalizer.canonicalize,
+                bloom=settings.getbool("DEDUP_BLOOM_FILTER"),
+                capacity=settings.getint("DEDUP_BLOOM_CAPACITY", 1_000_000),
+                error_rate=settings.getfloat("DEDUP_BLOOM_ERROR_RATE", 0.001),
+                store=store,
+            )
+    return _dedup_index
+
+
+def claim_urls(index: DedupIndex, run_id: str, urls: List[str]) -> List[str]:
+    """The URLs this process claimed for ``run_id`` in the index's store.
+
+    Used by sharded crawls, whose workers share the store, so that a URL
+    found by two workers is only summarized once.
+    """
+    if index.store is None:
+        return urls
+    digests = [index.url_digest(url) for url in urls]
+    claimed = index.store.claim(run_id, digests)
+    return [url for url, digest in zip(urls, digests) if digest in claimed]
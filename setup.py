@@ -13,8 +13,11 @@ with open('HISTORY.rst') as history_file:
 requirements = [
     "Click>=7.0",
     "requests",
-    "scrapy",
+    "urllib3>=1.26",
+    "scrapy>=2.7",
     "selenium",
+    "attrs>=19.1",
+    "numpy>=1.20",
     "boto3"
 ]
 
@@ -25,15 +28,13 @@ test_requirements = ['pytest>=3', ]
 setup(
     author="Laksh",
     author_email='lakshaithanii@gmail.com',
-    python_requires='>=3.5',
+    python_requires='>=3.7',
     classifiers=[
         'Development Status :: 2 - Pre-Alpha',
         'Intended Audience :: Developers',
         'License :: OSI Approved :: MIT License',
         'Natural Language :: English',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.5',
-        'Programming Language :: Python :: 3.6',
         'Programming Language :: Python :: 3.7',
         'Programming Language :: Python :: 3.8',
     ],
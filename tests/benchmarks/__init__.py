@@ -0,0 +1,4 @@
+"""Offline benchmarks of the spiders, against recorded pages and stub backends.
+
+Skipped unless HUNT_KNOWLEDGE_BENCHMARK=1; see test_benchmarks.py.
+"""
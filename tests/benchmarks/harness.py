@@ -0,0 +1,131 @@
+"""Runs one spider offline and prints its throughput, latency and memory.
+
+    python -m tests.benchmarks.harness ft --latency 0.05
+
+Each spider runs in its own process, since a reactor can't be restarted and
+peak RSS has to be measured per spider.
+"""
+
+import argparse
+import json
+import os
+import resource
+import statistics
+import sys
+import time
+
+from scrapy import signals
+from scrapy.crawler import CrawlerProcess
+from scrapy.http import HtmlResponse
+from scrapy.utils.project import get_project_settings
+
+from hunt_knowledge.backends import dynamo
+from tests.benchmarks.stubs import FIXTURES, InMemoryDynamoDB, StubPipelineServer
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    if len(values) == 1:
+        return round(values[0], 4)
+    return round(statistics.quantiles(values, n=100, method="inclusive")[q - 1], 4)
+
+
+def benchmark_settings(api, max_in_flight=4, batch_api=None, batch_size=8):
+    settings = get_project_settings()
+    settings.setdict(
+        {
+            "PIPELINE_API": api,
+            "PIPELINE_BATCH_API": batch_api,
+            "PIPELINE_BATCH_SIZE": batch_size,
+            "PIPELINE_MAX_IN_FLIGHT": max_in_flight,
+            "PIPELINE_THROTTLE_ENABLED": False,
+            "PIPELINE_CACHE_ENABLED": False,
+            "DEDUP_STATE_ENABLED": False,
+            "ITEM_JOURNAL_ENABLED": False,
+            "SKIP_UNCHANGED_PAGES": False,
+            "HTTPCACHE_ENABLED": False,
+            "DYNAMODB_FLUSH_INTERVAL": 0.05,
+            "LOG_LEVEL": "WARNING",
+            "DOWNLOADER_MIDDLEWARES": {
+                "tests.benchmarks.stubs.FixtureMiddleware": 940,
+            },
+        },
+        priority="cmdline",
+    )
+    return settings
+
+
+def run(spider, latency=0.0, max_in_flight=4, seeded=0.2, batch_size=None):
+    """Crawls ``spider`` against the stubs and returns its benchmark report.
+
+    ``seeded`` is the share of the fixture's article links already stored, so
+    the dedup stage has something to filter. With ``batch_size``, summaries
+    go to the batch endpoint.
+    """
+    db = InMemoryDynamoDB()
+    dynamo._dynamodb_client = db
+    dynamo.iter_dynamo_by_category = db.iter_by_category
+    responses = []
+
+    with StubPipelineServer(latency) as server:
+        batch_api = server.batch_url if batch_size else None
+        process = CrawlerProcess(
+            benchmark_settings(server.url, max_in_flight, batch_api, batch_size or 8)
+        )
+        crawler = process.create_crawler(spider)
+
+        def response_received(response, request, spider):
+            responses.append(time.monotonic())
+
+        # Signal receivers are weakly referenced; keep this one in scope.
+        crawler.signals.connect(response_received, signal=signals.response_received)
+
+        seed_from_fixture(db, crawler.spidercls, seeded)
+        process.crawl(crawler)
+        process.start()
+
+    written = db.written_at
+    started = responses[0] if responses else None
+    latencies = [t - started for t in written] if started is not None else []
+    elapsed = (max(written) - started) if written and started is not None else 0
+    return {
+        "spider": spider,
+        "articles": len(written),
+        "articles_per_second": round(len(written) / elapsed, 2) if elapsed else None,
+        "latency_p50_s": percentile(latencies, 50),
+        "latency_p99_s": percentile(latencies, 99),
+        "peak_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+        ),
+        "pipeline_latency_s": latency,
+        "pipeline_batches": len(server.batches) if batch_size else None,
+    }
+
+
+def seed_from_fixture(db, spidercls, share):
+    """Stores ``share`` of the fixture's article URLs in the fake table."""
+    spider = spidercls()
+    with open(os.path.join(FIXTURES, f"{spidercls.name}.html"), "rb") as f:
+        response = HtmlResponse(spider.start_urls[0], body=f.read())
+    urls = list(spider.normalize(response, spider.extract_links(response)))
+    db.seed(urls[: int(len(urls) * share)], spider.db_category)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("spider")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--max-in-flight", type=int, default=4)
+    parser.add_argument("--seeded", type=float, default=0.2)
+    parser.add_argument("--batch-size", type=int, default=None)
+    args = parser.parse_args(argv)
+    report = run(
+        args.spider, args.latency, args.max_in_flight, args.seeded, args.batch_size
+    )
+    print(json.dumps(report))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+"""Stand-ins for the live sites, the genei-pipeline API and DynamoDB."""
+
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from scrapy.http import HtmlResponse
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+class FixtureMiddleware:
+    """Downloader middleware answering requests from the recorded fixtures.
+
+    ``fixtures/<spider name>.html`` is served for every request of the
+    spider, flagged as rendered, so neither the network nor Chrome is used.
+    """
+
+    def __init__(self):
+        self.pages = {}
+
+    def process_request(self, request, spider):
+        if spider.name not in self.pages:
+            with open(os.path.join(FIXTURES, f"{spider.name}.html"), "rb") as f:
+                self.pages[spider.name] = f.read()
+        return HtmlResponse(
+            request.url,
+            body=self.pages[spider.name],
+            request=request,
+            flags=["rendered"] if request.meta.get("render") else [],
+        )
+
+
+class StubPipelineServer:
+    """Local genei-pipeline API answering every POST after ``latency`` seconds.
+
+    POSTs to ``batch_url`` are answered like the batch endpoint, taking
+    ``latency`` per batch as a GPU-side batch would. The sizes of the batches
+    are recorded in ``batches``, and URLs in ``failing`` get an error result.
+    The first POSTs are answered with the HTTP ``statuses``, e.g. 429s.
+    """
+
+    def __init__(self, latency: float = 0.0, failing=(), statuses=()):
+        self.latency = latency
+        self.failing = set(failing)
+        self.statuses = list(statuses)
+        self.batches = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                time.sleep(server.latency)
+                if server.statuses:
+                    self.send_response(server.statuses.pop(0))
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                if self.path.endswith("/batch"):
+                    server.batches.append(len(body["urls"]))
+                    result = {"results": [server.result(url) for url in body["urls"]]}
+                else:
+                    result = summary(body["url"])
+                payload = json.dumps(result).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}/genei-pipeline"
+
+    @property
+    def batch_url(self):
+        return f"{self.url}/batch"
+
+    def result(self, url):
+        if url in self.failing:
+            return {"error": "summarization failed"}
+        return summary(url)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def summary(url):
+    """A genei-pipeline response of typical size for ``url``.
+
+    Like the real pipeline's, the summary is a list of sentences, or None
+    for some articles.
+    """
+    domain = urlparse(url).netloc
+    slug = urlparse(url).path.rstrip("/").rsplit("/", 1)[-1]
+    return {
+        "title": slug.replace("-", " ").title(),
+        "source": domain,
+        "metadata": {"url": url, "title": slug, "date_published": None},
+        "doc": {
+            "abstractiveSummary": (
+                None if len(slug) % 4 == 0 else [f"Summary of {slug}."] * 10
+            ),
+            "text": f"Paragraph about {slug}. " * 400,
+        },
+    }
+
+
+class InMemoryDynamoDB:
+    """Low-level DynamoDB client keeping CuratedArticlesDB in memory.
+
+    Records when each item was written. ``seed`` adds articles that the dedup
+    stage should find already stored.
+    """
+
+    def __init__(self):
+        self.items = []
+        self.written_at = []
+        self.lock = threading.Lock()
+
+    def seed(self, urls, category):
+        with self.lock:
+            for url in urls:
+                self.items.append(
+                    {
+                        "url": url,
+                        "title": url,
+                        "category": category,
+                        "createdAt": "2020-06-01T00:00:00.000Z",
+                    }
+                )
+
+    def batch_write_item(self, RequestItems):
+        now = time.monotonic()
+        with self.lock:
+            for requests in RequestItems.values():
+                for request in requests:
+                    item = request["PutRequest"]["Item"]
+                    self.items.append({k: v.get("S") for k, v in item.items()})
+                    self.written_at.append(now)
+        return {"UnprocessedItems": {}}
+
+    def iter_by_category(self, period=1, table_name=None, category="pharma", **kw):
+        """Stand-in for backends.dynamo.iter_dynamo_by_category."""
+        with self.lock:
+            items = [item for item in self.items if item.get("category") == category]
+        return iter(items)
@@ -0,0 +1,71 @@
+"""Offline throughput benchmark of every news spider.
+
+Run with::
+
+    HUNT_KNOWLEDGE_BENCHMARK=1 pytest -s tests/benchmarks
+
+Each spider crawls its recorded landing page (fixtures/) in its own process,
+against a stub genei-pipeline answering after BENCHMARK_PIPELINE_LATENCY
+seconds and an in-memory DynamoDB. Articles/sec, p50/p99 end-to-end latency
+(landing page downloaded to article written) and peak RSS are reported per
+spider. Set BENCHMARK_MIN_ARTICLES_PER_SECOND to fail on a regression, and
+BENCHMARK_BATCH_SIZE to summarize through the batch endpoint.
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+pytestmark = pytest.mark.skipif(
+    not os.environ.get("HUNT_KNOWLEDGE_BENCHMARK"),
+    reason="set HUNT_KNOWLEDGE_BENCHMARK=1 to run the benchmarks",
+)
+
+SPIDERS = ["ft", "fiercebiotech", "jpost-middle-east", "pharmaceuticaltechnology"]
+LATENCY = os.environ.get("BENCHMARK_PIPELINE_LATENCY", "0.05")
+MIN_RATE = float(os.environ.get("BENCHMARK_MIN_ARTICLES_PER_SECOND", "0"))
+BATCH_SIZE = os.environ.get("BENCHMARK_BATCH_SIZE")
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def run_benchmark(spider):
+    args = [sys.executable, "-m", "tests.benchmarks.harness", spider]
+    args += ["--latency", LATENCY]
+    if BATCH_SIZE:
+        args += ["--batch-size", BATCH_SIZE]
+    output = subprocess.run(
+        args,
+        check=True,
+        capture_output=True,
+        text=True,
+        cwd=ROOT,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+@pytest.fixture(scope="module")
+def reports():
+    reports = [run_benchmark(spider) for spider in SPIDERS]
+    columns = [
+        "spider",
+        "articles",
+        "articles_per_second",
+        "latency_p50_s",
+        "latency_p99_s",
+        "peak_rss_mb",
+    ]
+    print()
+    print(" | ".join(columns))
+    for report in reports:
+        print(" | ".join(str(report[column]) for column in columns))
+    return reports
+
+
+@pytest.mark.parametrize("spider", SPIDERS)
+def test_spider_throughput(reports, spider):
+    (report,) = [report for report in reports if report["spider"] == spider]
+    assert report["articles"] > 0
+    assert report["articles_per_second"] >= MIN_RATE, report
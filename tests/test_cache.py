@@ -0,0 +1,64 @@
+from hunt_knowledge import cache, utils
+
+
+def test_sqlite_cache_round_trip(tmp_path):
+    store = cache.SqliteCache(str(tmp_path / "c.sqlite"))
+    store.set("a", {"doc": {"text": "hello"}})
+    assert store.get("a") == {"doc": {"text": "hello"}}
+    assert store.get("missing") is None
+    assert len(store) == 1
+
+
+def test_sqlite_cache_ttl(tmp_path, monkeypatch):
+    store = cache.SqliteCache(str(tmp_path / "c.sqlite"), ttl=10)
+    monkeypatch.setattr(cache.time, "time", lambda: 1000.0)
+    store.set("a", 1)
+    monkeypatch.setattr(cache.time, "time", lambda: 1005.0)
+    assert store.get("a") == 1
+    monkeypatch.setattr(cache.time, "time", lambda: 1011.0)
+    assert store.get("a") is None
+    assert len(store) == 0
+
+
+def test_sqlite_cache_evicts_least_recently_used(tmp_path, monkeypatch):
+    store = cache.SqliteCache(str(tmp_path / "c.sqlite"))
+    clock = iter(range(1000, 2000))
+    monkeypatch.setattr(cache.time, "time", lambda: float(next(clock)))
+    for key in "abc":
+        store.set(key, "x" * 1000)
+    store.get("a")
+    store.max_bytes = store.size()
+    store.set("d", "x" * 1000)
+    assert "b" not in store
+    assert "a" in store and "c" in store and "d" in store
+
+
+def test_pipeline_cache_key_normalizes_url():
+    assert utils.pipeline_cache_key("https://a.com/x/") == utils.pipeline_cache_key(
+        "https://a.com/x"
+    )
+    assert utils.pipeline_cache_key("https://a.com/x") != utils.pipeline_cache_key(
+        "https://a.com/y"
+    )
+
+
+def test_pipeline_client_serves_cached_responses(tmp_path, monkeypatch):
+    client = utils.PipelineClient(cache_path=str(tmp_path / "p.sqlite"))
+    posts = []
+
+    class Response:
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return {"doc": {"abstractiveSummary": ["s"]}}
+
+    def post(*args, **kwargs):
+        posts.append(kwargs)
+        return Response()
+
+    monkeypatch.setattr(client.session, "post", post)
+    first = client.send("https://a.com/x")
+    assert client.send("https://a.com/x/") == first
+    assert len(posts) == 1
+    client.close()
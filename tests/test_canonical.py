@@ -0,0 +1,73 @@
+from scrapy.http import HtmlResponse
+from scrapy.settings import Settings
+
+from hunt_knowledge import canonical
+
+
+def test_canonicalize_maps_url_variants_to_one_url():
+    canonicalizer = canonical.Canonicalizer(rules={})
+    variants = [
+        "https://example.com/news/story",
+        "http://example.com/news/story",
+        "https://WWW.Example.com:443/news/story/",
+        "https://example.com//news/./story#comments",
+        "https://example.com/news/story?utm_source=twitter&fbclid=abc",
+        "https://example.com/amp/news/story",
+        "https://example.com/news/story/amp",
+    ]
+    assert {canonicalizer.canonicalize(url) for url in variants} == {
+        "https://example.com/news/story"
+    }
+    # Other parameters are kept, in a stable order.
+    assert (
+        canonicalizer.canonicalize("https://example.com/a?page=2&id=1&utm_medium=x")
+        == "https://example.com/a?id=1&page=2"
+    )
+    assert canonicalizer.canonicalize("https://example.com/") == "https://example.com"
+    assert canonicalizer.canonicalize("mailto:a@example.com") == "mailto:a@example.com"
+
+
+def test_domain_rules_apply_to_subdomains():
+    canonicalizer = canonical.Canonicalizer(
+        rules={"example.com": {"keep_params": ["id"], "lowercase_path": True}}
+    )
+    assert (
+        canonicalizer.canonicalize("https://news.example.com/Story?id=1&page=2")
+        == "https://news.example.com/story?id=1"
+    )
+    # The crawled sites drop every parameter by default.
+    assert (
+        canonicalizer.canonicalize("https://www.ft.com/content/abc?segmentId=1&x=2")
+        == "https://ft.com/content/abc"
+    )
+    assert canonicalizer.canonicalize("https://a.com/Story") == "https://a.com/Story"
+
+
+def test_canonicalize_memoizes_and_versions_rules():
+    canonicalizer = canonical.Canonicalizer(cache_size=2)
+    for _ in range(3):
+        canonicalizer.canonicalize("https://a.com/x/")
+    assert canonicalizer.canonicalize.cache_info().hits == 2
+    other = canonical.Canonicalizer(rules={"a.com": {"keep_params": []}})
+    assert other.version != canonicalizer.version
+    assert canonical.Canonicalizer().version == canonicalizer.version
+
+
+def test_canonical_url_uses_same_site_rel_canonical():
+    page = b'<html><head><link rel="canonical" href="/news/story"></head></html>'
+    response = HtmlResponse("https://example.com/news/story-amp?ref=x", body=page)
+    canonicalizer = canonical.Canonicalizer()
+    assert canonicalizer.canonical_url(response) == "https://example.com/news/story"
+
+    page = b'<link rel="canonical" href="https://other.com/story">'
+    response = HtmlResponse("https://example.com/story", body=page)
+    assert canonicalizer.canonical_url(response) == "https://example.com/story"
+
+
+def test_get_canonicalizer_uses_settings(monkeypatch):
+    monkeypatch.setattr(canonical, "_canonicalizer", None)
+    default = canonical.get_canonicalizer()
+    rules = {"a.com": {"lowercase_path": True}}
+    configured = canonical.get_canonicalizer(Settings({"URL_CANONICAL_RULES": rules}))
+    assert configured is not default
+    assert canonical.canonicalize("https://a.com/X") == "https://a.com/x"
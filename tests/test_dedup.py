@@ -0,0 +1,142 @@
+from hunt_knowledge import dedup, utils
+from hunt_knowledge.backends import dynamo
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = dedup.BloomFilter(capacity=1000, error_rate=0.01)
+    digests = [dedup._digest(f"https://a.com/{i}") for i in range(1000)]
+    for digest in digests:
+        bloom.add_digest(digest)
+    assert all(digest in bloom for digest in digests)
+    misses = [dedup._digest(f"https://b.com/{i}") for i in range(1000)]
+    assert sum(digest in bloom for digest in misses) < 50
+
+
+def test_dedup_index_normalizes_urls_and_loads_once():
+    for bloom in (False, True):
+        index = dedup.DedupIndex(normalize_url=utils.standardize_url, bloom=bloom)
+        fetches = []
+
+        def fetch():
+            fetches.append(1)
+            return [{"url": "https://a.com/x/", "title": "X"}]
+
+        index.load(("table", "pharma", 1), fetch)
+        index.load(("table", "pharma", 1), fetch)
+        assert len(fetches) == 1
+        assert index.has_url("https://a.com/x")
+        assert index.has_title("X")
+        assert not index.has_url("https://a.com/y")
+        assert list(index.filter_new(["https://a.com/x", "https://a.com/y"])) == [
+            "https://a.com/y"
+        ]
+
+
+def test_url_filterer_uses_shared_index(monkeypatch):
+    queries = []
+
+    def query(period, table_name, category, fields=None):
+        queries.append(category)
+        return iter([{"url": "https://a.com/x", "title": "X"}])
+
+    monkeypatch.setattr(dynamo, "iter_dynamo_by_category", query)
+    index = dedup.DedupIndex(normalize_url=utils.standardize_url)
+    url_filter = utils.UrlFilterer(category="pharma", index=index)
+    assert not url_filter("https://a.com/x/")
+    assert url_filter("https://a.com/y")
+    assert utils.is_title_in_db("X", category="pharma", index=index)
+    assert queries == ["pharma"]
+
+
+def test_dedup_store_only_fetches_past_watermark(tmp_path, monkeypatch):
+    queries = []
+    pages = [
+        [
+            {"url": "https://a.com/old", "title": "Old", "createdAt": "2000-01-01"},
+            {"url": "https://a.com/x", "title": "X", "createdAt": "2999-01-01T00"},
+        ],
+        [{"url": "https://a.com/y", "title": "Y", "createdAt": "2999-01-02T00"}],
+    ]
+
+    def query(period, table_name, category, fields=None, since=None):
+        queries.append(since)
+        return iter(pages[len(queries) - 1])
+
+    monkeypatch.setattr(dynamo, "iter_dynamo_by_category", query)
+    path = str(tmp_path / "dedup.sqlite")
+
+    index = dedup.DedupIndex(utils.standardize_url, store=dedup.DedupStore(path))
+    utils.load_category_into_index(index, category="pharma")
+    assert index.has_url("https://a.com/x")
+    # Entries older than the window are pruned from the store.
+    assert not index.has_url("https://a.com/old")
+
+    index = dedup.DedupIndex(utils.standardize_url, store=dedup.DedupStore(path))
+    utils.load_category_into_index(index, category="pharma")
+    # Re-queried from DEDUP_SYNC_LAG before the watermark.
+    assert queries[1] == "2998-12-31T23:00:00.000Z"
+    assert index.has_url("https://a.com/x") and index.has_url("https://a.com/y")
+    assert index.has_title("Y")
+
+
+def test_store_claims_each_digest_once_per_run(tmp_path):
+    path = str(tmp_path / "dedup.sqlite")
+    first, second = dedup.DedupStore(path), dedup.DedupStore(path)
+    assert first.claim("run", [b"a", b"b"]) == {b"a", b"b"}
+    assert second.claim("run", [b"b", b"c"]) == {b"c"}
+    assert second.claim("next", [b"a"]) == {b"a"}
+    first.clear_claims(keep_run="next")
+    assert first.claim("run", [b"a"]) == {b"a"}
+    assert first.claim("next", [b"a"]) == set()
+
+
+def test_dedup_store_is_emptied_when_url_canonicalization_changes(tmp_path):
+    path = str(tmp_path / "dedup.sqlite")
+    store = dedup.DedupStore(path, version="v1")
+    store.merge("table", "pharma", 1, [("url", b"d", "2999-01-01")], "2999-01-01")
+    store.close()
+
+    store = dedup.DedupStore(path, version="v1")
+    assert store.watermark("table", "pharma", 1) == "2999-01-01"
+    store.close()
+
+    store = dedup.DedupStore(path, version="v2")
+    assert store.watermark("table", "pharma", 1) is None
+    assert store.entries("table", "pharma", 1) == []
+    store.close()
+
+
+def test_dedup_store_keeps_entries_per_period(tmp_path):
+    store = dedup.DedupStore(str(tmp_path / "dedup.sqlite"))
+    entry = [("url", b"d", "2020-01-01")]
+    store.merge("table", "pharma", 1, entry, "2020-01-01")
+    store.merge("table", "pharma", 7, entry, "2020-01-01")
+    # A spider with a one-day window prunes only its own entries.
+    store.prune("table", "pharma", 1, "2020-01-02")
+    assert store.entries("table", "pharma", 1) == []
+    assert store.entries("table", "pharma", 7) == [("url", b"d")]
+    assert store.watermark("table", "pharma", 7) == "2020-01-01"
+
+
+def test_near_duplicate_titles_come_from_the_store_sync(tmp_path, monkeypatch):
+    from hunt_knowledge.neardup import NearDuplicateIndex
+
+    queries = []
+
+    def query(period, table_name, category, fields=None, since=None):
+        queries.append(fields)
+        return iter([{"url": "https://a.com/x", "title": "X", "createdAt": "2999"}])
+
+    monkeypatch.setattr(dynamo, "iter_dynamo_by_category", query)
+    path = str(tmp_path / "dedup.sqlite")
+    index = dedup.DedupIndex(utils.standardize_url, store=dedup.DedupStore(path))
+    near_duplicates = NearDuplicateIndex(min_words=1)
+    utils.load_titles_into_near_duplicate_index(
+        near_duplicates, category="pharma", dedup_index=index
+    )
+    utils.load_category_into_index(index, category="pharma")
+
+    # One sync served both indexes.
+    assert queries == [["url", "title", "createdAt"]]
+    assert len(near_duplicates) == 1
+    assert index.has_url("https://a.com/x") and index.has_title("X")
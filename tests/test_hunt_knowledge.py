@@ -2,6 +2,8 @@
 
 """Tests for `hunt_knowledge` package."""
 
+import contextlib
+
 import pytest
 
 from click.testing import CliRunner
@@ -34,3 +36,136 @@ def test_command_line_interface():
     help_result = runner.invoke(cli.main, ["--help"])
     assert help_result.exit_code == 0
     assert "--help  Show this message and exit." in help_result.output
+
+
+def test_downloader_middleware_renders_flagged_requests(monkeypatch):
+    """Only requests flagged with meta["render"] are rendered."""
+    from scrapy import Request
+    from scrapy.settings import Settings
+
+    from hunt_knowledge import middlewares
+
+    class Driver:
+        current_url = "https://a.com/"
+        page_source = "<html><body><a href='/x'>x</a></body></html>"
+
+        def get(self, url):
+            pass
+
+    class Pool:
+        @contextlib.contextmanager
+        def driver(self):
+            yield Driver()
+
+    monkeypatch.setattr(middlewares.utils, "get_webdriver_pool", lambda s: Pool())
+    mw = middlewares.HuntKnowledgeDownloaderMiddleware(Settings())
+    response = mw.render(Request("https://a.com/", meta={"render": True}))
+    assert "rendered" in response.flags
+    assert response.xpath("//a/@href").getall() == ["/x"]
+
+
+def test_unchanged_page_middleware_flags_identical_pages(tmp_path, monkeypatch):
+    from types import SimpleNamespace
+
+    from scrapy import Request
+    from scrapy.http import HtmlResponse
+    from scrapy.settings import Settings
+    from scrapy.statscollectors import MemoryStatsCollector
+
+    from hunt_knowledge import middlewares, utils
+
+    monkeypatch.setattr(utils, "_page_hash_store", None)
+    settings = Settings(
+        {"SKIP_UNCHANGED_PAGES": True, "PAGE_HASH_PATH": str(tmp_path / "p.sqlite")}
+    )
+    spider = SimpleNamespace(
+        crawler=SimpleNamespace(
+            stats=MemoryStatsCollector(SimpleNamespace(settings=settings))
+        )
+    )
+    mw = middlewares.UnchangedPageMiddleware(settings)
+
+    def fetch(body):
+        request = Request("https://a.com/", meta={"skip_unchanged": True})
+        response = HtmlResponse(request.url, body=body, request=request)
+        return mw.process_response(request, response, spider)
+
+    first = fetch(b"<html>a</html>")
+    assert not utils.is_page_unchanged(first)
+    # Not skipped until the spider marks the page as processed.
+    assert not utils.is_page_unchanged(fetch(b"<html>a</html>"))
+    utils.mark_page_processed(first, settings)
+    assert utils.is_page_unchanged(fetch(b"<html>a</html>"))
+    assert not utils.is_page_unchanged(fetch(b"<html>b</html>"))
+
+
+def test_revalidating_policy_sends_validators():
+    from scrapy import Request
+    from scrapy.http import Response
+    from scrapy.settings import Settings
+
+    from hunt_knowledge.httpcache import RevalidatingPolicy
+
+    policy = RevalidatingPolicy(Settings())
+    cached = Response(
+        "https://a.com/",
+        headers={"ETag": '"abc"', "Cache-Control": "max-age=3600"},
+    )
+    request = Request("https://a.com/")
+    assert not policy.is_cached_response_fresh(cached, request)
+    assert request.headers[b"If-None-Match"] == b'"abc"'
+
+
+def test_crawl_all_runs_spiders_in_one_process(monkeypatch):
+    from scrapy.crawler import Crawler
+    from scrapy.spiderloader import SpiderLoader
+
+    monkeypatch.setenv("SCRAPY_SETTINGS_MODULE", "hunt_knowledge.settings")
+    processes = []
+
+    class Process:
+        def __init__(self, settings):
+            settings.set("SPIDER_CONCURRENT_REQUESTS", {"ft": 2})
+            self.settings = settings
+            self.spider_loader = SpiderLoader.from_settings(settings)
+            self.crawlers = []
+            self.started = False
+            processes.append(self)
+
+        def create_crawler(self, name):
+            return Crawler(self.spider_loader.load(name), self.settings)
+
+        def crawl(self, crawler):
+            self.crawlers.append(crawler)
+
+        def start(self):
+            self.started = True
+
+    monkeypatch.setattr(cli, "CrawlerProcess", Process)
+    runner = CliRunner()
+    result = runner.invoke(
+        cli.main, ["crawl-all", "-c", "5", "ft", "jpost-middle-east"]
+    )
+    assert result.exit_code == 0, result.output
+    (process,) = processes
+    assert process.started
+    caps = {
+        c.spidercls.name: c.settings.getint("CONCURRENT_REQUESTS")
+        for c in process.crawlers
+    }
+    assert caps == {"ft": 2, "jpost-middle-east": 5}
+
+    # By default, every news spider, but not the stubs.
+    result = runner.invoke(cli.main, ["crawl-all"])
+    assert result.exit_code == 0, result.output
+    names = {c.spidercls.name for c in processes[-1].crawlers}
+    assert names == {
+        "ft",
+        "fiercebiotech",
+        "jpost-middle-east",
+        "pharmaceuticaltechnology",
+    }
+
+    result = runner.invoke(cli.main, ["crawl-all", "nope"])
+    assert result.exit_code != 0
+    assert "unknown spiders nope" in result.output
@@ -0,0 +1,38 @@
+"""Import-time budget: loading the project must not pull in the backends."""
+
+import json
+import os
+import subprocess
+import sys
+
+# Seconds allowed to import every project module in a fresh interpreter.
+IMPORT_BUDGET = float(os.environ.get("HUNT_KNOWLEDGE_IMPORT_BUDGET", "2.0"))
+
+COLD_START = """
+import json, sys, time
+started = time.perf_counter()
+import hunt_knowledge.settings
+import hunt_knowledge.extensions
+import hunt_knowledge.middlewares
+import hunt_knowledge.pipelines
+from scrapy.spiderloader import SpiderLoader
+from scrapy.settings import Settings
+loader = SpiderLoader.from_settings(Settings({"SPIDER_MODULES": ["hunt_knowledge.spiders"]}))
+spiders = loader.list()
+elapsed = time.perf_counter() - started
+heavy = [m for m in ("selenium", "boto3", "botocore", "requests", "numpy") if m in sys.modules]
+print(json.dumps({"elapsed": elapsed, "heavy": heavy, "spiders": spiders}))
+"""
+
+
+def test_cold_start_does_not_import_backends():
+    output = subprocess.run(
+        [sys.executable, "-c", COLD_START],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    assert "ft" in result["spiders"]
+    assert result["heavy"] == []
+    assert result["elapsed"] < IMPORT_BUDGET, result
@@ -0,0 +1,28 @@
+from hunt_knowledge.journal import ItemJournal
+
+
+def test_item_journal_tracks_pending_items(tmp_path):
+    journal = ItemJournal(str(tmp_path / "items.sqlite"))
+    journal.record(
+        "ft",
+        [
+            {"url": "https://www.ft.com/content/a", "title": "A"},
+            {"url": "https://www.ft.com/content/b", "title": "B"},
+        ],
+    )
+    journal.record("jpost", [{"url": "https://www.jpost.com/x", "title": "X"}])
+    journal.mark_written(["https://ft.com/content/a?utm_source=x"])
+
+    assert [item["title"] for item in journal.pending("ft")] == ["B"]
+    assert journal.keys() == {
+        "https://ft.com/content/a",
+        "https://ft.com/content/b",
+        "https://jpost.com/x",
+    }
+    journal.close()
+
+    # Survives a restart.
+    journal = ItemJournal(str(tmp_path / "items.sqlite"))
+    assert [item["title"] for item in journal.pending("ft")] == ["B"]
+    journal.prune(before=float("inf"))
+    assert journal.keys() == {"https://ft.com/content/b", "https://jpost.com/x"}
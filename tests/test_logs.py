@@ -0,0 +1,47 @@
+import json
+import logging
+
+from scrapy.settings import Settings
+
+from hunt_knowledge import logs
+
+
+def test_preview_is_bounded():
+    urls = [f"https://a.com/{i}" for i in range(100)]
+    assert str(logs.Preview(urls, limit=2)) == (
+        "100 items: ['https://a.com/0', 'https://a.com/1', ...]"
+    )
+    assert str(logs.Preview([])) == "0 items: []"
+
+
+def test_json_lines_are_truncated_and_rotated(tmp_path, monkeypatch):
+    monkeypatch.setattr(logs, "_json_handler", None)
+    path = tmp_path / "logs" / "hunt_knowledge.jsonl"
+    settings = Settings(
+        {
+            "LOG_JSON_FILE": str(path),
+            "LOG_JSON_MAX_BYTES": 2000,
+            "LOG_JSON_BACKUP_COUNT": 1,
+            "LOG_JSON_MAX_MESSAGE": 50,
+        }
+    )
+    handler = logs.setup_json_logging(settings)
+    assert logs.setup_json_logging(settings) is handler
+    logger = logging.getLogger("hunt_knowledge.test")
+    logger.setLevel(logging.INFO)
+    try:
+        logger.info("Found %s", logs.Preview(range(10)), extra={"spider_name": "ft"})
+        logger.info("%s", "x" * 500)
+        first, second = [json.loads(line) for line in path.read_text().splitlines()]
+        for _ in range(40):
+            logger.info("%s", "y" * 100)
+    finally:
+        logging.getLogger("hunt_knowledge").removeHandler(handler)
+        handler.close()
+
+    assert first["message"] == "Found 10 items: [0, 1, 2, 3, 4, ...]"
+    assert first["spider_name"] == "ft"
+    assert first["logger"] == "hunt_knowledge.test"
+    assert second["message"] == "x" * 50 + "...(+450 chars)"
+    assert (tmp_path / "logs" / "hunt_knowledge.jsonl.1").exists()
+    assert path.stat().st_size <= 2000
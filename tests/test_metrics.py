@@ -0,0 +1,49 @@
+from scrapy.settings import Settings
+from scrapy.statscollectors import MemoryStatsCollector
+from twisted.internet import defer
+
+from hunt_knowledge import extensions, metrics
+
+
+def test_stage_metrics_histograms_and_stats():
+    stages = metrics.StageMetrics(buckets=(0.1, 1.0))
+    stages.observe(metrics.RENDER, 0.05, "ft", "pharma")
+    stages.observe(metrics.RENDER, 0.1, "ft", "pharma")
+    stages.observe(metrics.RENDER, 3.0, "ft", "pharma")
+    d = defer.Deferred()
+    stages.time_deferred(d, metrics.PIPELINE_REQUEST, "jpost", "armiger")
+    d.errback(ValueError())
+    d.addErrback(lambda failure: None)
+
+    text = stages.render()
+    labels = 'stage="render",spider="ft",category="pharma"'
+    assert f'hunt_knowledge_stage_seconds_bucket{{{labels},le="0.1"}} 2' in text
+    assert f'hunt_knowledge_stage_seconds_bucket{{{labels},le="1.0"}} 2' in text
+    assert f'hunt_knowledge_stage_seconds_bucket{{{labels},le="+Inf"}} 3' in text
+    assert f"hunt_knowledge_stage_seconds_count{{{labels}}} 3" in text
+    assert 'stage="pipeline_request",spider="jpost"' in text
+
+    stats = stages.spider_stats("ft")
+    assert stats["stages/render/count"] == 3
+    assert stats["stages/render/seconds_max"] == 3.0
+    assert "stages/pipeline_request/count" not in stats
+
+
+def test_metrics_extension_exports_stats_and_textfile(tmp_path, monkeypatch):
+    stages = metrics.StageMetrics()
+    monkeypatch.setattr(metrics, "_stage_metrics", stages)
+    path = tmp_path / "metrics" / "hunt_knowledge.prom"
+
+    class Crawler:
+        settings = Settings({"METRICS_TEXTFILE": str(path)})
+
+    class Spider:
+        name = "ft"
+
+    stats = MemoryStatsCollector(Crawler())
+    ext = extensions.MetricsExtension(Crawler.settings, stats)
+    stages.observe(metrics.DB_WRITE, 0.2, "ft", "pharma")
+    ext.spider_closed(Spider())
+
+    assert stats.get_value("stages/db_write/count") == 1
+    assert 'stage="db_write"' in path.read_text()
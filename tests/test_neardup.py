@@ -0,0 +1,69 @@
+import time
+
+import numpy as np
+
+from hunt_knowledge import neardup
+
+
+def test_minhash_estimates_jaccard_similarity():
+    hasher = neardup.MinHasher(num_perm=256)
+    a = neardup.normalize_text("Pfizer buys Seagen for $43bn in biggest biotech deal")
+    b = neardup.normalize_text(
+        "Pfizer buys Seagen for $43bn in biggest biotech deal yet"
+    )
+    c = neardup.normalize_text("Moderna cuts jobs as Covid vaccine sales slump")
+    signatures = hasher.signatures([a, b, c, ""])
+    assert signatures.shape == (4, 256)
+
+    def jaccard(x, y):
+        x, y = set(neardup.shingle_hashes(x)), set(neardup.shingle_hashes(y))
+        return len(x & y) / len(x | y)
+
+    estimate = np.mean(signatures[0] == signatures[1])
+    assert abs(estimate - jaccard(a, b)) < 0.1
+    assert np.mean(signatures[0] == signatures[2]) < 0.1
+    # Texts too short for a shingle never match anything.
+    assert not np.any(signatures[3] == signatures[0])
+
+
+def test_near_duplicate_index_drops_reposted_headlines():
+    index = neardup.NearDuplicateIndex(capacity=3)
+    index.load(("table", "pharma", 1), lambda: ["Pfizer buys Seagen for $43bn"])
+    index.load(("table", "pharma", 1), lambda: ["Loaded twice"])
+    assert len(index) == 1
+
+    headlines = {
+        "https://a.com/biotech/pfizer-seagen": "Pfizer buys Seagen for $43bn!",
+        "https://a.com/news/new-story": "Moderna cuts jobs as sales slump",
+        "https://a.com/research/new-story-2": "Moderna cuts jobs as sales slump",
+        "https://a.com/read-more": "Read more",
+        "https://a.com/other": "Read more",
+    }
+    assert list(index.filter_new(headlines, headlines)) == [
+        "https://a.com/news/new-story",
+        "https://a.com/read-more",
+        "https://a.com/other",
+    ]
+    # Yielded headlines aren't indexed until added, once summarized.
+    assert len(index) == 1
+    index.add(["Moderna cuts jobs as sales slump"])
+    assert (
+        list(index.filter_new(["y"], {"y": "Moderna cuts jobs as sales slump"})) == []
+    )
+
+    # The oldest headlines are evicted past capacity.
+    index.add(["Novartis spins off Sandoz", "Roche ends Alzheimer's drug trial"])
+    assert len(index) == 3
+    assert list(index.filter_new(["x"], {"x": "Pfizer buys Seagen for $43bn"})) == ["x"]
+
+
+def test_minhash_is_fast_enough_for_a_front_page_batch():
+    hasher = neardup.MinHasher()
+    texts = [
+        neardup.normalize_text(f"Headline number {i} about drug approval news")
+        for i in range(2000)
+    ]
+    started = time.perf_counter()
+    signatures = hasher.signatures(texts)
+    assert signatures.shape == (2000, 64)
+    assert time.perf_counter() - started < 2.0
@@ -0,0 +1,212 @@
+import pytest
+from scrapy.exceptions import DropItem
+from scrapy.settings import Settings
+from scrapy.statscollectors import MemoryStatsCollector
+
+from hunt_knowledge import pipelines
+from hunt_knowledge.items import Article
+
+
+class FakeClient:
+    def __init__(self, unprocessed_rounds=1):
+        self.calls = []
+        self.unprocessed_rounds = unprocessed_rounds
+
+    def batch_write_item(self, RequestItems):
+        self.calls.append(RequestItems)
+        requests = RequestItems["CuratedArticlesDB"]
+        if self.unprocessed_rounds and len(requests) > 1:
+            self.unprocessed_rounds -= 1
+            return {"UnprocessedItems": {"CuratedArticlesDB": requests[1:]}}
+        return {"UnprocessedItems": {}}
+
+
+class Crawler:
+    settings = Settings()
+
+
+def make_pipeline(client):
+    stats = MemoryStatsCollector(Crawler())
+    pipeline = pipelines.DynamoDBPipeline(
+        batch_size=25, flush_interval=0.01, backoff=0, stats=stats
+    )
+    pipeline.client = client
+    return pipeline, stats
+
+
+def test_dynamodb_pipeline_batches_and_retries_unprocessed():
+    class Spider:
+        name = "test"
+
+    client = FakeClient()
+    pipeline, stats = make_pipeline(client)
+    pipeline.open_spider(Spider())
+    for i in range(30):
+        pipeline.process_item({"id": str(i)}, Spider())
+    pipeline.queue.put(pipelines._STOP)
+    pipeline._finish()
+
+    sizes = [len(call["CuratedArticlesDB"]) for call in client.calls]
+    assert max(sizes) <= 25
+    assert stats.get_value("dynamodb/items_written") == 30
+    # The first batch's unprocessed items were retried.
+    assert sizes[1] == sizes[0] - 1
+
+
+def make_article(**kwargs):
+    fields = dict(
+        url="https://www.ft.com/content/abc",
+        category="finance",
+        title="Title",
+        source="ft.com",
+        absSum=["First sentence.", "Second sentence."],
+        text="Text",
+    )
+    fields.update(kwargs)
+    return Article(**fields)
+
+
+def test_invalid_articles_are_dropped():
+    class Spider:
+        name = "test"
+
+    pipeline, stats = make_pipeline(FakeClient())
+    assert pipeline.process_item(make_article(), Spider()) is not None
+    with pytest.raises(DropItem):
+        pipeline.process_item(make_article(url="/content/abc"), Spider())
+    with pytest.raises(DropItem):
+        pipeline.process_item(make_article(category=""), Spider())
+    # Articles the pipeline couldn't summarize are still stored.
+    assert pipeline.process_item(make_article(absSum=None), Spider()) is not None
+    assert stats.get_value("dynamodb/items_invalid") == 2
+    assert pipeline.queue.qsize() == 2
+
+
+def test_serializer_marshals_articles_and_caches_per_field():
+    serializer = pipelines.DynamoSerializer()
+    article = make_article(mercuryObj={"domain": "ft.com", "word_count": 3})
+    data = serializer.serialize(article)
+
+    assert data["__typename"] == {"S": "Article"}
+    assert data["subcategory"] == {"NULL": True}
+    assert data["absSum"] == {
+        "L": [{"S": "First sentence."}, {"S": "Second sentence."}]
+    }
+    assert data["mercuryObj"] == {
+        "M": {"domain": {"S": "ft.com"}, "word_count": {"N": "3"}}
+    }
+    assert "typename" not in data
+    cached = len(serializer._marshallers)
+    serializer.serialize(make_article(title="Other"))
+    assert len(serializer._marshallers) == cached
+
+
+def test_journal_replays_items_left_unwritten(tmp_path, monkeypatch):
+    from twisted.internet import defer
+
+    from hunt_knowledge.journal import ItemJournal
+
+    monkeypatch.setattr(
+        pipelines.threads,
+        "deferToThread",
+        lambda f, *args, **kwargs: defer.succeed(f(*args, **kwargs)),
+    )
+
+    class Spider:
+        name = "test"
+
+    class FailingClient:
+        def batch_write_item(self, RequestItems):
+            return {"UnprocessedItems": RequestItems}
+
+    journal = ItemJournal(str(tmp_path / "items.sqlite"))
+    pipeline, _ = make_pipeline(FailingClient())
+    pipeline.journal = journal
+    pipeline.max_retries = 0
+    pipeline.open_spider(Spider())
+    pipeline.process_item(make_article(), Spider())
+    pipeline.queue.put(pipelines._STOP)
+    pipeline._finish()
+    assert [item["url"] for item in journal.pending("test")] == [make_article().url]
+
+    # The next run writes it without the spider yielding it again.
+    client = FakeClient()
+    pipeline, stats = make_pipeline(client)
+    pipeline.journal = journal
+    pipeline.open_spider(Spider())
+    pipeline.queue.put(pipelines._STOP)
+    pipeline._finish()
+    assert stats.get_value("journal/items_replayed") == 1
+    assert stats.get_value("dynamodb/items_written") == 1
+    assert client.calls[0]["CuratedArticlesDB"][0]["PutRequest"]["Item"]["url"] == {
+        "S": make_article().url
+    }
+    assert journal.pending("test") == []
+
+
+def test_unwritable_items_are_dropped_without_stopping_the_writer():
+    class Spider:
+        name = "test"
+
+    class ValidationError(Exception):
+        response = {"Error": {"Code": "ValidationException"}}
+
+    class RejectingClient(FakeClient):
+        def batch_write_item(self, RequestItems):
+            self.calls.append(RequestItems)
+            for request in RequestItems["CuratedArticlesDB"]:
+                if request["PutRequest"]["Item"]["title"] == {"S": "Too large"}:
+                    raise ValidationError("Item size has exceeded the maximum")
+            return {"UnprocessedItems": {}}
+
+    client = RejectingClient()
+    pipeline, stats = make_pipeline(client)
+    pipeline.open_spider(Spider())
+    # TypeSerializer rejects floats.
+    pipeline.process_item(make_article(mercuryObj={"score": 0.5}), Spider())
+    pipeline.process_item(make_article(title="Too large"), Spider())
+    pipeline.process_item(make_article(title="Fine"), Spider())
+    pipeline.queue.put(pipelines._STOP)
+    pipeline._finish()
+
+    assert stats.get_value("dynamodb/items_dropped") == 2
+    assert stats.get_value("dynamodb/items_written") == 1
+    # The rejected batch was split instead of retried.
+    assert [len(call["CuratedArticlesDB"]) for call in client.calls] == [2, 1, 1]
+
+
+def test_journal_records_in_batches_before_queueing(monkeypatch):
+    from twisted.internet import defer
+
+    class Spider:
+        name = "test"
+
+    class Journal:
+        def __init__(self):
+            self.batches = []
+
+        def record(self, spider, items):
+            self.batches.append([item["title"] for item in items])
+
+    recording = []
+
+    def defer_to_thread(f, *args):
+        d = defer.Deferred()
+        recording.append((d, f, args))
+        return d
+
+    monkeypatch.setattr(pipelines.threads, "deferToThread", defer_to_thread)
+    pipeline, _ = make_pipeline(FakeClient())
+    pipeline.journal = Journal()
+    results = [
+        pipeline.process_item(make_article(title=title), Spider())
+        for title in ("A", "B", "C")
+    ]
+    # B and C wait for A's transaction, then go in one.
+    assert pipeline.queue.qsize() == 0
+    while recording:
+        d, f, args = recording.pop(0)
+        d.callback(f(*args))
+    assert pipeline.journal.batches == [["A"], ["B", "C"]]
+    assert pipeline.queue.qsize() == 3
+    assert all(result.called for result in results)
@@ -0,0 +1,64 @@
+from datetime import date
+
+from scrapy.settings import Settings
+
+from hunt_knowledge import priority
+from hunt_knowledge.priority import Link
+
+
+def test_url_date_reads_common_date_hints():
+    assert priority.url_date("https://a.com/2023/05/17/story") == date(2023, 5, 17)
+    assert priority.url_date("https://a.com/story-2023-05-17") == date(2023, 5, 17)
+    assert priority.url_date("https://a.com/20230517/story") == date(2023, 5, 17)
+    assert priority.url_date("https://a.com/2023/05/story") == date(2023, 5, 1)
+    assert priority.url_date("https://a.com/2023/13/45/story") is None
+    assert priority.url_date("https://a.com/article/1234567890") is None
+
+
+def test_link_ranker_prefers_prominent_early_fresh_links():
+    ranker = priority.LinkRanker()
+    today = date(2023, 5, 17)
+    links = {
+        "https://a.com/grid": Link("https://a.com/grid", "", "page article-grid", 0),
+        "https://a.com/feature": Link(
+            "https://a.com/feature", "", "page main-feature", 5
+        ),
+        "https://a.com/2023/04/10/old": Link(
+            "https://a.com/2023/04/10/old", "", "page main-feature", 1
+        ),
+        "https://a.com/late": Link("https://a.com/late", "", "page article-grid", 40),
+    }
+    ranked = [url for url, _ in ranker.rank(links, links, today)]
+    assert ranked == [
+        "https://a.com/feature",
+        "https://a.com/grid",
+        "https://a.com/late",
+        "https://a.com/2023/04/10/old",
+    ]
+    # Unknown links come after the known ones of the same section.
+    ranked = ranker.rank(["https://a.com/unknown", "https://a.com/grid"], links, today)
+    assert [url for url, _ in ranked] == ["https://a.com/grid", "https://a.com/unknown"]
+
+
+def test_summary_budget_caps_run_and_sources():
+    budget = priority.SummaryBudget(
+        run_budget=10, source_budget=4, source_budgets={"ft": 8}
+    )
+    assert budget.remaining("jpost") == 4
+    budget.spend("jpost", 4)
+    assert budget.remaining("jpost") == 0
+    assert budget.remaining("ft") == 6
+    budget.refund("jpost", 1)
+    assert budget.remaining("jpost") == 1
+    assert priority.SummaryBudget().remaining("ft") is None
+
+
+def test_get_summary_budget_reads_settings(monkeypatch):
+    monkeypatch.setattr(priority, "_summary_budget", None)
+    settings = Settings(
+        {"SUMMARY_RUN_BUDGET": "5", "SUMMARY_SOURCE_BUDGETS": {"ft": 2}}
+    )
+    budget = priority.get_summary_budget(settings)
+    assert budget.remaining("ft") == 2
+    assert budget.remaining("jpost") == 5
+    assert priority.get_summary_budget() is budget
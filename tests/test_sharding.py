@@ -0,0 +1,81 @@
+import os
+from datetime import datetime
+
+from hunt_knowledge import sharding
+
+
+def test_plan_jobs_spreads_spiders_and_start_urls():
+    assert sharding.plan_jobs(["a", "b", "c"], 2) == [
+        [("a", {}), ("c", {})],
+        [("b", {})],
+    ]
+    assert sharding.plan_jobs(["a"], 4) == [[("a", {})]]
+
+    shards = sharding.plan_jobs(["a", "b"], 2, split_start_urls=True, shardable={"a"})
+    assert shards == [
+        [("a", {"shard": 0, "shards": 2}), ("b", {})],
+        [("a", {"shard": 1, "shards": 2})],
+    ]
+    assert [sharding.job_label(job) for job in shards[0]] == ["a[0/2]", "b"]
+
+
+def test_aggregate_stats():
+    stats = [
+        {
+            "start_time": datetime(2020, 6, 1, 10, 0, 0),
+            "finish_time": datetime(2020, 6, 1, 10, 1, 0),
+            "item_scraped_count": 3,
+            "dynamodb/batch_latency_ms_max": 40.0,
+            "finish_reason": "finished",
+        },
+        {
+            "start_time": datetime(2020, 6, 1, 10, 0, 30),
+            "finish_time": datetime(2020, 6, 1, 10, 2, 0),
+            "item_scraped_count": 4,
+            "dynamodb/batch_latency_ms_max": 25.0,
+            "finish_reason": "finished",
+        },
+    ]
+    total = sharding.aggregate_stats(stats)
+    assert total["item_scraped_count"] == 7
+    assert total["dynamodb/batch_latency_ms_max"] == 40.0
+    assert total["elapsed_time_seconds"] == 120.0
+    assert total["finish_reason"] == "finished"
+
+
+def test_budget_shares_split_budgets_between_workers():
+    from scrapy.settings import Settings
+
+    settings = Settings(
+        {
+            "SUMMARY_RUN_BUDGET": 10,
+            "SUMMARY_SOURCE_BUDGET": None,
+            "SUMMARY_SOURCE_BUDGETS": {"ft": 5},
+        }
+    )
+    # The workers' shares add up to the budget.
+    assert sharding.budget_shares(settings, 4) == [
+        {"SUMMARY_RUN_BUDGET": 3},
+        {"SUMMARY_RUN_BUDGET": 3},
+        {"SUMMARY_RUN_BUDGET": 2},
+        {"SUMMARY_RUN_BUDGET": 2},
+    ]
+    assert sharding.budget_shares(settings, 2, split_start_urls=True) == [
+        {
+            "SUMMARY_RUN_BUDGET": 5,
+            "SUMMARY_SOURCE_BUDGET": None,
+            "SUMMARY_SOURCE_BUDGETS": {"ft": 3},
+        },
+        {
+            "SUMMARY_RUN_BUDGET": 5,
+            "SUMMARY_SOURCE_BUDGET": None,
+            "SUMMARY_SOURCE_BUDGETS": {"ft": 2},
+        },
+    ]
+
+
+def test_job_dir_is_unique_per_spider_and_shard():
+    assert sharding.job_dir("jobs", ("ft", {})) == os.path.join("jobs", "ft")
+    assert sharding.job_dir("jobs", ("ft", {"shard": 1, "shards": 2})) == (
+        os.path.join("jobs", "ft-1-of-2")
+    )
@@ -0,0 +1,163 @@
+import asyncio
+
+from scrapy.http import HtmlResponse
+from scrapy.settings import Settings
+from twisted.internet import defer
+
+from hunt_knowledge import utils
+from hunt_knowledge.spiders import NewsSpider
+
+LANDING_PAGE = b"""
+<html><body>
+  <a href="/biotech/a">a</a>
+  <a href="/biotech/b/">b</a>
+  <a href="/biotech/b">b again</a>
+  <a href="/research/c">c</a>
+  <a href="/about">about</a>
+  <a href="/biotech/old">already stored</a>
+</body></html>
+"""
+
+
+class Spider(NewsSpider):
+    name = "test"
+    db_category = "pharma"
+    categories = ["biotech", "research"]
+    category_match = "path"
+
+
+def test_news_spider_streams_items_as_summaries_complete(monkeypatch):
+    processed = []
+    monkeypatch.setattr(
+        utils, "mark_page_processed", lambda response, s: processed.append(response)
+    )
+    spider = Spider()
+    spider.settings = Settings()
+    requested = []
+    # Summaries finish in reverse order, and one of them fails.
+    outcomes = {
+        "https://site.com/biotech/a": (0.03, "a"),
+        "https://site.com/biotech/b": (0.02, ValueError("boom")),
+        "https://site.com/research/c": (0.01, "c"),
+    }
+
+    def summarize(url, priority=0):
+        requested.append(url)
+        delay, outcome = outcomes[url]
+        d = defer.Deferred()
+        fire = d.errback if isinstance(outcome, Exception) else d.callback
+        asyncio.get_running_loop().call_later(delay, fire, outcome)
+        return d
+
+    spider.url_filter = lambda: defer.succeed(lambda url: not url.endswith("/old"))
+    spider.summarize = summarize
+    response = HtmlResponse("https://site.com/", body=LANDING_PAGE)
+
+    async def crawl():
+        return [item async for item in spider.parse(response)]
+
+    assert asyncio.run(crawl()) == ["c", "a"]
+    assert sorted(requested) == sorted(outcomes)
+    # The failed summary is retried next run.
+    assert processed == []
+    assert spider.subcategory("https://site.com/research/c") == "research"
+
+
+def test_news_spider_caps_articles_per_page():
+    spider = Spider(max_articles="2")
+    assert spider.max_articles == 2
+    urls = ["https://site.com/biotech/%d" % i for i in range(5)]
+    assert list(spider.dedup(lambda url: True, urls)) == urls[:2]
+
+
+def test_news_spider_crawls_its_shard_of_start_urls():
+    class Sharded(Spider):
+        start_urls = ["https://site.com/%d" % i for i in range(5)]
+
+    spider = Sharded(shard="1", shards="2")
+    urls = [request.url for request in spider.start_requests()]
+    assert urls == ["https://site.com/1", "https://site.com/3"]
+
+
+def test_news_spider_drops_near_duplicate_headlines(monkeypatch):
+    from hunt_knowledge import neardup
+    from hunt_knowledge.spiders import base
+
+    monkeypatch.setattr(
+        utils,
+        "load_titles_into_near_duplicate_index",
+        lambda index, **kwargs: index.add(["Drug maker recalls batches of pills"]),
+        raising=False,
+    )
+    monkeypatch.setattr(neardup, "_near_duplicate_index", None)
+    monkeypatch.setattr(
+        base.threads,
+        "deferToThread",
+        lambda f, *args, **kwargs: defer.succeed(f(*args, **kwargs)),
+    )
+    page = b"""
+    <a href="/biotech/recall">Drug maker recalls batches of pills</a>
+    <a href="/biotech/trial"><img src="t.png"></a>
+    <a href="/biotech/trial">New trial results for cancer drug</a>
+    <a href="/research/trial-results">New trial results for cancer drug</a>
+    <a href="/research/other">Another story about something else</a>
+    """
+    spider = Spider()
+    spider.settings = Settings({"NEAR_DEDUP_ENABLED": True})
+    response = HtmlResponse("https://site.com/", body=page)
+    index = spider.near_duplicates()
+    assert spider.links(response)["https://site.com/biotech/trial"].text == (
+        "New trial results for cancer drug"
+    )
+    headlines = {url: link.text for url, link in spider.links(response).items()}
+
+    urls = list(spider.normalize(response, spider.extract_links(response)))
+    kept = []
+    index.addCallback(
+        lambda index: kept.extend(
+            spider.dedup(lambda url: True, urls, index, headlines)
+        )
+    )
+    assert kept == ["https://site.com/biotech/trial", "https://site.com/research/other"]
+
+
+def test_news_spider_summarizes_most_important_links_within_budget(monkeypatch):
+    from hunt_knowledge import priority
+
+    monkeypatch.setattr(utils, "mark_page_processed", lambda response, s: None)
+    monkeypatch.setattr(
+        priority, "_summary_budget", priority.SummaryBudget(source_budgets={"test": 3})
+    )
+    page = b"""
+    <div class="article-grid">
+      <a href="/biotech/2001-01-01-ancient">Old story</a>
+      <a href="/biotech/grid-1">Grid story</a>
+    </div>
+    <div class="most-read"><a href="/research/popular">Popular story</a></div>
+    <div class="main-feature"><a href="/biotech/feature">Feature story</a></div>
+    <footer><a href="/research/footer">Footer story</a></footer>
+    """
+    spider = Spider()
+    spider.settings = Settings()
+    spider.url_filter = lambda: defer.succeed(lambda url: True)
+    requested = []
+
+    def summarize(url, priority=0):
+        requested.append((url, priority))
+        return defer.succeed(url)
+
+    spider.summarize = summarize
+    response = HtmlResponse("https://site.com/", body=page)
+
+    async def crawl():
+        return [item async for item in spider.parse(response)]
+
+    assert asyncio.run(crawl()) == [
+        "https://site.com/biotech/feature",
+        "https://site.com/research/popular",
+        "https://site.com/biotech/grid-1",
+    ]
+    priorities = [p for _, p in requested]
+    assert priorities == sorted(priorities, reverse=True)
+    # The budget is spent: the next page summarizes nothing.
+    assert asyncio.run(crawl()) == []
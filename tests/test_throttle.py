@@ -0,0 +1,48 @@
+import time
+
+from hunt_knowledge.throttle import AimdController, TokenBucket
+
+
+def test_aimd_grows_one_per_window_under_target_latency():
+    controller = AimdController(initial=2, max_concurrency=4, target_latency=1)
+    for _ in range(2):
+        controller.observe(time.monotonic(), 0.1)
+    assert controller.concurrency == 2
+    assert round(controller.limit, 2) == 2.9
+    for _ in range(20):
+        controller.observe(time.monotonic(), 0.1)
+    assert controller.concurrency == 4
+
+
+def test_aimd_shrinks_over_target_latency():
+    controller = AimdController(initial=4, max_concurrency=4, target_latency=1)
+    for _ in range(3):
+        controller.observe(time.monotonic(), 5)
+    assert controller.concurrency == 3
+    controller.observe(time.monotonic(), 5)
+    assert controller.concurrency == 2
+
+
+def test_aimd_halves_once_per_window_when_overloaded():
+    controller = AimdController(initial=8, max_concurrency=8)
+    started = time.monotonic()
+    # Requests in flight together all fail, but only halve the limit once.
+    for _ in range(4):
+        controller.observe(started, 1, overloaded=True)
+    assert controller.concurrency == 4
+    controller.observe(time.monotonic(), 1, overloaded=True)
+    assert controller.concurrency == 2
+    for _ in range(3):
+        controller.observe(time.monotonic(), 1, overloaded=True)
+    assert controller.concurrency == 1
+
+
+def test_token_bucket_paces_after_burst():
+    now = [0.0]
+    bucket = TokenBucket(rate=2, burst=2, now=lambda: now[0])
+    assert bucket.take() == 0
+    assert bucket.take() == 0
+    assert bucket.take() == 0.5
+    now[0] = 0.5
+    assert bucket.take() == 0
+    assert bucket.take() == 0.5
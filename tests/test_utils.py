@@ -1,5 +1,10 @@
-from hunt_knowledge import utils
+import json
+
+from scrapy.settings import Settings
+from twisted.internet import defer
 
+from hunt_knowledge import utils
+from hunt_knowledge.backends import pipeline
 
 # def test_query_dynamodb_by_category():
 #     response = utils.query_dynamo_by_category(
@@ -10,3 +15,305 @@ from hunt_knowledge import utils
 #         period=1, table_name="CuratedArticlesDB", category="hacker_news"
 #     )
 #     assert isinstance(response_2["Items"], list)
+
+
+def test_iter_dynamo_by_category_pages_with_projection():
+    class Table:
+        def __init__(self):
+            self.calls = []
+
+        def query(self, **kwargs):
+            self.calls.append(kwargs)
+            if "ExclusiveStartKey" not in kwargs:
+                return {"Items": [{"url": "a"}], "LastEvaluatedKey": {"id": "1"}}
+            return {"Items": [{"url": "b"}]}
+
+    table = Table()
+    items = list(utils.iter_dynamo_by_category(fields=["url"], table=table))
+    assert items == [{"url": "a"}, {"url": "b"}]
+    assert table.calls[0]["ProjectionExpression"] == "#f0"
+    assert table.calls[0]["ExpressionAttributeNames"] == {"#f0": "url"}
+    assert table.calls[1]["ExclusiveStartKey"] == {"id": "1"}
+
+
+def test_gather_successes_drops_failures():
+    deferreds = [defer.succeed(1), defer.fail(ValueError("boom")), defer.succeed(3)]
+    results = []
+    utils.gather_successes(deferreds, ["a", "b", "c"]).addCallback(results.extend)
+    assert results == [1, 3]
+
+
+def test_pipeline_client_retries_and_reuses_connection():
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    calls = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            calls.append((body["url"], self.client_address))
+            status = 503 if len(calls) == 1 else 200
+            payload = json.dumps({"url": body["url"]}).encode()
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        client = utils.PipelineClient(
+            api=f"http://127.0.0.1:{server.server_port}/",
+            backoff_factor=0,
+            read_timeout=5,
+        )
+        assert client.send("https://a.com/x") == {"url": "https://a.com/x"}
+        assert client.send("https://a.com/y") == {"url": "https://a.com/y"}
+        assert len(calls) == 3
+        # The retry and the second request reuse the first connection.
+        assert len({address for _, address in calls}) == 1
+    finally:
+        server.shutdown()
+
+
+def test_pipeline_client_does_not_retry_read_timeouts():
+    client = utils.PipelineClient(retries=3)
+    retry = client.session.get_adapter(client.api).max_retries
+    assert retry.total == 3
+    assert retry.read == 0
+
+
+def test_pipeline_client_respects_max_in_flight(monkeypatch):
+    running = []
+    peak = []
+
+    def fake_defer_to_thread(f, url):
+        d = defer.Deferred()
+        running.append(d)
+        peak.append(len(running))
+        return d
+
+    monkeypatch.setattr(pipeline.threads, "deferToThread", fake_defer_to_thread)
+    client = utils.PipelineClient(max_in_flight=2)
+    results = [client.request(f"https://a.com/{i}") for i in range(5)]
+    assert len(running) == 2
+
+    while running:
+        running.pop(0).callback({})
+    assert max(peak) == 2
+    assert all(d.called for d in results)
+
+
+def test_pipeline_client_serves_higher_priorities_first(monkeypatch):
+    running = []
+
+    def fake_defer_to_thread(f, url):
+        d = defer.Deferred()
+        running.append((url, d))
+        return d
+
+    monkeypatch.setattr(pipeline.threads, "deferToThread", fake_defer_to_thread)
+    client = utils.PipelineClient(max_in_flight=1)
+    for url, priority in [("first", 0), ("low", 1), ("high", 5), ("low-2", 1)]:
+        client.request(url, priority)
+
+    order = []
+    while running:
+        url, d = running.pop(0)
+        order.append(url)
+        d.callback({})
+    assert order == ["first", "high", "low", "low-2"]
+    assert client._semaphore.tokens == 1
+
+
+def test_pipeline_client_throttle_limits_in_flight(monkeypatch):
+    running = []
+
+    def fake_defer_to_thread(f, url):
+        d = defer.Deferred()
+        running.append(d)
+        return d
+
+    monkeypatch.setattr(pipeline.threads, "deferToThread", fake_defer_to_thread)
+    client = utils.PipelineClient(max_in_flight=4, throttle=True, throttle_start=2)
+    for i in range(6):
+        client.request(f"https://a.com/{i}")
+    assert len(running) == 2
+
+    # An overloaded API halves the limit: one request is let through when
+    # both in flight are done.
+    client.throttle.observe(0, 1, overloaded=True)
+    running.pop(0).callback({})
+    assert len(running) == 1
+    running.pop(0).callback({})
+    assert len(running) == 1
+    assert client._semaphore.limit == 1
+
+
+def test_pipeline_client_reports_retried_errors_to_throttle():
+    from tests.benchmarks.stubs import StubPipelineServer
+
+    with StubPipelineServer(statuses=[503]) as server:
+        client = utils.PipelineClient(
+            api=server.url, backoff_factor=0, throttle=True, throttle_start=4
+        )
+        client.send("https://a.com/x")
+        # The retried 503 halved the limit, though the request succeeded.
+        assert client.throttle.concurrency == 2
+        client.send("https://a.com/y")
+        assert client.throttle.limit > 2
+
+
+def test_batch_urls_splits_by_count_and_bytes():
+    urls = [f"https://a.com/{i}" for i in range(5)]
+    assert list(utils.batch_urls(urls, 2, 10**6)) == [urls[:2], urls[2:4], urls[4:]]
+    two_urls = len(json.dumps(utils.batch_payload(urls[:2])))
+    assert list(utils.batch_urls(urls, 10, two_urls)) == [
+        urls[:2],
+        urls[2:4],
+        urls[4:],
+    ]
+    # A URL too long for the byte limit is sent alone.
+    assert list(utils.batch_urls(urls[:2], 10, 0)) == [urls[:1], urls[1:2]]
+    assert list(utils.batch_urls([], 2, 10**6)) == []
+
+
+def test_pipeline_client_send_many_splits_results_per_url():
+    from tests.benchmarks.stubs import StubPipelineServer
+
+    failing = "https://a.com/2"
+    with StubPipelineServer(failing=[failing]) as server:
+        client = utils.PipelineClient(
+            api=server.url, batch_api=server.batch_url, batch_size=2, read_timeout=5
+        )
+        urls = [f"https://a.com/{i}" for i in range(5)]
+        results = client.send_many(urls)
+        client.close()
+
+    assert server.batches == [2, 2, 1]
+    assert isinstance(results[failing], utils.PipelineItemError)
+    for url in set(urls) - {failing}:
+        assert results[url]["metadata"]["url"] == url
+
+
+def test_pipeline_client_batches_requests(monkeypatch):
+    from twisted.internet.task import Clock
+
+    sent = []
+
+    def fake_defer_to_thread(f, urls):
+        sent.append(urls)
+        return defer.succeed(
+            [
+                (
+                    {"url": url}
+                    if url != "https://a.com/1"
+                    else utils.PipelineItemError(url)
+                )
+                for url in urls
+            ]
+        )
+
+    monkeypatch.setattr(pipeline.threads, "deferToThread", fake_defer_to_thread)
+    client = utils.PipelineClient(batch_api="http://stub/batch", batch_size=3)
+    client.clock = Clock()
+    results, failures = [], []
+    for i in range(4):
+        d = client.request(f"https://a.com/{i}")
+        d.addCallbacks(results.append, failures.append)
+
+    # A full batch is sent at once, the rest when the batch wait expires.
+    assert sent == [["https://a.com/0", "https://a.com/1", "https://a.com/2"]]
+    client.clock.advance(client.batch_wait)
+    assert sent[1:] == [["https://a.com/3"]]
+    assert [r["url"] for r in results] == [
+        "https://a.com/0",
+        "https://a.com/2",
+        "https://a.com/3",
+    ]
+    assert len(failures) == 1
+    failures[0].trap(utils.PipelineItemError)
+
+
+def test_get_pipeline_client_uses_settings():
+    try:
+        utils.get_pipeline_client()
+        client = utils.get_pipeline_client(Settings({"PIPELINE_MAX_IN_FLIGHT": 7}))
+        assert client.max_in_flight == 7
+        assert utils.get_pipeline_client() is client
+    finally:
+        utils.close_pipeline_client()
+
+
+class FakeDriver:
+    def __init__(self):
+        self.quit_called = False
+        self.healthy = True
+
+    def execute_script(self, script):
+        if not self.healthy:
+            raise RuntimeError("dead")
+        return 1
+
+    def quit(self):
+        self.quit_called = True
+
+
+def test_webdriver_pool_reuses_recycles_and_shuts_down():
+    created = []
+
+    def factory():
+        created.append(FakeDriver())
+        return created[-1]
+
+    pool = utils.WebDriverPool(size=1, max_pages=2, max_memory_mb=0, factory=factory)
+    pool.open()
+    with pool.driver() as first:
+        pass
+    with pool.driver() as second:
+        assert second is first
+    # Recycled after max_pages pages.
+    assert first.quit_called
+    with pool.driver() as third:
+        third.healthy = False
+    with pool.driver() as fourth:
+        assert fourth is not third and third.quit_called
+    pool.close()
+    assert fourth.quit_called
+    assert len(created) == 3
+
+
+def test_selenium_get_all_urls_on_page_uses_one_script_call():
+    class Driver:
+        def __init__(self):
+            self.scripts = []
+
+        def get(self, url):
+            pass
+
+        def execute_script(self, script):
+            self.scripts.append(script)
+            return [
+                ["https://a.com/x", "X", "main-feature"],
+                ["https://a.com/x", "X again", "most-read"],
+                ["https://a.com/y", "Y", "nav"],
+            ]
+
+    driver = Driver()
+    urls = utils.selenium_get_all_urls_on_page(driver, "https://a.com/")
+    assert urls == ["https://a.com/x", "https://a.com/y"]
+    links = utils.selenium_get_all_urls_on_page(
+        driver, "https://a.com/", with_details=True
+    )
+    assert links[0] == {
+        "url": "https://a.com/x",
+        "text": "X",
+        "section": "main-feature",
+    }
+    assert len(driver.scripts) == 2